@@ -0,0 +1,291 @@
+"""
+ASGI entry point, served alongside the WSGI app:
+
+    uvicorn app.asgi:create_asgi_app --factory --host 0.0.0.0 --port $PORT
+
+POST /enforce and /enforce/batch are decided on the event loop against the
+in-memory policy index and tools snapshot, which a background task keeps
+current (ASGI_STATE_REFRESH seconds; changes made through this process apply
+immediately). Audit rows go to the background AuditWriter. Every other route
+(/policies, /tools, /audit, /anomalies, /events, /generate_policy, static
+files) is the existing Flask view run on a bounded thread pool, so the
+contracts are identical and a slow policy generation only holds one of
+ASGI_WSGI_THREADS threads instead of a worker.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from flask import Flask
+from pydantic import ValidationError
+from .enforcement import EnforcementRequest, batch_items
+from .utils import pooled_db
+
+logger = logging.getLogger(__name__)
+
+ENFORCE_PATHS = ("/enforce", "/enforce/batch")
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class AsgiApp:
+    def __init__(self, flask_app: Flask):
+        self.flask_app = flask_app
+        self.enforcement = flask_app.extensions["agentguard_components"]["enforcement_service"]
+        self.refresh_interval = float(os.getenv("ASGI_STATE_REFRESH", "0.5"))
+        self.max_body = int(os.getenv("ASGI_MAX_BODY", str(16 * 1024 * 1024)))
+        self._executor = ThreadPoolExecutor(int(os.getenv("ASGI_WSGI_THREADS", "32")), thread_name_prefix="asgi-wsgi")
+        self._loaded = False
+        self._refresher: Optional["asyncio.Task[None]"] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["method"] == "POST" and scope["path"] in ENFORCE_PATHS:
+                await self._enforce(scope, receive, send)
+            else:
+                await self._wsgi(scope, receive, send)
+
+    def refresh_state(self) -> None:
+        """Bring the policy index and tools snapshot up to date (runs off the loop)."""
+        db = pooled_db(read_only=True)
+        self.enforcement.policy_store.get_index(db)
+        self.enforcement.tool_registry.snapshot(db)
+        self._loaded = True
+
+    async def _ensure_state(self) -> None:
+        if not self._loaded:
+            await asyncio.get_running_loop().run_in_executor(None, self.refresh_state)
+        if self._refresher is None:
+            self._refresher = asyncio.ensure_future(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await loop.run_in_executor(None, self.refresh_state)
+            except Exception:
+                logger.exception("ASGI state refresh failed")
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self._ensure_state()
+                except Exception as exc:
+                    await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._refresher is not None:
+                    self._refresher.cancel()
+                await asyncio.get_running_loop().run_in_executor(None, self.enforcement.audit_writer.flush)
+                self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _enforce(self, scope, receive, send) -> None:
+        try:
+            data = json.loads(await self._read_body(receive) or b"null")
+        except BodyTooLarge:
+            await self._send_json(send, 413, {"error": "request_too_large", "max_bytes": self.max_body})
+            return
+        except ValueError:
+            await self._send_json(send, 400, {"error": "invalid_request", "details": "malformed JSON"})
+            return
+        await self._ensure_state()
+        index = self.enforcement.policy_store.loaded_index()
+
+        if scope["path"] == "/enforce":
+            started = time.perf_counter()
+            try:
+                if not isinstance(data, dict):
+                    raise TypeError("request must be an object")
+                payload = EnforcementRequest(**data)
+            except ValidationError as exc:
+                await self._send_json(send, 400, {"error": "invalid_request", "details": exc.errors()})
+                return
+            except TypeError as exc:
+                await self._send_json(send, 400, {"error": "invalid_request", "details": str(exc)})
+                return
+            self.enforcement.observe_stage("parse", started)
+            body, status, audit_row = self.enforcement.decide(payload, None, index=index)
+            audit_rows = [audit_row]
+        else:
+            items, error = batch_items(data)
+            if error is not None:
+                await self._send_json(send, error[1], error[0])
+                return
+            results, audit_rows = self.enforcement.decide_items(items, None, index)
+            body, status = {"results": results}, 200
+
+        if self.enforcement.audit_writer.full():
+            # only wait for queue space (AUDIT_OVERFLOW=block) on a thread, never on the loop
+            await asyncio.get_running_loop().run_in_executor(None, self.enforcement.record, audit_rows)
+        else:
+            self.enforcement.record(audit_rows)
+        await self._send_json(send, status, body)
+
+    async def _read_body(self, receive) -> bytes:
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body:
+                raise BodyTooLarge()
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _send_json(send, status: int, body: Any) -> None:
+        # same encoding as flask.jsonify
+        data = (json.dumps(body, default=str, sort_keys=True, separators=(",", ":")) + "\n").encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())],
+        })
+        await send({"type": "http.response.body", "body": data})
+
+    async def _wsgi(self, scope, receive, send) -> None:
+        """
+        Run the Flask app for this request on the WSGI thread pool.
+
+        The same thread calls the app and iterates its response, since
+        streamed bodies such as /events hold a SQLite connection that cannot
+        move between threads. Chunks are handed to the loop through a small
+        bounded queue; a client disconnect stops the iteration.
+        """
+        try:
+            body = await self._read_body(receive)
+        except BodyTooLarge:
+            await self._send_json(send, 413, {"error": "request_too_large", "max_bytes": self.max_body})
+            return
+        loop = asyncio.get_running_loop()
+        chunks: "asyncio.Queue[Any]" = asyncio.Queue(16)
+        disconnected = threading.Event()
+        environ = wsgi_environ(scope, body)
+
+        def put(item: Any) -> None:
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def run() -> None:
+            def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+                put((int(status.split(" ", 1)[0]), headers))
+                return lambda data: None
+
+            try:
+                iterable = self.flask_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if disconnected.is_set():
+                            break
+                        if chunk:
+                            put(chunk)
+                finally:
+                    close = getattr(iterable, "close", None)
+                    if close is not None:
+                        close()
+            except Exception as exc:
+                logger.exception("WSGI request failed: %s %s", environ["REQUEST_METHOD"], environ["PATH_INFO"])
+                put(exc)
+            put(None)
+
+        async def watch_disconnect() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        worker = loop.run_in_executor(self._executor, run)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        started = False
+        try:
+            while True:
+                item = await chunks.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    if not started:
+                        await self._send_json(send, 500, {"error": "internal_error"})
+                        started = True
+                    break
+                if isinstance(item, tuple):
+                    status, headers = item
+                    await send({
+                        "type": "http.response.start",
+                        "status": status,
+                        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+                    })
+                    started = True
+                else:
+                    await send({"type": "http.response.body", "body": item, "more_body": True})
+            if started:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            disconnected.set()
+            watcher.cancel()
+            # let the worker thread finish (it may be waiting to hand over a chunk)
+            while not worker.done():
+                try:
+                    chunks.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+            await worker
+
+
+def wsgi_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ: Dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name, value = raw_name.decode("latin-1"), raw_value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length":
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def create_asgi_app(flask_app: Optional[Flask] = None) -> AsgiApp:
+    """
+    Wrap a configured Flask app. Without one, the package's WSGI app (the
+    one gunicorn serves as app:app, background services included) is used.
+    """
+    if flask_app is None:
+        from . import app as flask_app
+    return AsgiApp(flask_app)
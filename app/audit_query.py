@@ -0,0 +1,148 @@
+"""
+Query helpers behind GET /audit and GET /audit/stats.
+
+Filters map onto indexed columns and pagination is keyset-based on the
+audit_logs primary key, so the cost of a page does not grow with the
+size of the table.
+"""
+import os
+from typing import Any, Dict, List, Mapping, Tuple
+from .audit_writer import AUDIT_COLUMNS
+
+FILTER_COLUMNS = ("agent_id", "tool_id", "decision", "reason", "policy_version")
+GROUP_COLUMNS = ("agent_id", "tool_id", "decision", "reason", "policy_version")
+# created_at is ISO-8601, so a prefix of it is a time bucket
+BUCKET_PREFIX = {"minute": 16, "hour": 13, "day": 10}
+MINUTE_PREFIX = BUCKET_PREFIX["minute"]
+
+
+class AuditQueryError(ValueError):
+    pass
+
+
+def build_filters(args: Mapping[str, str], rollup: bool = False) -> Tuple[List[str], List[Any]]:
+    """
+    WHERE clauses for the column filters and since/until bounds.
+    Rollup tables only know the minute bucket, so there the time bounds are
+    compared at minute granularity.
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    for column in FILTER_COLUMNS:
+        value = args.get(column)
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    time_column = "bucket" if rollup else "created_at"
+    if args.get("since"):
+        clauses.append(f"{time_column} >= ?")
+        params.append(args["since"][:MINUTE_PREFIX] if rollup else args["since"])
+    if args.get("until"):
+        clauses.append(f"{time_column} < ?")
+        params.append(args["until"][:MINUTE_PREFIX] if rollup else args["until"])
+    return clauses, params
+
+
+def _int_arg(args: Mapping[str, str], name: str) -> Any:
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise AuditQueryError(f"{name} must be an integer")
+
+
+def list_audit_rows(db, args: Mapping[str, str]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Return one page of audit rows plus response headers.
+
+    Pages are newest-first; pass the X-Next-Before-Id header back as
+    before_id for the next page. With after_id the page is oldest-first
+    instead, for following new rows.
+    """
+    max_limit = int(os.getenv("AUDIT_PAGE_MAX", "1000"))
+    limit = _int_arg(args, "limit")
+    limit = 200 if limit is None else limit
+    if limit < 1 or limit > max_limit:
+        raise AuditQueryError(f"limit must be between 1 and {max_limit}")
+    before_id = _int_arg(args, "before_id")
+    after_id = _int_arg(args, "after_id")
+
+    columns = ["id", *AUDIT_COLUMNS]
+    if args.get("fields"):
+        requested = [field.strip() for field in args["fields"].split(",") if field.strip()]
+        unknown = sorted(set(requested) - set(columns))
+        if unknown:
+            raise AuditQueryError(f"unknown fields: {', '.join(unknown)}")
+        columns = ["id", *[field for field in requested if field != "id"]]
+
+    clauses, params = build_filters(args)
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(after_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "ASC" if after_id is not None and before_id is None else "DESC"
+    rows = db.execute(
+        f"SELECT {', '.join(columns)} FROM audit_logs {where} ORDER BY id {order} LIMIT ?",
+        (*params, limit),
+    ).fetchall()
+
+    headers: Dict[str, str] = {}
+    if len(rows) == limit:
+        headers["X-Next-Before-Id" if order == "DESC" else "X-Next-After-Id"] = str(rows[-1]["id"])
+    return [dict(row) for row in rows], headers
+
+
+def audit_stats(db, args: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Grouped decision counts, e.g. ?group_by=agent_id,decision&bucket=hour.
+
+    Counts come from the rollup tables (hourly unless minute precision is
+    needed), so the cost depends on the number of buckets, not rows.
+    ?source=raw aggregates audit_logs directly for exact time bounds.
+    """
+    group_by = [part.strip() for part in (args.get("group_by") or "decision").split(",") if part.strip()]
+    bucket = args.get("bucket")
+    if bucket and bucket not in BUCKET_PREFIX:
+        raise AuditQueryError(f"bucket must be one of {', '.join(BUCKET_PREFIX)}")
+    unknown = sorted(set(group_by) - set(GROUP_COLUMNS) - {"bucket"})
+    if unknown:
+        raise AuditQueryError(f"cannot group by: {', '.join(unknown)}")
+    if "bucket" in group_by and not bucket:
+        bucket = "hour"
+    if bucket and "bucket" not in group_by:
+        group_by.append("bucket")
+    source = args.get("source") or "rollup"
+    if source not in ("rollup", "raw"):
+        raise AuditQueryError("source must be rollup or raw")
+
+    if source == "raw":
+        table, time_column, count = "audit_logs", "created_at", "COUNT(*)"
+        select = [column for column in group_by if column != "bucket"]
+    else:
+        precise = bucket == "minute" or args.get("since") or args.get("until")
+        table = "audit_rollup_minute" if precise else "audit_rollup_hour"
+        time_column, count = "bucket", "SUM(count)"
+        select = [f"NULLIF({column}, '') AS {column}" for column in group_by if column != "bucket"]
+    if bucket:
+        select.append(f"substr({time_column}, 1, {BUCKET_PREFIX[bucket]}) AS bucket")
+
+    clauses, params = build_filters(args, rollup=source == "rollup")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.execute(
+        f"SELECT {', '.join(select)}, {count} AS count FROM {table} {where} "
+        f"GROUP BY {', '.join(group_by)} ORDER BY count DESC",
+        params,
+    ).fetchall()
+    groups = [dict(row) for row in rows]
+    return {
+        "group_by": group_by,
+        "bucket": bucket,
+        "source": source,
+        "total": sum(group["count"] for group in groups),
+        "groups": groups,
+    }
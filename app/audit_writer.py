@@ -0,0 +1,231 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+from .utils import db_path, open_db
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = (
+    "request_id",
+    "agent_id",
+    "roles",
+    "tool_id",
+    "tool_version",
+    "params_hash",
+    "decision",
+    "reason",
+    "policy_version",
+    "created_at",
+    "params",
+)
+INSERT_AUDIT_SQL = (
+    f"INSERT INTO audit_logs ({', '.join(AUDIT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in AUDIT_COLUMNS)})"
+)
+OVERFLOW_MODES = ("block", "drop", "spill")
+
+AuditRow = Tuple[Any, ...]
+
+
+def complete_row(row: Sequence[Any]) -> AuditRow:
+    """Pad rows written before a column was added (e.g. old spill files) to the current width."""
+    return tuple(row) + (None,) * (len(AUDIT_COLUMNS) - len(row))
+
+
+class AuditWriter:
+    """
+    Background audit sink.
+
+    Rows are queued by the request thread and group-committed by a single
+    writer thread with executemany, so /enforce never waits on an fsync.
+    When the bounded queue is full the configured overflow mode applies:
+    "block" waits for space, "drop" discards and counts the row, "spill"
+    appends it to a local JSONL file that is replayed into the database later.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        overflow: Optional[str] = None,
+        spill_path: Optional[str] = None,
+    ):
+        self.path = path or db_path()
+        self.batch_size = batch_size or int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.05"))
+        self.overflow = (overflow or os.getenv("AUDIT_OVERFLOW", "block")).lower()
+        if self.overflow not in OVERFLOW_MODES:
+            raise ValueError(f"AUDIT_OVERFLOW must be one of {OVERFLOW_MODES}, got {self.overflow!r}")
+        self.spill_path = spill_path or os.getenv("AUDIT_SPILL_FILE") or f"{self.path}.audit-spill.jsonl"
+        self._queue: "queue.Queue[List[AuditRow]]" = queue.Queue(max_queue or int(os.getenv("AUDIT_QUEUE_SIZE", "10000")))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+
+    def submit(self, row: AuditRow) -> None:
+        self._enqueue([row])
+
+    def submit_many(self, rows: Sequence[AuditRow]) -> None:
+        """Queue several rows as one unit; they are always committed in the same transaction."""
+        if rows:
+            self._enqueue(list(rows))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def flush(self) -> None:
+        """Block until every row queued so far has been committed."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Stop the writer thread after draining the queue."""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join()
+
+    def _enqueue(self, rows: List[AuditRow]) -> None:
+        if self._stopping.is_set():
+            # Shutting down: keep the rows on disk for the next process to replay
+            self._spill(rows)
+            return
+        self._ensure_started()
+        if self.overflow == "block":
+            self._queue.put(rows)
+            return
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            if self.overflow == "drop":
+                with self._spill_lock:
+                    self.dropped += len(rows)
+                logger.warning("Audit queue full; dropped %s row(s) (total dropped=%s)", len(rows), self.dropped)
+            else:
+                self._spill(rows)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        conn = open_db(self.path)
+        try:
+            self._try_replay_spill(conn)
+            while True:
+                try:
+                    first = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._stopping.is_set():
+                        return
+                    self._try_replay_spill(conn)
+                    continue
+                units = [first]
+                pending = len(first)
+                deadline = time.monotonic() + self.flush_interval
+                while pending < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        unit = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    units.append(unit)
+                    pending += len(unit)
+                try:
+                    self._write(conn, [row for unit in units for row in unit])
+                finally:
+                    # flush() waits on these; never leave it hanging
+                    for _ in units:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _write(self, conn, rows: List[AuditRow]) -> None:
+        try:
+            with conn:
+                conn.executemany(INSERT_AUDIT_SQL, [complete_row(row) for row in rows])
+            self.written += len(rows)
+        except Exception:
+            logger.exception("Audit batch of %s row(s) failed; spilling to %s", len(rows), self.spill_path)
+            try:
+                self._spill(rows)
+            except Exception:
+                with self._spill_lock:
+                    self.dropped += len(rows)
+                logger.exception("Spilling %s audit row(s) failed; dropped (total dropped=%s)", len(rows), self.dropped)
+
+    def _spill(self, rows: List[AuditRow]) -> None:
+        with self._spill_lock:
+            with open(self.spill_path, "a", encoding="utf-8") as fh:
+                for row in rows:
+                    fh.write(json.dumps(row) + "\n")
+            self.spilled += len(rows)
+
+    def _try_replay_spill(self, conn) -> None:
+        try:
+            self._replay_spill(conn)
+        except Exception:
+            logger.exception("Replaying spilled audit rows failed")
+
+    def _replay_spill(self, conn) -> None:
+        """
+        Insert the spilled rows and remove the spill file. Malformed lines
+        (e.g. a torn append from a crash) are moved to <spill>.rejected; if
+        the insert fails the rows are appended back to the spill file.
+        """
+        if not os.path.exists(self.spill_path):
+            return
+        replaying = f"{self.spill_path}.{os.getpid()}.replay"
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_path, replaying)
+            except FileNotFoundError:
+                return
+        try:
+            rows, rejected = [], []
+            with open(replaying, encoding="utf-8") as fh:
+                for line in fh:
+                    if not line.strip():
+                        continue
+                    try:
+                        rows.append(complete_row(json.loads(line)))
+                    except (ValueError, TypeError):
+                        rejected.append(line if line.endswith("\n") else line + "\n")
+            if rejected:
+                logger.warning("Skipping %s malformed spilled audit line(s); kept in %s.rejected", len(rejected), self.spill_path)
+                with open(f"{self.spill_path}.rejected", "a", encoding="utf-8") as out:
+                    out.writelines(rejected)
+            if not rows:
+                return
+            try:
+                with conn:
+                    conn.executemany(INSERT_AUDIT_SQL, rows)
+            except Exception:
+                logger.exception("Replaying %s spilled audit row(s) failed; will retry", len(rows))
+                self._spill(rows)
+                with self._spill_lock:
+                    self.spilled -= len(rows)  # already counted when first spilled
+            else:
+                self.written += len(rows)
+                logger.info("Replayed %s spilled audit row(s) from %s", len(rows), self.spill_path)
+        finally:
+            os.remove(replaying)
@@ -1,48 +1,206 @@
 import json
+import logging
+import os
 import time
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
 from flask import Blueprint, jsonify
-from .utils import get_db
+from .events import Event, EventBus
+from .utils import get_db, get_read_db
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(created_at: Optional[str]) -> float:
+    if not created_at:
+        return time.time()
+    try:
+        parsed = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    except ValueError:
+        return time.time()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _isoformat(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
 
 class AuditorService:
-    def __init__(self):
+    """
+    Detects agents with too many BLOCK decisions in a sliding window.
+
+    Audit rows are consumed incrementally from a last-seen id watermark and
+    counted in per-agent in-memory windows. Each burst produces one anomaly
+    row that stays "open" while the agent is over the threshold and is
+    "closed" once its window drops back below it.
+
+    With AUDITOR_SOURCE=bus decisions are consumed from the event bus as
+    they are published instead of being re-read from audit_logs; polling is
+    only used once at startup to catch up. A bus only sees its own
+    process's decisions, so bus mode is the default only when the
+    cross-worker relay (AGENTGUARD_EVENT_SOCKET) is configured.
+    """
+
+    def __init__(self, event_bus: Optional[EventBus] = None):
         self.blueprint = Blueprint("auditor", __name__)
         self.blueprint.add_url_rule("/anomalies", "list_anomalies", self.list_anomalies, methods=["GET"])
+        self.scan_interval = float(os.getenv("AUDITOR_SCAN_INTERVAL", "5"))
+        self.window_seconds = float(os.getenv("AUDITOR_WINDOW_SECONDS", "60"))
+        self.threshold = int(os.getenv("AUDITOR_BLOCK_THRESHOLD", "3"))
+        self.event_bus = event_bus
+        relayed = event_bus is not None and bool(os.getenv("AGENTGUARD_EVENT_SOCKET"))
+        self.source = os.getenv("AUDITOR_SOURCE", "bus" if relayed else "poll").lower()
+        self._watermark: Optional[int] = None
+        self._windows: Dict[str, Deque[float]] = {}
+        self._open: Dict[str, int] = {}
+        # wall time up to which every decision has been processed (None until run() starts)
+        self._caught_up_at: Optional[float] = None
+
+    @property
+    def lag_seconds(self) -> float:
+        """Seconds since the auditor last caught up; read at scrape time, so it keeps growing while the thread is stalled."""
+        if self._caught_up_at is None:
+            return 0.0
+        return max(time.time() - self._caught_up_at, 0.0)
 
     def run(self, app):
+        self._caught_up_at = time.time()
         with app.app_context():
-            while True:
+            if self.source == "bus" and self.event_bus is not None:
+                self._run_bus()
+            else:
+                self._run_poll()
+
+    def _run_poll(self):
+        while True:
+            try:
                 self._scan()
-                time.sleep(5)
+            except Exception:
+                logger.exception("Auditor scan failed")
+            time.sleep(self.scan_interval)
+
+    def _run_bus(self):
+        try:
+            self._scan()  # catch up on rows written before this process subscribed
+        except Exception:
+            logger.exception("Auditor catch-up scan failed")
+        subscription = self.event_bus.subscribe()
+        while True:
+            first = subscription.get(timeout=self.scan_interval)
+            events = [first, *subscription.drain()] if first is not None else []
+            relay = self.event_bus.relay
+            if relay is not None and not relay.is_leader:
+                # the relay leader sees every worker's events and does the aggregation
+                self._caught_up_at = time.time()
+                continue
+            try:
+                self._consume(events)
+            except Exception:
+                logger.exception("Auditor event processing failed")
 
-    def _scan(self):
+    def _consume(self, events: List[Event], now: Optional[float] = None):
         db = get_db()
-        cutoff = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
-        rows = db.execute(
-            """
-            SELECT agent_id, COUNT(*) as cnt
-            FROM audit_logs
-            WHERE decision='BLOCK' AND created_at >= ?
-            GROUP BY agent_id
-            HAVING cnt >= 3
-            """,
-            (cutoff,),
-        ).fetchall()
-        for row in rows:
+        now = now if now is not None else time.time()
+        for event in events:
+            if event.get("decision") == "BLOCK":
+                self._ingest(event.get("agent_id"), event.get("created_at"))
+        self._evaluate(db, now)
+        db.commit()
+        self._caught_up_at = now
+
+    def _ingest(self, agent_id: str, created_at: Optional[str]) -> None:
+        self._windows.setdefault(agent_id, deque()).append(_timestamp(created_at))
+
+    def _scan(self, now: Optional[float] = None):
+        db = get_db()
+        now = now if now is not None else time.time()
+        if self._watermark is None:
+            self._watermark = self._initial_watermark(db, now)
+            self._load_open(db)
+        high = db.execute("SELECT MAX(id) AS id FROM audit_logs").fetchone()["id"] or 0
+        if high > self._watermark:
+            rows = db.execute(
+                """
+                SELECT agent_id, created_at FROM audit_logs
+                WHERE id > ? AND id <= ? AND decision='BLOCK'
+                ORDER BY id
+                """,
+                (self._watermark, high),
+            ).fetchall()
+            for row in rows:
+                self._ingest(row["agent_id"], row["created_at"])
+            self._watermark = high
+        self._evaluate(db, now)
+        db.commit()
+        self._caught_up_at = now
+
+    def _initial_watermark(self, db, now: float) -> int:
+        # Start just before the first row still inside the window so a restart keeps recent context
+        cutoff = _isoformat(now - self.window_seconds)
+        row = db.execute("SELECT MIN(id) AS id FROM audit_logs WHERE created_at >= ?", (cutoff,)).fetchone()
+        if row["id"] is not None:
+            return row["id"] - 1
+        return db.execute("SELECT MAX(id) AS id FROM audit_logs").fetchone()["id"] or 0
+
+    def _load_open(self, db) -> None:
+        rows = db.execute("SELECT id, agent_id FROM anomalies WHERE status = 'open'").fetchall()
+        self._open = {row["agent_id"]: row["id"] for row in rows}
+
+    def _evaluate(self, db, now: float) -> None:
+        # Every live window is re-checked, not only the ones that just got a
+        # block, so an agent that goes quiet has its window expired and dropped
+        cutoff = now - self.window_seconds
+        for agent_id in set(self._windows) | set(self._open):
+            window = self._windows.get(agent_id, deque())
+            while window and window[0] < cutoff:
+                window.popleft()
+            count = len(window)
+            if not window:
+                self._windows.pop(agent_id, None)
+            if count >= self.threshold:
+                self._record_open(db, agent_id, count, now)
+            elif agent_id in self._open:
+                self._record_close(db, agent_id, now)
+
+    def _detail(self, count: int) -> str:
+        return json.dumps({"blocks_last_minute": count, "window_seconds": self.window_seconds})
+
+    def _record_open(self, db, agent_id: str, count: int, now: float) -> None:
+        seen_at = _isoformat(now)
+        anomaly_id = self._open.get(agent_id)
+        if anomaly_id is None:
+            # The partial unique index on open anomalies dedupes across workers
             db.execute(
                 """
-                INSERT INTO anomalies (agent_id, detail, created_at)
-                VALUES (?, ?, ?)
+                INSERT OR IGNORE INTO anomalies (agent_id, detail, created_at, status, block_count, last_seen_at)
+                VALUES (?, ?, ?, 'open', ?, ?)
                 """,
-                (
-                    row["agent_id"],
-                    json.dumps({"blocks_last_minute": row["cnt"]}),
-                    datetime.utcnow().isoformat(),
-                ),
+                (agent_id, self._detail(count), seen_at, count, seen_at),
             )
-        db.commit()
+            anomaly_id = db.execute(
+                "SELECT id FROM anomalies WHERE agent_id = ? AND status = 'open'", (agent_id,)
+            ).fetchone()["id"]
+            self._open[agent_id] = anomaly_id
+        db.execute(
+            """
+            UPDATE anomalies
+            SET block_count = MAX(COALESCE(block_count, 0), ?), detail = ?, last_seen_at = ?
+            WHERE id = ?
+            """,
+            (count, self._detail(count), seen_at, anomaly_id),
+        )
+
+    def _record_close(self, db, agent_id: str, now: float) -> None:
+        anomaly_id = self._open.pop(agent_id)
+        db.execute(
+            "UPDATE anomalies SET status = 'closed', closed_at = ? WHERE id = ? AND status = 'open'",
+            (_isoformat(now), anomaly_id),
+        )
 
     def list_anomalies(self):
-        db = get_db()
+        db = get_read_db()
         rows = db.execute("SELECT * FROM anomalies ORDER BY created_at DESC").fetchall()
         return jsonify([dict(row) for row in rows])
@@ -0,0 +1,102 @@
+"""
+In-process cache of enforcement outcomes for repeated identical requests.
+
+Entries are keyed by the request fingerprint (roles, tool_id, tool_version
+and the per-param digests) and remember the PolicyIndex and tools snapshot
+they were decided against. Both are replaced whenever the policies or tools
+generation counter moves, so a policy or registry change invalidates every
+entry without any explicit flush; rotating ENFORCEMENT_HMAC_KEY does too,
+since signature checks depend on it. Entries expire after DECISION_CACHE_TTL
+seconds and the least recently used are evicted beyond DECISION_CACHE_SIZE
+(0 disables the cache).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+Fingerprint = Tuple[Tuple[str, ...], str, str, Tuple[Tuple[str, str], ...]]
+
+
+class CachedDecision(NamedTuple):
+    decision: str
+    policy_version: Optional[str]
+    reason: str
+    status: int
+    index: Any
+    tools: Any
+    secret: str
+    expires_at: float
+
+
+def _secret() -> str:
+    return os.getenv("ENFORCEMENT_HMAC_KEY", "dev-secret")
+
+
+def fingerprint(roles: List[str], tool_id: str, tool_version: str, param_hashes: Dict[str, str]) -> Fingerprint:
+    return (tuple(roles), tool_id, tool_version, tuple(sorted(param_hashes.items())))
+
+
+class DecisionCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("DECISION_CACHE_SIZE", "10000"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("DECISION_CACHE_TTL", "60"))
+        self._entries: "OrderedDict[Fingerprint, CachedDecision]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Fingerprint, index: Any, tools: Any) -> Optional[CachedDecision]:
+        """The cached outcome, if it was decided against this exact index and tools snapshot and is fresh."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if (
+                entry is not None
+                and entry.index is index
+                and entry.tools is tools
+                and entry.secret == _secret()
+                and entry.expires_at > time.monotonic()
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        key: Fingerprint,
+        index: Any,
+        tools: Any,
+        decision: str,
+        policy_version: Optional[str],
+        reason: str,
+        status: int,
+    ) -> None:
+        entry = CachedDecision(decision, policy_version, reason, status, index, tools, _secret(), time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
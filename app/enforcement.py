@@ -1,15 +1,21 @@
 import hashlib
-import hmac
 import json
 import logging
 import os
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from flask import Blueprint, jsonify, request
 from pydantic import BaseModel, ValidationError
+from .audit_query import AuditQueryError, audit_stats, list_audit_rows
+from .audit_writer import AUDIT_COLUMNS, AuditRow, AuditWriter
+from .decision_cache import DecisionCache, fingerprint
+from .events import EventBus
+from .metrics import MetricsRegistry, default_registry
+from .policy_index import PolicyIndex
 from .policy_store import PolicyStore
 from .tool_registry import ToolRegistry
-from .utils import get_db
+from .utils import get_db, get_read_db
 
 logger = logging.getLogger(__name__)
 
@@ -22,82 +28,322 @@ class EnforcementRequest(BaseModel):
     params: Dict[str, Any]
     request_id: str
 
+REDACTED = "[REDACTED]"
+
+# decide() default: resolve the active index itself (None is an explicit "no policy loaded")
+_ACTIVE_INDEX: Any = object()
+
+
+def capture_params(value: Any, redact_keys: Tuple[str, ...], max_chars: int) -> Any:
+    """
+    Copy request params for the audit log: values under keys containing any
+    of `redact_keys` (case-insensitive) are replaced, and strings longer than
+    `max_chars` are replaced by a length marker, recursively.
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(part in str(key).lower() for part in redact_keys) else capture_params(item, redact_keys, max_chars)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [capture_params(item, redact_keys, max_chars) for item in value]
+    if isinstance(value, str) and len(value) > max_chars:
+        return f"[{len(value)} chars]"
+    return value
+
+
+LEGACY_SEPARATORS = (", ", ": ")
+COMPACT_SEPARATORS = (",", ":")
+
+
+def request_digests(payload: EnforcementRequest, compact: bool = False) -> Tuple[str, Dict[str, str]]:
+    """
+    Return (request_hash, param_hashes) from one serialisation pass.
+
+    Each param value is encoded once; that text is hashed for the audit row
+    and spliced into the canonical request document, so nothing is encoded
+    twice and payload.dict() is never copied. With the default (legacy)
+    separators the request hash is byte-for-byte
+    sha256(json.dumps(payload.dict(), sort_keys=True, default=str));
+    compact=True drops the whitespace, which is cheaper but changes every hash.
+    """
+    item_sep, key_sep = COMPACT_SEPARATORS if compact else LEGACY_SEPARATORS
+    separators = (item_sep, key_sep)
+    param_hashes: Dict[str, str] = {}
+    encoded_params: List[Tuple[str, str]] = []
+    for key, value in payload.params.items():
+        try:
+            serial = json.dumps(value, sort_keys=True, separators=separators, default=str)
+        except TypeError:
+            serial = str(value)
+        param_hashes[key] = hashlib.sha256(serial.encode()).hexdigest()
+        encoded_params.append((key, f"{json.dumps(key)}{key_sep}{serial}"))
+
+    def field(name: str, value: Any) -> str:
+        return f'"{name}"{key_sep}{json.dumps(value, separators=separators, default=str)}'
+
+    # fields in sorted key order, as json.dumps(sort_keys=True) would emit them
+    document = "{" + item_sep.join((
+        field("agent_id", payload.agent_id),
+        field("agent_roles", payload.agent_roles),
+        f'"params"{key_sep}{{{item_sep.join(encoded for _, encoded in sorted(encoded_params))}}}',
+        field("request_id", payload.request_id),
+        field("tool_id", payload.tool_id),
+        field("tool_version", payload.tool_version),
+    )) + "}"
+    return hashlib.sha256(document.encode()).hexdigest(), param_hashes
+
+
+def batch_items(data: Any) -> Tuple[List[Any], Optional[Tuple[Dict[str, Any], int]]]:
+    """Unpack an /enforce/batch body; returns (items, None) or ([], (error_body, status))."""
+    items = data.get("requests") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return [], ({"error": "invalid_request", "details": "expected a list of requests"}, 400)
+    max_items = int(os.getenv("ENFORCE_BATCH_MAX", "1000"))
+    if len(items) > max_items:
+        return [], ({"error": "batch_too_large", "max_items": max_items}, 413)
+    return items, None
+
+
 class EnforcementService:
-    def __init__(self, policy_store: PolicyStore, tool_registry: ToolRegistry):
+    def __init__(
+        self,
+        policy_store: PolicyStore,
+        tool_registry: ToolRegistry,
+        audit_writer: Optional[AuditWriter] = None,
+        event_bus: Optional[EventBus] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
         self.policy_store = policy_store
         self.tool_registry = tool_registry
+        self.audit_writer = audit_writer or AuditWriter()
+        self.event_bus = event_bus
+        # opt-in: keep redacted params in audit_logs so decisions can be replayed
+        self.capture_params = os.getenv("AUDIT_CAPTURE_PARAMS", "false").lower() == "true"
+        self.redact_keys = tuple(
+            part.strip().lower()
+            for part in os.getenv("AUDIT_REDACT_KEYS", "password,secret,token,api_key,apikey,authorization,credential").split(",")
+            if part.strip()
+        )
+        self.capture_max_chars = int(os.getenv("AUDIT_PARAM_MAX_CHARS", "256"))
+        # "compact" hashes without separator whitespace; request hashes then differ from "legacy"
+        self.compact_hashes = os.getenv("ENFORCEMENT_HASH_ENCODING", "legacy").lower() == "compact"
+        self.decision_cache = DecisionCache()
+        metrics = metrics or default_registry()
+        self.stage_seconds = metrics.histogram(
+            "agentguard_enforce_stage_seconds", "Time spent in each enforcement stage", ("stage",)
+        )
+        self.decisions = metrics.counter(
+            "agentguard_enforce_decisions_total", "Enforcement decisions", ("decision", "reason", "tool")
+        )
+        self.cache_lookups = metrics.counter(
+            "agentguard_decision_cache_lookups_total", "Decision cache lookups", ("result",)
+        )
         self.blueprint = Blueprint("enforcement", __name__)
         self.blueprint.add_url_rule("/enforce", "enforce", self.enforce, methods=["POST"])
+        self.blueprint.add_url_rule("/enforce/batch", "enforce_batch", self.enforce_batch, methods=["POST"])
+        self.blueprint.add_url_rule("/enforce/cache", "decision_cache_stats", self.decision_cache_stats, methods=["GET"])
         self.blueprint.add_url_rule("/audit", "list_audit", self.list_audit, methods=["GET"])
+        self.blueprint.add_url_rule("/audit/stats", "audit_stats", self.audit_stats, methods=["GET"])
 
     def enforce(self):
+        started = time.perf_counter()
         try:
             payload = EnforcementRequest(**request.get_json(force=True))
         except ValidationError as exc:
             return jsonify({"error": "invalid_request", "details": exc.errors()}), 400
+        self.observe_stage("parse", started)
+
+        response, status, audit_row = self.decide(payload, get_db())
+        self.record([audit_row])
+        return jsonify(response), status
+
+    def observe_stage(self, stage: str, started: float) -> None:
+        """Record the time since `started` (a perf_counter() reading) for one enforcement stage."""
+        self.stage_seconds.observe(time.perf_counter() - started, (stage,))
+
+    def enforce_batch(self):
+        """
+        Decide a list of planned tool calls in one round trip.
 
+        The active policy index is resolved once and tool lookups/signature
+        checks are shared across the batch; all audit rows are committed in
+        a single transaction. Results are returned in request order.
+        """
+        items, error = batch_items(request.get_json(force=True))
+        if error is not None:
+            return jsonify(error[0]), error[1]
         db = get_db()
+        results, audit_rows = self.decide_items(items, db, self.policy_store.get_index(db))
+        self.record(audit_rows)
+        return jsonify({"results": results}), 200
+
+    def decide_items(self, items: List[Any], db, index: Optional[PolicyIndex]) -> Tuple[List[Dict[str, Any]], List[AuditRow]]:
+        """Decide each batch item against one index, sharing tool lookups; invalid items get a 400 result."""
+        tools: Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], bool]] = {}
+        results: List[Dict[str, Any]] = []
+        audit_rows: List[AuditRow] = []
+        for item in items:
+            started = time.perf_counter()
+            try:
+                if not isinstance(item, dict):
+                    raise TypeError("request must be an object")
+                payload = EnforcementRequest(**item)
+            except ValidationError as exc:
+                results.append({"status": 400, "error": "invalid_request", "details": exc.errors()})
+                continue
+            except TypeError as exc:
+                results.append({"status": 400, "error": "invalid_request", "details": str(exc)})
+                continue
+            self.observe_stage("parse", started)
+            response, status, audit_row = self.decide(payload, db, index=index, tools=tools)
+            results.append({**response, "status": status})
+            audit_rows.append(audit_row)
+        return results, audit_rows
+
+    def record(self, audit_rows: List[AuditRow]) -> None:
+        """Hand audit rows to the writer (one transaction) and publish them."""
+        started = time.perf_counter()
+        self.audit_writer.submit_many(audit_rows)
+        for audit_row in audit_rows:
+            self._publish(audit_row)
+        self.observe_stage("audit", started)
+
+    def decide(
+        self,
+        payload: EnforcementRequest,
+        db,
+        index: Optional[PolicyIndex] = _ACTIVE_INDEX,
+        tools: Optional[Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], bool]]] = None,
+    ) -> Tuple[Dict[str, Any], int, AuditRow]:
+        """
+        Run the enforcement pipeline for one request and return (response, status, audit_row).
+        `index` and `tools` let batch callers share the policy and tool lookups across items.
+        An explicit index=None means no policy is loaded and decides no_policy.
+        With db=None (the ASGI server) the index and tools are the ones last
+        loaded, so no query runs on the calling thread.
+        Repeated identical requests reuse the cached outcome (see DecisionCache)
+        but still get their own request hash and audit row.
+        """
         original_tool_version = payload.tool_version
         tool_version = original_tool_version or "1.0"
         if original_tool_version is None:
             logger.debug("No tool_version provided; defaulting to 1.0 for request_id=%s", payload.request_id)
         payload.tool_version = tool_version
+        digests = request_digests(payload, self.compact_hashes)
+        if index is _ACTIVE_INDEX:
+            index = self.policy_store.get_index(db) if db is not None else self.policy_store.loaded_index()
+
+        key = None
+        if self.decision_cache.enabled:
+            tools_snapshot = self.tool_registry.snapshot(db) if db is not None else self.tool_registry.loaded_tools()
+            key = fingerprint(payload.agent_roles, payload.tool_id, tool_version, digests[1])
+            cached = self.decision_cache.get(key, index, tools_snapshot)
+            self.cache_lookups.inc(("miss",) if cached is None else ("hit",))
+            if cached is not None:
+                return self._outcome(payload, cached.decision, cached.policy_version, cached.reason, cached.status, digests)
 
-        tool = self.tool_registry.get_tool(payload.tool_id, tool_version)
+        decision, policy_version, reason, status = self._evaluate(payload, db, index, tools)
+        if key is not None:
+            self.decision_cache.put(key, index, tools_snapshot, decision, policy_version, reason, status)
+        return self._outcome(payload, decision, policy_version, reason, status, digests)
+
+    def _evaluate(
+        self,
+        payload: EnforcementRequest,
+        db,
+        index: Optional[PolicyIndex],
+        tools: Optional[Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], bool]]],
+    ) -> Tuple[str, Optional[str], str, int]:
+        """Tool lookup, signature check, params validation and rule evaluation: (decision, policy_version, reason, status)."""
+        tool, signature_ok = self._resolve_tool(db, payload.tool_id, payload.tool_version, tools)
         if not tool:
-            logger.debug("Tool not found in registry: %s@%s", payload.tool_id, tool_version)
-            decision = "BLOCK"
-            reason = "tool_not_found"
-            policy_version = None
-            response = self._build_response(decision, policy_version, reason, payload)
-            self._log_audit(db, payload, decision, reason, policy_version)
-            return jsonify(response), 404
-
-        if not self._verify_signature(tool):
-            decision = "BLOCK"
-            reason = "invalid_tool_signature"
-            policy_version = None
-            response = self._build_response(decision, policy_version, reason, payload)
-            self._log_audit(db, payload, decision, reason, policy_version)
-            return jsonify(response), 403
-
-        schema_cls = self.tool_registry.get_schema(payload.tool_id)
+            logger.debug("Tool not found in registry: %s@%s", payload.tool_id, payload.tool_version)
+            return "BLOCK", None, "tool_not_found", 404
+
+        if not signature_ok:
+            return "BLOCK", None, "invalid_tool_signature", 403
+
+        started = time.perf_counter()
+        schema_cls = self.tool_registry.get_schema(payload.tool_id, payload.tool_version, tool)
         if schema_cls is None:
             logger.debug("No input schema registered for tool %s; skipping params validation", payload.tool_id)
         else:
             try:
                 schema_cls(**payload.params)
             except ValidationError as exc:
-                decision = "BLOCK"
-                reason = f"schema_error:{exc.errors()[0]['msg']}"
-                policy_version = None
-                response = self._build_response(decision, policy_version, reason, payload)
-                self._log_audit(db, payload, decision, reason, policy_version)
-                return jsonify(response), 400
-
-        policy = self.policy_store.evaluate(payload.agent_roles, payload.tool_id, payload.params)
-        response = self._build_response(policy.decision, policy.version, policy.reason, payload)
-        status = 200 if policy.decision == "ALLOW" else 403
-        self._log_audit(db, payload, policy.decision, policy.reason, policy.version)
-        return jsonify(response), status
+                return "BLOCK", None, f"schema_error:{exc.errors()[0]['msg']}", 400
+            finally:
+                self.observe_stage("validate_schema", started)
+
+        started = time.perf_counter()
+        policy = self.policy_store.evaluate_index(index, payload.agent_roles, payload.tool_id, payload.params)
+        self.observe_stage("evaluate", started)
+        return policy.decision, policy.version, policy.reason, 200 if policy.decision == "ALLOW" else 403
+
+    def _resolve_tool(
+        self,
+        db,
+        tool_id: str,
+        tool_version: str,
+        tools: Optional[Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], bool]]],
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        key = (tool_id, tool_version)
+        if tools is not None and key in tools:
+            return tools[key]
+        started = time.perf_counter()
+        if db is None:
+            found = self.tool_registry.loaded(tool_id, tool_version)
+        else:
+            found = self.tool_registry.lookup(tool_id, tool_version, db)
+        self.observe_stage("get_tool", started)
+        if found:
+            started = time.perf_counter()
+            resolved = (found[0], self._verify_signature(*found))
+            self.observe_stage("verify_signature", started)
+        else:
+            resolved = (None, False)
+        if tools is not None:
+            tools[key] = resolved
+        return resolved
+
+    def _outcome(
+        self,
+        payload: EnforcementRequest,
+        decision: str,
+        policy_version: Optional[str],
+        reason: str,
+        status: int,
+        digests: Tuple[str, Dict[str, str]],
+    ) -> Tuple[Dict[str, Any], int, AuditRow]:
+        # schema errors carry the validation message and unregistered tool ids
+        # come straight from the client; keep the label set bounded
+        tool_label = "unknown" if reason == "tool_not_found" else payload.tool_id
+        self.decisions.inc((decision, reason.split(":", 1)[0], tool_label))
+        response = self._build_response(decision, policy_version, reason, digests[0])
+        return response, status, self._audit_row(payload, decision, reason, policy_version, digests[1])
+
+    def decision_cache_stats(self):
+        return jsonify(self.decision_cache.stats())
 
     def list_audit(self):
-        db = get_db()
-        rows = db.execute(
-            "SELECT * FROM audit_logs ORDER BY created_at DESC LIMIT 200"
-        ).fetchall()
-        return jsonify([dict(row) for row in rows])
-
-    def _verify_signature(self, tool: Dict[str, Any]) -> bool:
-        secret = os.getenv("ENFORCEMENT_HMAC_KEY", "dev-secret").encode()
-        msg = f"{tool['id']}|{tool['version']}|{json.dumps(tool['input_schema'], sort_keys=True)}".encode()
-        expected = hmac.new(secret, msg, hashlib.sha256).hexdigest()
-        return hmac.compare_digest(expected, tool.get("signature", ""))
-
-    def _build_response(self, decision: str, version: Optional[str], reason: str, payload: EnforcementRequest) -> Dict[str, Any]:
-        payload_dict = payload.dict()
-        serialized = json.dumps(payload_dict, sort_keys=True, default=str)
-        request_hash = hashlib.sha256(serialized.encode()).hexdigest()
+        try:
+            rows, headers = list_audit_rows(get_read_db(), request.args)
+        except AuditQueryError as exc:
+            return jsonify({"error": "invalid_query", "details": str(exc)}), 400
+        return jsonify(rows), 200, headers
+
+    def audit_stats(self):
+        try:
+            stats = audit_stats(get_read_db(), request.args)
+        except AuditQueryError as exc:
+            return jsonify({"error": "invalid_query", "details": str(exc)}), 400
+        return jsonify(stats)
+
+    def _verify_signature(self, tool: Dict[str, Any], digest: str) -> bool:
+        return self.tool_registry.verify_signature(tool, digest)
+
+    def _build_response(self, decision: str, version: Optional[str], reason: str, request_hash: str) -> Dict[str, Any]:
         return {
             "decision": decision,
             "policy_version": version,
@@ -105,34 +351,35 @@ class EnforcementService:
             "request_hash": request_hash,
         }
 
-    def _hash_params(self, params: Dict[str, Any]) -> Dict[str, str]:
-        out: Dict[str, str] = {}
-        for key, value in params.items():
-            try:
-                serial = json.dumps(value, sort_keys=True, default=str)
-            except TypeError:
-                serial = str(value)
-            out[key] = hashlib.sha256(serial.encode()).hexdigest()
-        return out
+    def _publish(self, audit_row: AuditRow) -> None:
+        if self.event_bus is not None:
+            self.event_bus.publish(dict(zip(AUDIT_COLUMNS, audit_row)))
 
-    def _log_audit(self, db, payload: EnforcementRequest, decision: str, reason: str, policy_version: Optional[str]) -> None:
+    def _audit_row(
+        self,
+        payload: EnforcementRequest,
+        decision: str,
+        reason: str,
+        policy_version: Optional[str],
+        param_hashes: Dict[str, str],
+    ) -> AuditRow:
         created_at = datetime.now(timezone.utc).isoformat()
-        db.execute(
-            """
-            INSERT INTO audit_logs (request_id, agent_id, roles, tool_id, tool_version, params_hash, decision, reason, policy_version, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                payload.request_id,
-                payload.agent_id,
-                ",".join(payload.agent_roles),
-                payload.tool_id,
-                payload.tool_version,
-                json.dumps(self._hash_params(payload.params)),
-                decision,
-                reason,
-                policy_version,
-                created_at,
-            ),
+        return (
+            payload.request_id,
+            payload.agent_id,
+            ",".join(payload.agent_roles),
+            payload.tool_id,
+            payload.tool_version,
+            json.dumps(param_hashes),
+            decision,
+            reason,
+            policy_version,
+            created_at,
+            self._captured_params(payload.params),
         )
-        db.commit()
+
+    def _captured_params(self, params: Dict[str, Any]) -> Optional[str]:
+        if not self.capture_params:
+            return None
+        captured = capture_params(params, self.redact_keys, self.capture_max_chars)
+        return json.dumps(captured, sort_keys=True, separators=(",", ":"), default=str)
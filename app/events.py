@@ -0,0 +1,157 @@
+import errno
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+
+
+class Subscription:
+    def __init__(self, max_queue: int):
+        self.queue: "queue.Queue[Event]" = queue.Queue(max_queue)
+        self.dropped = 0
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self, limit: int = 10000) -> List[Event]:
+        events: List[Event] = []
+        while len(events) < limit:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+
+class EventBus:
+    """
+    Bounded in-process publish/subscribe for enforcement decision events.
+
+    publish() never blocks the request thread: when a subscriber's queue is
+    full the event is dropped for that subscriber and counted. An optional
+    UnixSocketRelay forwards events between gunicorn workers.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None):
+        self.max_queue = max_queue or int(os.getenv("EVENT_BUS_QUEUE_SIZE", "10000"))
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self.relay: Optional["UnixSocketRelay"] = None
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, max_queue: Optional[int] = None) -> Subscription:
+        subscription = Subscription(max_queue or self.max_queue)
+        with self._lock:
+            self._subscribers = [*self._subscribers, subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+
+    def publish(self, event: Event) -> None:
+        relay = self.relay
+        if relay is not None and not relay.is_leader:
+            relay.send(event)
+        self.deliver(event)
+
+    def deliver(self, event: Event) -> None:
+        """Hand an event to local subscribers only."""
+        self.published += 1
+        for subscription in self._subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.dropped += 1
+                self.dropped += 1
+
+
+class UnixSocketRelay:
+    """
+    Cross-worker event fan-in over a Unix datagram socket.
+
+    The first worker to bind the socket path becomes the leader and
+    delivers every datagram it receives to its local bus; the others send
+    their events to it. If the leader goes away, the next sender that
+    finds the socket refusing connections takes over the path.
+    """
+
+    def __init__(self, bus: EventBus, path: str):
+        self.bus = bus
+        self.path = path
+        self.is_leader = False
+        self.send_failures = 0
+        self._sock: Optional[socket.socket] = None
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self.bus.relay = self
+        self._try_lead()
+
+    def send(self, event: Event) -> None:
+        try:
+            self._sender.sendto(json.dumps(event, default=str).encode(), self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            self.send_failures += 1
+            if self._try_lead():
+                # the event is delivered locally by publish(); nothing else to forward to
+                return
+        except OSError:
+            self.send_failures += 1
+            logger.debug("Event relay send failed", exc_info=True)
+
+    def _try_lead(self) -> bool:
+        with self._lock:
+            if self.is_leader:
+                return True
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.bind(self.path)
+            except OSError as exc:
+                if exc.errno != errno.EADDRINUSE or self._leader_alive():
+                    sock.close()
+                    return False
+                # stale socket file left by a dead leader
+                os.unlink(self.path)
+                sock.bind(self.path)
+            self._sock = sock
+            self.is_leader = True
+        threading.Thread(target=self._receive, name="event-relay", daemon=True).start()
+        logger.info("Event relay leader listening on %s (pid=%s)", self.path, os.getpid())
+        return True
+
+    def _leader_alive(self) -> bool:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            probe.connect(self.path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                logger.exception("Event relay socket closed; no longer leading")
+                self.is_leader = False
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            self.bus.deliver(event)
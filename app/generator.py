@@ -1,60 +1,183 @@
-import os
-import shlex
-import subprocess
 import json
 import logging
-from typing import Tuple, Optional
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from .policy_cache import default_cache
 
 logger = logging.getLogger(__name__)
 SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts", "generate_policy.py")
 
 
-def run_policy_generator(nl_text: str, model: Optional[str] = None, timeout: int = 60) -> Tuple[bool, dict]:
+class GeneratorWorker:
     """
-    Run scripts/generate_policy.py as subprocess and return (ok, payload).
-    ok=True => payload is parsed JSON policy
-    ok=False => error dict
+    One warm `generate_policy.py --serve` process.
+
+    Jobs and replies are single JSON lines over stdin/stdout; a reader
+    thread feeds replies into a queue so a job can time out. A timed-out or
+    crashed process is killed and a fresh one is started for the next job.
     """
-    if not os.path.exists(SCRIPT_PATH):
-        return False, {"error": "script_missing", "detail": SCRIPT_PATH}
 
-    cmd = ["python3", SCRIPT_PATH, "--nl", nl_text]
-    if model:
-        cmd += ["--model", model]
+    def __init__(self, script_path: str = SCRIPT_PATH):
+        self.script_path = script_path
+        self.start_timeout = float(os.getenv("GENERATOR_START_TIMEOUT", "30"))
+        self.info: Dict[str, Any] = {}
+        self._proc: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
 
-    env = os.environ.copy()
-    logger.debug("Running policy generator: %s", " ".join(shlex.quote(p) for p in cmd))
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
 
-    try:
-        proc = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
+    def start(self) -> None:
+        self._lines = lines = queue.Queue()
+        self._proc = proc = subprocess.Popen(
+            [sys.executable, self.script_path, "--serve"],
+            env=os.environ.copy(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
             text=True,
-            timeout=timeout
+            bufsize=1,
         )
-    except subprocess.TimeoutExpired as e:
-        return False, {"error": "timeout", "detail": str(e)}
-
-    stdout = proc.stdout.strip()
-    stderr = proc.stderr.strip()
-
-    if proc.returncode != 0:
-        return False, {
-            "error": "generator_failed",
-            "exit_code": proc.returncode,
-            "stderr": stderr[:2000],
-            "stdout_preview": stdout[:2000]
-        }
-
-    try:
-        policy = json.loads(stdout)
-    except Exception as e:
-        return False, {
-            "error": "invalid_json",
-            "detail": str(e),
-            "stdout": stdout[:4000],
-            "stderr": stderr[:2000]
-        }
-
-    return True, policy
+
+        def read() -> None:
+            for line in proc.stdout:
+                lines.put(line)
+            lines.put(None)
+
+        threading.Thread(target=read, name="policy-generator-reader", daemon=True).start()
+        handshake = self._reply(self.start_timeout)
+        if not handshake or not handshake.get("ready"):
+            self.stop()
+            raise RuntimeError(f"policy generator did not start: {handshake!r}")
+        self.info = handshake
+        logger.info("Started policy generator worker pid=%s", handshake.get("pid"))
+
+    def stop(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    def _reply(self, timeout: float) -> Optional[Dict[str, Any]]:
+        line = self._lines.get(timeout=timeout)
+        return json.loads(line) if line is not None else None
+
+    def run(
+        self,
+        nl_text: str,
+        model: Optional[str],
+        timeout: float,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Tuple[bool, dict]:
+        """
+        Run one job. With on_progress the worker streams the model output
+        and each {"event": ...} line it reports is passed on before the result.
+        """
+        if not self.alive:
+            try:
+                self.start()
+            except (OSError, RuntimeError, ValueError, queue.Empty) as exc:
+                return False, {"error": "generator_failed", "detail": str(exc)}
+        try:
+            job = {"nl": nl_text, "model": model, "stream": on_progress is not None}
+            self._proc.stdin.write(json.dumps(job) + "\n")
+            self._proc.stdin.flush()
+            deadline = time.monotonic() + timeout
+            while True:
+                reply = self._reply(max(deadline - time.monotonic(), 0))
+                if reply is None or "event" not in reply:
+                    break
+                if on_progress is not None:
+                    on_progress(reply)
+        except queue.Empty:
+            self.stop()
+            return False, {"error": "timeout", "detail": f"no result after {timeout}s"}
+        except (OSError, ValueError) as exc:
+            self.stop()
+            return False, {"error": "generator_failed", "detail": str(exc)}
+        if reply is None:
+            exit_code = self._proc.wait()
+            self._proc = None
+            return False, {"error": "generator_failed", "exit_code": exit_code}
+        if reply.pop("ok", False):
+            return True, reply["policy"]
+        return False, reply
+
+
+class GeneratorPool:
+    """
+    A fixed set of warm generator workers.
+
+    generate() borrows an idle worker, so at most GENERATOR_WORKERS
+    generations run at once; further callers wait for a worker to free up.
+    Workers are started on first use.
+    """
+
+    def __init__(self, size: Optional[int] = None, timeout: Optional[float] = None):
+        self.size = size or int(os.getenv("GENERATOR_WORKERS", "2"))
+        self.timeout = timeout or float(os.getenv("GENERATOR_TIMEOUT", "60"))
+        self._idle: "queue.LifoQueue[GeneratorWorker]" = queue.LifoQueue()
+        self._workers = [GeneratorWorker() for _ in range(self.size)]
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def info(self) -> Dict[str, Any]:
+        """The worker handshake (prompt_version, mock), starting a worker if none has run yet."""
+        for worker in self._workers:
+            if worker.info:
+                return worker.info
+        worker = self._idle.get()
+        try:
+            if not worker.alive:
+                worker.start()
+            return worker.info
+        finally:
+            self._idle.put(worker)
+
+    def generate(
+        self,
+        nl_text: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Tuple[bool, dict]:
+        worker = self._idle.get()
+        try:
+            return worker.run(nl_text, model, timeout or self.timeout, on_progress)
+        finally:
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+
+
+_default_pool: Optional[GeneratorPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> GeneratorPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = GeneratorPool()
+        return _default_pool
+
+
+def run_policy_generator(
+    nl_text: str, model: Optional[str] = None, timeout: int = 60, use_cache: bool = True
+) -> Tuple[bool, dict]:
+    """
+    Generate a policy on the process's warm worker pool and return (ok, payload).
+    Results are served from the generated-policy cache when possible.
+    ok=True => payload is parsed JSON policy
+    ok=False => error dict
+    """
+    if not os.path.exists(SCRIPT_PATH):
+        return False, {"error": "script_missing", "detail": SCRIPT_PATH}
+    return default_cache().generate(default_pool(), nl_text, model, timeout, use_cache=use_cache)
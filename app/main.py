@@ -5,8 +5,15 @@ from .enforcement import EnforcementService
 from .policy_store import PolicyStore, seed_demo_policy
 from .tool_registry import ToolRegistry
 from .auditor import AuditorService
-from .utils import init_db_command, get_db
+from .audit_writer import AuditWriter
+from .events import EventBus, UnixSocketRelay
+from .utils import init_db_command, get_db, close_db
 from .generator import run_policy_generator
+from .stream import EventStreamService
+from .retention import AuditRetention
+from .policy_jobs import PolicyJobService
+from .simulation import SimulationService
+from .metrics import MetricsService
 
 # NOTE:
 # create_app() returns a fully-configured Flask app WITHOUT starting
@@ -50,14 +57,26 @@ def configure_app(flask_app: Flask) -> None:
     # core components
     policy_store = PolicyStore()
     tool_registry = ToolRegistry()
-    enforcement_service = EnforcementService(policy_store, tool_registry)
-    auditor = AuditorService()
+    audit_writer = AuditWriter()
+    event_bus = EventBus()
+    enforcement_service = EnforcementService(policy_store, tool_registry, audit_writer, event_bus)
+    auditor = AuditorService(event_bus)
+    event_stream = EventStreamService()
+    retention = AuditRetention()
+    policy_jobs = PolicyJobService()
+    simulation = SimulationService(policy_store)
+    metrics = MetricsService(audit_writer=audit_writer, auditor=auditor, tool_registry=tool_registry)
 
     # register blueprints
     flask_app.register_blueprint(enforcement_service.blueprint)
     flask_app.register_blueprint(policy_store.blueprint)
     flask_app.register_blueprint(tool_registry.blueprint)
     flask_app.register_blueprint(auditor.blueprint)
+    flask_app.register_blueprint(event_stream.blueprint)
+    flask_app.register_blueprint(policy_jobs.blueprint)
+    flask_app.register_blueprint(simulation.blueprint)
+    flask_app.register_blueprint(metrics.blueprint)
+    flask_app.teardown_appcontext(close_db)
 
     # static file routes (safe defaults)
     @flask_app.route("/static/<path:filename>")
@@ -68,7 +87,7 @@ def configure_app(flask_app: Flask) -> None:
     def root():
         return send_from_directory(flask_app.static_folder, "dashboard.html")
 
-    # AI Policy Generator endpoint
+    # AI Policy Generator endpoint (synchronous; /generate_policy/jobs is the async API)
     @flask_app.route("/generate_policy", methods=["POST"])
     def generate_policy_endpoint():
         data = request.get_json(silent=True) or {}
@@ -78,7 +97,7 @@ def configure_app(flask_app: Flask) -> None:
         if not nl or not isinstance(nl, str):
             return jsonify({"status": "error", "error": "missing_nl"}), 400
 
-        ok, result = run_policy_generator(nl, model=model)
+        ok, result = run_policy_generator(nl, model=model, use_cache=data.get("cache", True) is not False)
         if not ok:
             return jsonify({"status": "error", **result}), 500
 
@@ -91,6 +110,13 @@ def configure_app(flask_app: Flask) -> None:
         "tool_registry": tool_registry,
         "enforcement_service": enforcement_service,
         "auditor": auditor,
+        "audit_writer": audit_writer,
+        "event_bus": event_bus,
+        "event_stream": event_stream,
+        "retention": retention,
+        "policy_jobs": policy_jobs,
+        "simulation": simulation,
+        "metrics": metrics,
     }
 
 def start_background_services(app: Flask) -> None:
@@ -112,7 +138,15 @@ def start_background_services(app: Flask) -> None:
             except Exception:
                 # seeding is best-effort in case tests use a separate DB
                 pass
-    auditor = app.extensions["agentguard_components"]["auditor"]
+    components = app.extensions["agentguard_components"]
+    socket_path = os.getenv("AGENTGUARD_EVENT_SOCKET")
+    if socket_path:
+        # aggregate decision events from every gunicorn worker in one auditor
+        UnixSocketRelay(components["event_bus"], socket_path).start()
+    if components["retention"].enabled:
+        components["retention"].start()
+    components["metrics"].start()
+    auditor = components["auditor"]
     threading.Thread(target=auditor.run, args=(app,), daemon=True).start()
 
 if __name__ == "__main__":
@@ -0,0 +1,335 @@
+"""
+Prometheus-style metrics without a client library dependency.
+
+Counters and histograms are plain in-process dicts updated under a
+per-metric lock; gauges are usually callbacks read at collection time.
+GET /metrics renders the Prometheus text format (version 0.0.4).
+
+Under gunicorn each worker only sees its own requests, so when
+METRICS_MULTIPROC_DIR (or PROMETHEUS_MULTIPROC_DIR) is set every process
+writes a JSON snapshot of its metrics to that directory every
+METRICS_FLUSH_INTERVAL seconds and at exit. Files are named by pid and
+process start time, so a restarted worker that reuses a pid never
+overwrites an earlier worker's totals; the directory is never pruned and
+must be wiped on deploy. A scrape served by any worker
+merges its live values with the other workers' files: counters and
+histograms are summed (including those of workers that have exited, so
+totals never go backwards), gauges are summed or maxed per metric and
+ignored once a file is older than METRICS_STALE_AFTER seconds.
+"""
+import atexit
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from flask import Blueprint, Response
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[str, ...]
+
+# seconds; enforcement stages are mostly sub-millisecond
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> Dict[Labels, Any]:
+        with self._lock:
+            return {labels: list(value) if isinstance(value, list) else value for labels, value in self._values.items()}
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.kind, "help": self.documentation, "labels": list(self.labelnames)}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Histogram(Metric):
+    """Per-label-set bucket counts (non-cumulative, +Inf last) followed by the sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[position] += 1
+            counts[-1] += value
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "buckets": list(self.buckets)}
+
+
+class Gauge(Metric):
+    """A settable value, or `function()` read at collection time. `merge` is "sum" or "max" across workers."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+        merge: str = "sum",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.merge = merge
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self) -> Dict[Labels, Any]:
+        if self.function is None:
+            return super().samples()
+        try:
+            return {(): float(self.function())}
+        except Exception:
+            logger.exception("Gauge %s callback failed", self.name)
+            return {}
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "merge": self.merge}
+
+
+class MetricsRegistry:
+    def __init__(self, directory: Optional[str] = None, flush_interval: Optional[float] = None, stale_after: Optional[float] = None):
+        self.directory = directory or os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        self.flush_interval = flush_interval or float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+        self.stale_after = stale_after or float(os.getenv("METRICS_STALE_AFTER", str(3 * self.flush_interval)))
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid: Optional[int] = None
+        self._snapshot_name: Optional[Tuple[int, str]] = None
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and type(existing) is type(metric) and not isinstance(metric, Gauge):
+                return existing
+            self._metrics[metric.name] = metric  # gauges are re-bound to the newest callback
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+        merge: str = "sum",
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, function, merge))
+
+    # -- multiprocess ------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "pid": os.getpid(),
+            "written_at": time.time(),
+            "metrics": {
+                metric.name: {**metric.describe(), "samples": [[list(labels), value] for labels, value in metric.samples().items()]}
+                for metric in metrics
+            },
+        }
+
+    def _snapshot_path(self) -> str:
+        # pid plus this process's start time: pids are reused across worker restarts
+        pid = os.getpid()
+        if self._snapshot_name is None or self._snapshot_name[0] != pid:
+            self._snapshot_name = (pid, f"metrics-{pid}-{time.time_ns()}.json")
+        return os.path.join(self.directory, self._snapshot_name[1])
+
+    def write_snapshot(self) -> None:
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp_path, path)
+
+    def start(self) -> None:
+        """
+        Start the periodic snapshot writer (only when a multiprocess directory
+        is configured). Safe to call again after a fork: the child starts its own.
+        """
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._run_flusher, name="metrics-flusher", daemon=True).start()
+        atexit.register(self.write_snapshot)
+
+    def _run_flusher(self) -> None:
+        while True:
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.exception("Writing metrics snapshot failed")
+            time.sleep(self.flush_interval)
+
+    def _other_snapshots(self) -> Iterable[Dict[str, Any]]:
+        if not self.directory:
+            return
+        own = self._snapshot_path()
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    yield json.load(fh)
+            except (OSError, ValueError):
+                continue  # a worker is mid-write or the file was removed
+
+    # -- exposition --------------------------------------------------------
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Merge this process's live metrics with the other workers' snapshots."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        now = time.time()
+        for snapshot in [self.snapshot(), *self._other_snapshots()]:
+            stale = now - snapshot.get("written_at", 0) > self.stale_after
+            for name, metric in snapshot["metrics"].items():
+                if metric["type"] == "gauge" and stale:
+                    continue
+                entry = merged.setdefault(name, {**metric, "samples": {}})
+                samples = entry["samples"]
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    current = samples.get(key)
+                    if current is None:
+                        samples[key] = value
+                    elif metric["type"] == "histogram":
+                        samples[key] = [a + b for a, b in zip(current, value)]
+                    elif metric["type"] == "gauge" and metric.get("merge") == "max":
+                        samples[key] = max(current, value)
+                    else:
+                        samples[key] = current + value
+        return merged
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {_escape_help(metric['help'])}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labels"]
+            for labels, value in sorted(metric["samples"].items()):
+                pairs = list(zip(labelnames, labels))
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip([*metric["buckets"], math.inf], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: List[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+_default_registry: Optional[MetricsRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry() -> MetricsRegistry:
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = MetricsRegistry()
+        return _default_registry
+
+
+class MetricsService:
+    """
+    GET /metrics in the Prometheus text format, merged across workers when
+    METRICS_MULTIPROC_DIR is set. Gauges for the audit queue depth, the
+    auditor's lag and the age of the tools snapshot are read from the
+    components at scrape time.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, audit_writer=None, auditor=None, tool_registry=None):
+        self.registry = registry or default_registry()
+        self.blueprint = Blueprint("metrics", __name__)
+        self.blueprint.add_url_rule("/metrics", "metrics", self.metrics, methods=["GET"])
+        if audit_writer is not None:
+            self.registry.gauge(
+                "agentguard_audit_queue_depth", "Audit row batches waiting for the writer thread", function=audit_writer.queue_depth
+            )
+        if auditor is not None:
+            self.registry.gauge(
+                "agentguard_auditor_lag_seconds",
+                "Seconds since the auditor last processed every audit decision",
+                function=lambda: auditor.lag_seconds,
+                merge="max",
+            )
+        if tool_registry is not None:
+            self.registry.gauge(
+                "agentguard_tools_snapshot_age_seconds",
+                "Seconds since this worker last reloaded the tools snapshot from the database",
+                function=tool_registry.snapshot_age,
+                merge="max",
+            )
+
+    def start(self) -> None:
+        self.registry.start()
+
+    def metrics(self):
+        return Response(self.registry.render(), mimetype="text/plain; version=0.0.4")
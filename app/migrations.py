@@ -0,0 +1,248 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once, inside its own IMMEDIATE transaction, and is
+recorded in schema_migrations. run_migrations() is called from
+init_db_command() at create_app time, so concurrent workers booting
+against the same file serialise on the write lock and skip anything
+another worker has already applied.
+"""
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+from .rollups import create_rollup_tables, rebuild_rollups
+from .utils import open_db
+
+logger = logging.getLogger(__name__)
+
+
+def _add_policies_created_at(conn: sqlite3.Connection) -> None:
+    """Add created_at column to policies if missing and backfill."""
+    cols = [row["name"] for row in conn.execute("PRAGMA table_info(policies)").fetchall()]
+    if "created_at" not in cols:
+        conn.execute("ALTER TABLE policies ADD COLUMN created_at TEXT")
+    now = datetime.utcnow().isoformat()
+    conn.execute("UPDATE policies SET created_at = ? WHERE created_at IS NULL OR created_at = ''", (now,))
+
+
+def _add_audit_and_anomaly_indexes(conn: sqlite3.Connection) -> None:
+    # Covers the auditor's BLOCK-per-agent window query without touching the table
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_decision_created_agent "
+        "ON audit_logs (decision, created_at, agent_id)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_anomalies_created_at ON anomalies (created_at)")
+
+
+def _add_anomaly_state(conn: sqlite3.Connection) -> None:
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(anomalies)").fetchall()}
+    for name in ("status", "block_count", "last_seen_at", "closed_at"):
+        if name not in cols:
+            kind = "INTEGER" if name == "block_count" else "TEXT"
+            conn.execute(f"ALTER TABLE anomalies ADD COLUMN {name} {kind}")
+    # Rows written by the old polling auditor have no lifecycle; treat them as closed
+    conn.execute("UPDATE anomalies SET status = 'closed' WHERE status IS NULL")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_anomalies_open_agent ON anomalies (agent_id) WHERE status = 'open'"
+    )
+
+
+def _add_audit_filter_indexes(conn: sqlite3.Connection) -> None:
+    # Keyset pages filtered by agent or tool walk these in id order
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_agent_id ON audit_logs (agent_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_tool_id ON audit_logs (tool_id, id)")
+
+
+def _add_audit_rollups(conn: sqlite3.Connection) -> None:
+    create_rollup_tables(conn)
+    rebuild_rollups(conn)
+
+
+def _add_policy_jobs(conn: sqlite3.Connection) -> None:
+    # Generation jobs live in the database so any worker can answer a poll
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS policy_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            nl TEXT NOT NULL,
+            model TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_policy_jobs_created_at ON policy_jobs (created_at)")
+
+
+def _add_policy_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS policy_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            prompt_version TEXT,
+            policy TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_policy_cache_last_used ON policy_cache (last_used_at)")
+
+
+def _add_policy_job_progress(conn: sqlite3.Connection) -> None:
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(policy_jobs)").fetchall()}
+    if "progress" not in cols:
+        conn.execute("ALTER TABLE policy_jobs ADD COLUMN progress TEXT")
+
+
+def _add_audit_params(conn: sqlite3.Connection) -> None:
+    # Redacted request params, only filled when AUDIT_CAPTURE_PARAMS is on
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(audit_logs)").fetchall()}
+    if "params" not in cols:
+        conn.execute("ALTER TABLE audit_logs ADD COLUMN params TEXT")
+
+
+def _add_policy_diffs(conn: sqlite3.Connection) -> None:
+    # Previously created lazily by seed_demo_policy
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS policy_version_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            policy_id INTEGER,
+            version TEXT,
+            detail TEXT,
+            recorded_at TEXT
+        )
+        """
+    )
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(policy_version_history)").fetchall()}
+    for name in ("from_version", "diff"):
+        if name not in cols:
+            conn.execute(f"ALTER TABLE policy_version_history ADD COLUMN {name} TEXT")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_policy_version_history_versions "
+        "ON policy_version_history (version, from_version)"
+    )
+
+
+def _add_registry_meta(conn: sqlite3.Connection) -> None:
+    # Registry bookkeeping, e.g. the digest of the last seeded tool manifest
+    conn.execute("CREATE TABLE IF NOT EXISTS registry_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+def _add_policy_diff_ids(conn: sqlite3.Connection) -> None:
+    # Version names can be deleted and re-created; stored diffs are matched on policy row ids
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(policy_version_history)").fetchall()}
+    for name in ("from_policy_id", "to_policy_id"):
+        if name not in cols:
+            conn.execute(f"ALTER TABLE policy_version_history ADD COLUMN {name} INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_policy_version_history_policy_ids "
+        "ON policy_version_history (from_policy_id, to_policy_id)"
+    )
+
+
+def _add_anomaly_revisions(conn: sqlite3.Connection) -> None:
+    # Every insert or lifecycle update takes the next value of the 'anomalies'
+    # counter, so /events can resume on changed rows, not only new ones
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(anomalies)").fetchall()}
+    if "revision" not in cols:
+        conn.execute("ALTER TABLE anomalies ADD COLUMN revision INTEGER")
+    conn.execute("UPDATE anomalies SET revision = id WHERE revision IS NULL")
+    conn.execute(
+        "INSERT OR IGNORE INTO generations (name, value) SELECT 'anomalies', COALESCE(MAX(id), 0) FROM anomalies"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_anomalies_revision ON anomalies (revision)")
+    bump = """
+        BEGIN
+            UPDATE generations SET value = value + 1 WHERE name = 'anomalies';
+            UPDATE anomalies SET revision = (SELECT value FROM generations WHERE name = 'anomalies') WHERE id = NEW.id;
+        END
+    """
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS anomalies_revision_insert AFTER INSERT ON anomalies {bump}")
+    # revision itself is not in the column list, so the trigger's own UPDATE does not re-fire it
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS anomalies_revision_update "
+        f"AFTER UPDATE OF agent_id, detail, status, block_count, last_seen_at, closed_at ON anomalies {bump}"
+    )
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "policies_created_at", _add_policies_created_at),
+    (2, "audit_and_anomaly_indexes", _add_audit_and_anomaly_indexes),
+    (3, "anomaly_open_close_state", _add_anomaly_state),
+    (4, "audit_filter_indexes", _add_audit_filter_indexes),
+    (5, "audit_rollups", _add_audit_rollups),
+    (6, "policy_jobs", _add_policy_jobs),
+    (7, "policy_cache", _add_policy_cache),
+    (8, "policy_job_progress", _add_policy_job_progress),
+    (9, "audit_params", _add_audit_params),
+    (10, "policy_diffs", _add_policy_diffs),
+    (11, "registry_meta", _add_registry_meta),
+    (12, "policy_diff_ids", _add_policy_diff_ids),
+    (13, "anomaly_revisions", _add_anomaly_revisions),
+]
+
+
+def _ensure_migrations_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+        """
+    )
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    _ensure_migrations_table(conn)
+    row = conn.execute("SELECT MAX(version) AS version FROM schema_migrations").fetchone()
+    return row["version"] or 0
+
+
+def run_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations in order and return the versions applied."""
+    applied: List[int] = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # explicit transaction control below
+    try:
+        _ensure_migrations_table(conn)
+        for version, name, migrate in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,)).fetchone()
+                if not done:
+                    migrate(conn)
+                    conn.execute(
+                        "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                        (version, name, datetime.now(timezone.utc).isoformat()),
+                    )
+                    applied.append(version)
+                    logger.info("Applied schema migration %s (%s)", version, name)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    conn = open_db()
+    try:
+        versions = run_migrations(conn)
+        print(f"schema version {current_version(conn)}; applied {versions or 'nothing'}")
+    finally:
+        conn.close()
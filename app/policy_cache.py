@@ -0,0 +1,122 @@
+"""
+Content-addressed cache of generated policies.
+
+The key is sha256 over the normalised natural-language text, the model
+and the generator's prompt template version, so a prompt change or a
+switch between mock and live generation never serves an old entry. Only
+validated PolicyDocument JSON is stored. Entries expire after
+POLICY_CACHE_TTL seconds and the least recently used are evicted beyond
+POLICY_CACHE_SIZE entries.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+from .utils import pooled_db
+
+if TYPE_CHECKING:
+    from .generator import GeneratorPool
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_nl(nl_text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", nl_text).split())
+
+
+def cache_key(nl_text: str, model: Optional[str], prompt_version: str) -> str:
+    material = json.dumps([normalize_nl(nl_text), model or "", prompt_version])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class PolicyCache:
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("POLICY_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv("POLICY_CACHE_SIZE", "1000"))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        db = pooled_db()
+        now = time.time()
+        row = db.execute("SELECT policy, created_at FROM policy_cache WHERE key = ?", (key,)).fetchone()
+        with db:
+            if row is not None and now - row["created_at"] > self.ttl:
+                db.execute("DELETE FROM policy_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                db.execute("UPDATE policy_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(row["policy"]) if row is not None else None
+
+    def put(self, key: str, policy: Dict[str, Any], model: Optional[str], prompt_version: str) -> None:
+        db = pooled_db()
+        now = time.time()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO policy_cache (key, model, prompt_version, policy, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, json.dumps(policy), now, now),
+            )
+            excess = db.execute("SELECT COUNT(*) AS n FROM policy_cache").fetchone()["n"] - self.max_entries
+            if excess > 0:
+                db.execute(
+                    "DELETE FROM policy_cache WHERE key IN "
+                    "(SELECT key FROM policy_cache ORDER BY last_used_at LIMIT ?)",
+                    (excess,),
+                )
+        if excess > 0:
+            with self._lock:
+                self.evictions += excess
+
+    def generate(
+        self,
+        pool: "GeneratorPool",
+        nl_text: str,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Tuple[bool, dict]:
+        """pool.generate() behind the cache; use_cache=False regenerates and refreshes the entry."""
+        try:
+            info = pool.info()
+        except Exception as exc:
+            return False, {"error": "generator_failed", "detail": str(exc)}
+        key_model = "mock" if info.get("mock") else model
+        prompt_version = info.get("prompt_version", "")
+        key = cache_key(nl_text, key_model, prompt_version)
+        if use_cache:
+            cached = self.get(key)
+            if cached is not None:
+                return True, cached
+        ok, result = pool.generate(nl_text, model, timeout, on_progress)
+        if ok:
+            self.put(key, result, key_model, prompt_version)
+        return ok, result
+
+    def stats(self) -> Dict[str, Any]:
+        entries = pooled_db().execute("SELECT COUNT(*) AS n FROM policy_cache").fetchone()["n"]
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries}
+
+
+_default_cache: Optional[PolicyCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> PolicyCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PolicyCache()
+        return _default_cache
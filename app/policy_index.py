@@ -0,0 +1,233 @@
+import heapq
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    position: int
+    predicate: Predicate
+    effect: str
+    reason: str
+    conditional: bool = True
+
+
+def normalize_effect(effect: Any) -> str:
+    """
+    Map effects (including the generator's "allow"/"deny") onto ALLOW/BLOCK
+    for simulation comparisons. Enforcement does not use it: only an
+    effect of exactly "ALLOW" allows.
+    """
+    return "ALLOW" if str(effect).strip().upper() in ("ALLOW", "ALLOWED") else "BLOCK"
+
+
+def rule_tool(rule: Dict[str, Any]) -> Optional[str]:
+    # Handle both "tool_id" and "tool" fields (backwards compatible)
+    return rule.get("tool_id") or rule.get("tool")
+
+
+def tool_targets(tool: Any) -> Tuple[Any, ...]:
+    """Return every request tool_id a rule tool matches (with and without the mcp: prefix)."""
+    if not isinstance(tool, str):
+        return (tool,)
+    if tool.startswith("mcp:"):
+        return (tool, tool.split("mcp:", 1)[1])
+    return (tool, f"mcp:{tool}")
+
+
+def _always(params: Dict[str, Any]) -> bool:
+    return True
+
+
+def _compile_condition(key: str, expected: Any) -> Predicate:
+    if not isinstance(expected, dict):
+        return lambda params: params.get(key) == expected
+
+    checks: List[Predicate] = []
+    if "equals" in expected:
+        equals = expected["equals"]
+        checks.append(lambda params: params.get(key) == equals)
+    if "lte" in expected:
+        limit = expected["lte"]
+
+        def lte(params: Dict[str, Any]) -> bool:
+            value = params.get(key)
+            return isinstance(value, (int, float)) and not value > limit
+
+        checks.append(lte)
+    if not checks:
+        return _always
+    if len(checks) == 1:
+        return checks[0]
+    return lambda params: all(check(params) for check in checks)
+
+
+def compile_conditions(conditions: Dict[str, Any]) -> Predicate:
+    """Compile a rule's conditions dict into a single predicate over request params."""
+    predicates = [_compile_condition(key, expected) for key, expected in (conditions or {}).items()]
+    if not predicates:
+        return _always
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda params: all(predicate(params) for predicate in predicates)
+
+
+def _canonical_tool(tool: Any) -> Any:
+    if isinstance(tool, str) and not tool.startswith("mcp:"):
+        return f"mcp:{tool}"
+    return tool
+
+
+def _rule_body(rule: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "effect": rule.get("effect", "BLOCK"),
+        "conditions": rule.get("conditions") or {},
+        "reason": rule.get("reason", "rule_matched"),
+    }
+
+
+def _rules_by_key(rules: Iterable[Dict[str, Any]]) -> Dict[Tuple[Any, str], List[str]]:
+    keyed: Dict[Tuple[Any, str], List[str]] = {}
+    for rule in rules:
+        tool = rule_tool(rule)
+        if not tool:
+            continue
+        body = json.dumps(_rule_body(rule), sort_keys=True, default=str)
+        for role in rule.get("roles", []):
+            keyed.setdefault((_canonical_tool(tool), role), []).append(body)
+    return keyed
+
+
+def _rules_by_tool(rules: Iterable[Dict[str, Any]]) -> Dict[Any, List[str]]:
+    keyed: Dict[Any, List[str]] = {}
+    for rule in rules:
+        tool = rule_tool(rule)
+        if not tool:
+            continue
+        entry = {"roles": sorted(rule.get("roles", []), key=str), **_rule_body(rule)}
+        keyed.setdefault(_canonical_tool(tool), []).append(json.dumps(entry, sort_keys=True, default=str))
+    return keyed
+
+
+def diff_rules(old_rules: Iterable[Dict[str, Any]], new_rules: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Structural diff between two rule lists, keyed by (tool, role).
+    Each key carries its rules in evaluation order; a key is "changed" when
+    that ordered list differs. A request with several roles merges their
+    buckets by rule position, so a tool whose rules moved relative to each
+    other across roles is listed under "reordered" even when every
+    (tool, role) list is the same.
+    """
+    old_rules, new_rules = list(old_rules), list(new_rules)
+    old, new = _rules_by_key(old_rules), _rules_by_key(new_rules)
+    old_tools, new_tools = _rules_by_tool(old_rules), _rules_by_tool(new_rules)
+    touched = {key[0] for key in old.keys() ^ new.keys()}
+    touched.update(key[0] for key in old.keys() & new.keys() if old[key] != new[key])
+
+    def entry(key: Tuple[Any, str], **rules: List[str]) -> Dict[str, Any]:
+        return {"tool": key[0], "role": key[1], **{name: [json.loads(body) for body in bodies] for name, bodies in rules.items()}}
+
+    return {
+        "added": [entry(key, rules=new[key]) for key in sorted(new.keys() - old.keys(), key=str)],
+        "removed": [entry(key, rules=old[key]) for key in sorted(old.keys() - new.keys(), key=str)],
+        "changed": [
+            entry(key, before=old[key], after=new[key])
+            for key in sorted(old.keys() & new.keys(), key=str)
+            if old[key] != new[key]
+        ],
+        "reordered": sorted(
+            (tool for tool in old_tools.keys() & new_tools.keys() if tool not in touched and old_tools[tool] != new_tools[tool]),
+            key=str,
+        ),
+        "unchanged": sum(1 for key in old.keys() & new.keys() if old[key] == new[key]),
+    }
+
+
+def changed_targets(diff: Dict[str, Any]) -> Set[Any]:
+    """Request tool_ids whose index buckets a diff touches."""
+    targets: Set[Any] = set()
+    for section in ("added", "removed", "changed"):
+        for item in diff.get(section, ()):
+            targets.update(tool_targets(item["tool"]))
+    for tool in diff.get("reordered", ()):
+        targets.update(tool_targets(tool))
+    return targets
+
+
+class PolicyIndex:
+    """
+    Immutable decision index for one policy version.
+
+    Rules are bucketed by request tool_id, then by role, with conditions
+    pre-compiled into predicates. Evaluation keeps first-match semantics
+    by merging the candidate buckets in original rule order.
+
+    Given a `base` index and the tool_ids a diff touches (`changed`), only
+    those tool_ids are recompiled; every other tool's buckets are shared
+    with the base. Positions are only compared within one tool_id, and a
+    tool whose rules changed or moved relative to each other (across any
+    of its roles) is always in `changed`, so the shared buckets keep their
+    relative order.
+    """
+
+    def __init__(
+        self,
+        version: Optional[str],
+        rules: Iterable[Dict[str, Any]],
+        base: Optional["PolicyIndex"] = None,
+        changed: Optional[Set[Any]] = None,
+        policy_id: Optional[int] = None,
+    ):
+        self.version = version
+        self.policy_id = policy_id
+        self.rules: Tuple[Dict[str, Any], ...] = tuple(rules)
+        reuse = base is not None and changed is not None
+        table: Dict[Any, Dict[str, List[CompiledRule]]] = {}
+        for position, rule in enumerate(self.rules):
+            tool = rule_tool(rule)
+            if not tool:
+                continue
+            targets = [target for target in tool_targets(tool) if not reuse or target in changed]
+            if not targets:
+                continue
+            conditions = rule.get("conditions") or {}
+            compiled = CompiledRule(
+                position,
+                compile_conditions(conditions),
+                rule.get("effect", "BLOCK"),
+                rule.get("reason", "rule_matched"),
+                bool(conditions),
+            )
+            for target in targets:
+                by_role = table.setdefault(target, {})
+                for role in rule.get("roles", []):
+                    by_role.setdefault(role, []).append(compiled)
+        self._table: Dict[Any, Dict[str, Tuple[CompiledRule, ...]]] = {
+            target: {role: tuple(entries) for role, entries in by_role.items()}
+            for target, by_role in table.items()
+        }
+        self.recompiled = len(self._table)
+        if reuse:
+            for target, by_role in base._table.items():
+                if target not in changed:
+                    self._table[target] = by_role
+
+    def candidates(self, roles: List[str], tool_id: str) -> Iterable[CompiledRule]:
+        by_role = self._table.get(tool_id)
+        if not by_role:
+            return ()
+        buckets = [by_role[role] for role in roles if role in by_role]
+        if not buckets:
+            return ()
+        if len(buckets) == 1:
+            return buckets[0]
+        return heapq.merge(*buckets, key=lambda entry: entry.position)
+
+    def match(self, roles: List[str], tool_id: str, params: Dict[str, Any]) -> Optional[CompiledRule]:
+        for entry in self.candidates(roles, tool_id):
+            if entry.predicate(params):
+                return entry
+        return None
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from flask import Blueprint, Response, jsonify, request
+from .generator import GeneratorPool, default_pool
+from .policy_cache import PolicyCache, default_cache
+from .utils import get_db, get_read_db, open_db, pooled_db
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("done", "failed")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def job_view(row) -> Dict[str, Any]:
+    job = {key: row[key] for key in ("id", "status", "model", "created_at", "started_at", "finished_at")}
+    job["job_id"] = job.pop("id")
+    if row["result"] is not None:
+        job["policy"] = json.loads(row["result"])
+    if row["error"] is not None:
+        job["error"] = json.loads(row["error"])
+    job["progress"] = json.loads(row["progress"]) if row["progress"] else {"rules": []}
+    return job
+
+
+class PolicyJobService:
+    """
+    Asynchronous policy generation.
+
+    POST /generate_policy/jobs records a queued job and returns 202 with its
+    id; the generation runs on the warm GeneratorPool in this process.
+    GET /generate_policy/jobs/<id> reads the job from the database (so any
+    worker can answer) and with ?wait=<seconds> holds the request until the
+    job finishes or the wait runs out. Results go through the PolicyCache;
+    {"cache": false} forces a fresh generation.
+
+    The model output is streamed: each rule is recorded under "progress" as
+    soon as it has been validated, and GET /generate_policy/jobs/<id>/events
+    pushes those rules as Server-Sent Events followed by the finished job.
+    """
+
+    def __init__(self, pool: Optional[GeneratorPool] = None, cache: Optional[PolicyCache] = None):
+        self.blueprint = Blueprint("policy_jobs", __name__)
+        self.blueprint.add_url_rule("/generate_policy/jobs", "submit_job", self.submit_job, methods=["POST"])
+        self.blueprint.add_url_rule("/generate_policy/jobs/<job_id>", "get_job", self.get_job, methods=["GET"])
+        self.blueprint.add_url_rule("/generate_policy/jobs/<job_id>/events", "job_events", self.job_events, methods=["GET"])
+        self.blueprint.add_url_rule("/generate_policy/cache", "cache_stats", self.cache_stats, methods=["GET"])
+        self._pool = pool
+        self.cache = cache or default_cache()
+        self.max_pending = int(os.getenv("GENERATOR_QUEUE_SIZE", "100"))
+        self.max_wait = float(os.getenv("GENERATOR_MAX_WAIT", "30"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pool(self) -> GeneratorPool:
+        if self._pool is None:
+            self._pool = default_pool()
+        return self._pool
+
+    def submit_job(self):
+        data = request.get_json(silent=True) or {}
+        nl = data.get("nl")
+        model = data.get("model") or os.getenv("GEMINI_MODEL", "models/gemini-2.5-pro")
+        if not nl or not isinstance(nl, str):
+            return jsonify({"status": "error", "error": "missing_nl"}), 400
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return jsonify({"status": "error", "error": "queue_full", "max_pending": self.max_pending}), 503
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.pool.size, thread_name_prefix="policy-job")
+
+        job_id = uuid.uuid4().hex
+        db = get_db()
+        db.execute(
+            "INSERT INTO policy_jobs (id, status, nl, model, created_at) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, nl, model, _now()),
+        )
+        db.commit()
+        self._executor.submit(self._run_job, job_id, nl, model, data.get("cache", True) is not False)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202, {"Location": f"/generate_policy/jobs/{job_id}"}
+
+    def get_job(self, job_id: str):
+        wait = min(request.args.get("wait", default=0.0, type=float), self.max_wait)
+        deadline = time.monotonic() + wait
+        db = get_read_db()
+        while True:
+            row = db.execute("SELECT * FROM policy_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return jsonify({"status": "error", "error": "job_not_found"}), 404
+            if row["status"] in FINISHED or time.monotonic() >= deadline:
+                return jsonify(job_view(row))
+            time.sleep(0.1)
+
+    def job_events(self, job_id: str):
+        if get_read_db().execute("SELECT 1 FROM policy_jobs WHERE id = ?", (job_id,)).fetchone() is None:
+            return jsonify({"status": "error", "error": "job_not_found"}), 404
+        return Response(
+            self._stream_job(job_id),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def _stream_job(self, job_id: str) -> Iterator[str]:
+        db = open_db(read_only=True)
+        sent = 0
+        deadline = time.monotonic() + self.pool.timeout + self.max_wait
+        try:
+            while True:
+                job = job_view(db.execute("SELECT * FROM policy_jobs WHERE id = ?", (job_id,)).fetchone())
+                for rule in job["progress"]["rules"][sent:]:
+                    yield f"event: rule\ndata: {json.dumps(rule)}\n\n"
+                sent = len(job["progress"]["rules"])
+                if job["status"] in FINISHED or time.monotonic() >= deadline:
+                    yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+                    return
+                time.sleep(0.1)
+        finally:
+            db.close()
+
+    def cache_stats(self):
+        return jsonify(self.cache.stats())
+
+    def _run_job(self, job_id: str, nl: str, model: str, use_cache: bool = True) -> None:
+        db = pooled_db()
+        try:
+            with db:
+                db.execute("UPDATE policy_jobs SET status = 'running', started_at = ? WHERE id = ?", (_now(), job_id))
+            rules: List[Dict[str, Any]] = []
+
+            def on_progress(event: Dict[str, Any]) -> None:
+                if event.get("event") == "rule":
+                    rules.append(event["rule"])
+                    with db:
+                        db.execute("UPDATE policy_jobs SET progress = ? WHERE id = ?", (json.dumps({"rules": rules}), job_id))
+
+            try:
+                ok, result = self.cache.generate(self.pool, nl, model, use_cache=use_cache, on_progress=on_progress)
+            except Exception as exc:
+                logger.exception("Policy job %s failed", job_id)
+                ok, result = False, {"error": "generator_failed", "detail": str(exc)}
+            with db:
+                db.execute(
+                    "UPDATE policy_jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (
+                        "done" if ok else "failed",
+                        json.dumps(result) if ok else None,
+                        None if ok else json.dumps(result),
+                        _now(),
+                        job_id,
+                    ),
+                )
+        finally:
+            with self._lock:
+                self._pending -= 1
@@ -1,11 +1,14 @@
 import json
 import logging
+import sqlite3
+import threading
 from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 from flask import Blueprint, jsonify, request
 from packaging.version import Version, InvalidVersion
-from .utils import get_db
+from .policy_index import PolicyIndex, changed_targets, diff_rules
+from .utils import get_db, get_read_db, read_generation
 
 @dataclass
 class PolicyResult:
@@ -19,9 +22,13 @@ class PolicyStore:
         self.blueprint.add_url_rule("/policies", "list_policies", self.list_policies, methods=["GET"])
         self.blueprint.add_url_rule("/policies", "create_policy", self.create_policy, methods=["POST"])
         self.blueprint.add_url_rule("/policies/<int:policy_id>", "delete_policy", self.delete_policy, methods=["DELETE"])
+        self.blueprint.add_url_rule("/policies/diff", "diff_policies", self.diff_policies, methods=["GET"])
+        # (generation, index) pair, replaced as a whole so readers never see a torn update
+        self._compiled: Tuple[Optional[int], Optional[PolicyIndex]] = (None, None)
+        self._compile_lock = threading.Lock()
 
     def list_policies(self):
-        db = get_db()
+        db = get_read_db()
         rows = db.execute("SELECT * FROM policies ORDER BY version DESC").fetchall()
         policies = []
         for row in rows:
@@ -60,7 +67,8 @@ class PolicyStore:
                 rule = {**rule, "tool_id": rule["tool"]}
             rules_list.append(rule)
         created_at = datetime.now(timezone.utc).isoformat()
-        db.execute(
+        previous = self.get_active_policy_for_request(db)
+        cursor = db.execute(
             """
             INSERT INTO policies (version, name, rules, created_by, signature_placeholder, created_at)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -74,61 +82,138 @@ class PolicyStore:
                 created_at,
             ),
         )
+        active = self.get_active_policy_for_request(db)
+        self._record_diff(db, cursor.lastrowid, previous, active, f"created policy {version}")
         db.commit()
+        self.refresh_index(db)
         return jsonify({"status": "created", "version": version, "created_at": created_at})
 
-    def evaluate(self, roles: List[str], tool_id: str, params: Dict[str, Any]) -> PolicyResult:
-        db = get_db()
+    def evaluate(self, roles: List[str], tool_id: str, params: Dict[str, Any], db=None) -> PolicyResult:
+        index = self.get_index(db if db is not None else get_db())
+        return self.evaluate_index(index, roles, tool_id, params)
+
+    @staticmethod
+    def evaluate_index(index: Optional[PolicyIndex], roles: List[str], tool_id: str, params: Dict[str, Any]) -> PolicyResult:
+        if index is None:
+            return PolicyResult("BLOCK", None, "no_policy")
+        entry = index.match(roles, tool_id, params)
+        if entry is not None:
+            return PolicyResult(entry.effect, index.version, entry.reason)
+        return PolicyResult("BLOCK", index.version, "no_rule_matched")
+
+    def get_index(self, db) -> Optional[PolicyIndex]:
+        """
+        Return the compiled index of the active policy.
+        The policies generation counter is the only query on the hot path;
+        the index is recompiled only when another writer has changed the table.
+        """
+        generation = read_generation(db, "policies")
+        compiled_generation, index = self._compiled
+        if compiled_generation == generation:
+            return index
+        return self.refresh_index(db, generation)
+
+    def loaded_index(self) -> Optional[PolicyIndex]:
+        """The index as last compiled, without checking the generation counter."""
+        return self._compiled[1]
+
+    def refresh_index(self, db, generation: Optional[int] = None) -> Optional[PolicyIndex]:
+        """Recompile the active policy and swap it in atomically."""
+        with self._compile_lock:
+            if generation is None:
+                generation = read_generation(db, "policies")
+            compiled_generation, index = self._compiled
+            if compiled_generation == generation:
+                return index
+            index = self._compile_active(db, base=index)
+            self._compiled = (generation, index)
+            return index
+
+    def _compile_active(self, db, base: Optional[PolicyIndex] = None) -> Optional[PolicyIndex]:
+        """
+        Compile the active policy. When an index is already loaded, only the
+        tools touched by the diff from it are recompiled. The diff recorded
+        by create_policy/delete_policy is only reused when it was taken
+        between exactly these two policy rows (a version name can be deleted
+        and re-created with other rules); otherwise it is computed from the
+        base index's rules.
+        """
         policy_dict = self.get_active_policy_for_request(db)
         if not policy_dict:
-            return PolicyResult("BLOCK", None, "no_policy")
-        
-        rules_str = policy_dict.get("rules")
-        if isinstance(rules_str, str):
-            rules = json.loads(rules_str)
-        elif isinstance(rules_str, list):
-            rules = rules_str
-        else:
-            rules = []
-        
+            return None
         version = policy_dict.get("version")
-        for rule in rules:
-            rule_roles = rule.get("roles", [])
-            # Handle both "tool_id" and "tool" fields (backwards compatible)
-            rule_tool = rule.get("tool_id") or rule.get("tool")
-            if not rule_tool:
-                continue
-            if not set(roles).intersection(rule_roles):
-                continue
-            normalized_targets = {rule_tool}
-            # If rule_tool doesn't have "mcp:" prefix, add it for matching
-            if isinstance(rule_tool, str):
-                if rule_tool.startswith("mcp:"):
-                    normalized_targets.add(rule_tool.split("mcp:", 1)[1])
-                else:
-                    # If tool doesn't have mcp: prefix, also try with it
-                    normalized_targets.add(f"mcp:{rule_tool}")
-            if tool_id not in normalized_targets:
-                continue
-            conditions = rule.get("conditions", {})
-            if self._match_conditions(params, conditions):
-                return PolicyResult(rule.get("effect", "BLOCK"), version, rule.get("reason", "rule_matched"))
-        return PolicyResult("BLOCK", version, "no_rule_matched")
+        rules = _policy_rules(policy_dict)
+        policy_id = policy_dict.get("id")
+        if base is None:
+            return PolicyIndex(version, rules, policy_id=policy_id)
+        diff = None
+        if base.policy_id is not None:
+            diff = self._stored_diff(db, base.policy_id, policy_id)
+        if diff is None:
+            diff = diff_rules(base.rules, rules)
+        return PolicyIndex(version, rules, base=base, changed=changed_targets(diff), policy_id=policy_id)
 
-    def _match_conditions(self, params: Dict[str, Any], conditions: Dict[str, Any]) -> bool:
-        for key, expected in conditions.items():
-            value = params.get(key)
-            if isinstance(expected, dict):
-                if "equals" in expected and value != expected["equals"]:
-                    return False
-                if "lte" in expected and not isinstance(value, (int, float)):
-                    return False
-                if "lte" in expected and value > expected["lte"]:
-                    return False
+    def _stored_diff(self, db, from_policy_id: int, to_policy_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            row = db.execute(
+                "SELECT diff FROM policy_version_history WHERE from_policy_id = ? AND to_policy_id = ? "
+                "AND diff IS NOT NULL ORDER BY id DESC LIMIT 1",
+                (from_policy_id, to_policy_id),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None  # history table not migrated yet
+        diff = json.loads(row["diff"]) if row else None
+        # diffs recorded before cross-role reorders were tracked cannot rule them out
+        return diff if diff is not None and "reordered" in diff else None
+
+    def _record_diff(
+        self,
+        db,
+        policy_id: Optional[int],
+        previous: Optional[Dict[str, Any]],
+        active: Optional[Dict[str, Any]],
+        detail: str,
+    ) -> None:
+        """Store the rule diff between the previously and newly active policy rows in policy_version_history."""
+        diff = diff_rules(_policy_rules(previous) if previous else [], _policy_rules(active) if active else [])
+        db.execute(
+            """
+            INSERT INTO policy_version_history
+                (policy_id, version, detail, recorded_at, from_version, diff, from_policy_id, to_policy_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                policy_id,
+                active.get("version") if active else None,
+                detail,
+                datetime.now(timezone.utc).isoformat(),
+                previous.get("version") if previous else None,
+                json.dumps(diff),
+                previous.get("id") if previous else None,
+                active.get("id") if active else None,
+            ),
+        )
+
+    def diff_policies(self):
+        """GET /policies/diff?from=<version>&to=<version> (to defaults to the active policy)."""
+        db = get_read_db()
+        from_version = request.args.get("from")
+        to_version = request.args.get("to")
+        if not from_version:
+            return jsonify({"status": "error", "error": "missing_from_version"}), 400
+        policies = {}
+        for name, version in (("from", from_version), ("to", to_version)):
+            if version:
+                row = db.execute(
+                    "SELECT * FROM policies WHERE version = ? ORDER BY id DESC LIMIT 1", (version,)
+                ).fetchone()
+                policies[name] = dict(row) if row else None
             else:
-                if value != expected:
-                    return False
-        return True
+                policies[name] = self.get_active_policy_for_request(db)
+            if policies[name] is None:
+                return jsonify({"status": "error", "error": "not_found", "version": version}), 404
+        diff = diff_rules(_policy_rules(policies["from"]), _policy_rules(policies["to"]))
+        return jsonify({"from": policies["from"]["version"], "to": policies["to"]["version"], **diff})
 
     def _safe_version_key(self, version_str: str, created_at_str: Optional[str] = None) -> Tuple[Any, Optional[datetime]]:
         """
@@ -211,11 +296,25 @@ class PolicyStore:
         if not cursor.fetchone():
             return jsonify({"status": "error", "error": "not_found"}), 404
         
+        previous = self.get_active_policy_for_request(db)
         db.execute("DELETE FROM policies WHERE id = ?", (policy_id,))
+        active = self.get_active_policy_for_request(db)
+        if previous and (active or {}).get("id") != previous["id"]:
+            self._record_diff(db, policy_id, previous, active, f"deleted policy {policy_id}")
         db.commit()
+        self.refresh_index(db)
         return jsonify({"status": "deleted", "policy_id": policy_id}), 200
 
 
+def _policy_rules(policy_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rules = policy_dict.get("rules")
+    if isinstance(rules, str):
+        return json.loads(rules)
+    if isinstance(rules, list):
+        return rules
+    return []
+
+
 DEMO_RULES = [
     {
         "roles": ["reader"],
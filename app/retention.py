@@ -0,0 +1,174 @@
+"""
+Audit log retention and cold archive.
+
+audit_logs only keeps the last AUDIT_RETENTION_DAYS days. Older rows are
+moved, one UTC day at a time, into append-only gzip JSONL partitions
+(audit-YYYY-MM-DD.jsonl.gz) under AUDIT_ARCHIVE_DIR and then deleted from
+the hot table. The rollup tables are left alone, so /audit/stats still
+covers archived days. iter_archive() streams the partitions back for
+offline queries (see scripts/query_archive.py).
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+from .utils import db_path, open_db
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "audit-"
+PARTITION_SUFFIX = ".jsonl.gz"
+
+
+def partition_name(day: str) -> str:
+    return f"{PARTITION_PREFIX}{day}{PARTITION_SUFFIX}"
+
+
+def partition_day(path: Path) -> Optional[str]:
+    name = path.name
+    if not (name.startswith(PARTITION_PREFIX) and name.endswith(PARTITION_SUFFIX)):
+        return None
+    return name[len(PARTITION_PREFIX):-len(PARTITION_SUFFIX)]
+
+
+class AuditRetention:
+    """
+    Moves expired audit rows into per-day archive partitions.
+
+    Each batch is archived and deleted inside one BEGIN IMMEDIATE
+    transaction: the rows are appended as a new gzip member and fsynced
+    before the DELETE commits, so a row is never deleted without being
+    archived. A crash between the fsync and the commit can archive a batch
+    twice; readers that need exact counts should de-duplicate on id.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        retention_days: Optional[int] = None,
+        archive_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.path = path or db_path()
+        self.retention_days = retention_days if retention_days is not None else int(os.getenv("AUDIT_RETENTION_DAYS", "0"))
+        self.archive_dir = Path(archive_dir or os.getenv("AUDIT_ARCHIVE_DIR") or f"{self.path}.archive")
+        self.batch_size = batch_size or int(os.getenv("AUDIT_RETENTION_BATCH", "5000"))
+        self.interval = float(os.getenv("AUDIT_RETENTION_INTERVAL", "3600"))
+        self.vacuum = os.getenv("AUDIT_RETENTION_VACUUM", "false").lower() == "true"
+        self.archived = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    def cutoff(self, now: Optional[datetime] = None) -> str:
+        """First day that is still kept in audit_logs."""
+        now = now or datetime.now(timezone.utc)
+        return (now.date() - timedelta(days=self.retention_days)).isoformat()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="audit-retention", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Audit retention pass failed")
+            time.sleep(self.interval)
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Archive and delete every row older than the cutoff; returns rows per day."""
+        if not self.enabled:
+            return {}
+        cutoff = self.cutoff(now)
+        conn = open_db(self.path)
+        conn.isolation_level = None
+        moved: Dict[str, int] = {}
+        try:
+            days = [
+                row["day"]
+                for row in conn.execute(
+                    "SELECT DISTINCT substr(created_at, 1, 10) AS day FROM audit_logs "
+                    "WHERE created_at < ? ORDER BY day",
+                    (cutoff,),
+                )
+            ]
+            for day in days:
+                moved[day] = self._archive_day(conn, day)
+            if moved and self.vacuum:
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
+        if moved:
+            logger.info("Archived %d audit rows older than %s", sum(moved.values()), cutoff)
+        return moved
+
+    def _archive_day(self, conn, day: str) -> int:
+        upper = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        target = self.archive_dir / partition_name(day)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        total = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM audit_logs WHERE created_at >= ? AND created_at < ? ORDER BY id LIMIT ?",
+                    (day, upper, self.batch_size),
+                ).fetchall()
+                if not rows:
+                    conn.execute("COMMIT")
+                    return total
+                # each batch is its own gzip member; concatenated members read back as one stream
+                with open(target, "ab") as raw:
+                    with gzip.GzipFile(fileobj=raw, mode="wb") as archive:
+                        for row in rows:
+                            archive.write((json.dumps(dict(row), default=str) + "\n").encode())
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                conn.executemany("DELETE FROM audit_logs WHERE id = ?", [(row["id"],) for row in rows])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            total += len(rows)
+            self.archived += len(rows)
+
+
+def iter_archive(
+    archive_dir: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    filters: Optional[Mapping[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream archived rows in day order without loading a partition into memory.
+    since/until are ISO timestamps (until is exclusive); partitions outside
+    the range are skipped by file name.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if value not in (None, "")}
+    partitions: List[Path] = sorted(
+        path for path in Path(archive_dir).glob(f"{PARTITION_PREFIX}*{PARTITION_SUFFIX}") if partition_day(path)
+    )
+    for path in partitions:
+        day = partition_day(path)
+        if since and day < since[:10]:
+            continue
+        if until and day > until[:10]:
+            continue
+        with gzip.open(path, "rt") as archive:
+            for line in archive:
+                row = json.loads(line)
+                created_at = row.get("created_at") or ""
+                if since and created_at < since:
+                    continue
+                if until and created_at >= until:
+                    continue
+                if any(row.get(key) != value for key, value in filters.items()):
+                    continue
+                yield row
@@ -0,0 +1,58 @@
+"""
+Pre-aggregated decision counts.
+
+audit_rollup_minute and audit_rollup_hour hold counts per time bucket and
+(agent_id, tool_id, decision, reason, policy_version). They are kept
+current by AFTER INSERT triggers on audit_logs, so every batch the audit
+writer commits updates them in the same transaction, and so do spill
+replays and rows inserted by scripts. NULL key values are stored as ''.
+"""
+import sqlite3
+
+ROLLUP_KEY = ("agent_id", "tool_id", "decision", "reason", "policy_version")
+# table -> length of the created_at prefix used as its bucket
+ROLLUP_TABLES = {"audit_rollup_minute": 16, "audit_rollup_hour": 13}
+
+
+def _key_values(source: str) -> str:
+    return ", ".join(f"COALESCE({source}{column}, '')" for column in ROLLUP_KEY)
+
+
+def create_rollup_tables(conn: sqlite3.Connection) -> None:
+    key_columns = ", ".join(f"{column} TEXT NOT NULL" for column in ROLLUP_KEY)
+    for table, prefix in ROLLUP_TABLES.items():
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                {key_columns},
+                count INTEGER NOT NULL,
+                PRIMARY KEY (bucket, {', '.join(ROLLUP_KEY)})
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_on_audit_insert AFTER INSERT ON audit_logs
+            BEGIN
+                INSERT INTO {table} (bucket, {', '.join(ROLLUP_KEY)}, count)
+                VALUES (COALESCE(substr(NEW.created_at, 1, {prefix}), ''), {_key_values('NEW.')}, 1)
+                ON CONFLICT DO UPDATE SET count = count + 1;
+            END
+            """
+        )
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute every rollup table from audit_logs (backfill)."""
+    for table, prefix in ROLLUP_TABLES.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(
+            f"""
+            INSERT INTO {table} (bucket, {', '.join(ROLLUP_KEY)}, count)
+            SELECT COALESCE(substr(created_at, 1, {prefix}), ''), {_key_values('')}, COUNT(*)
+            FROM audit_logs
+            GROUP BY 1, 2, 3, 4, 5, 6
+            """
+        )
+
@@ -0,0 +1,303 @@
+"""
+Bulk evaluation of test vectors against a compiled policy.
+
+Vectors are grouped by (tool, roles): each group's candidate rules are
+resolved from the PolicyIndex once, and when the first candidate has no
+conditions the whole group is decided without looking at params. Only
+groups that reach a conditional rule evaluate predicates per vector.
+"""
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from flask import Blueprint, jsonify, request
+from .policy_index import PolicyIndex, normalize_effect
+from .policy_store import PolicyStore
+from .utils import get_read_db
+
+# Audit reasons decided before policy evaluation; replaying them says nothing about the policy
+PRE_POLICY_REASONS = ("tool_not_found", "invalid_tool_signature")
+
+
+class SimulationError(ValueError):
+    pass
+
+
+def _roles(value: Any) -> Tuple[str, ...]:
+    if isinstance(value, str):
+        return tuple(role for role in value.split(",") if role)
+    if value is not None and (not isinstance(value, list) or not all(isinstance(role, str) for role in value)):
+        raise SimulationError("roles must be a list of strings or a comma-separated string")
+    return tuple(value or ())
+
+
+def _optional_int(data: Mapping[str, Any], name: str) -> Optional[int]:
+    value = data.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise SimulationError(f"{name} must be a non-negative integer")
+    return value
+
+
+def decide_group(index: Optional[PolicyIndex], roles: Tuple[str, ...], tool: str):
+    """
+    Return (constant, candidates) for one (tool, roles) group. `constant` is
+    the (decision, reason) every vector in the group gets, or None when a
+    conditional rule has to be checked against each vector's params.
+    """
+    if index is None:
+        return ("BLOCK", "no_policy"), ()
+    candidates = tuple(index.candidates(list(roles), tool))
+    if not candidates:
+        return ("BLOCK", "no_rule_matched"), ()
+    if not candidates[0].conditional:
+        return (candidates[0].effect, candidates[0].reason), ()
+    return None, candidates
+
+
+def _decide(group, params: Mapping[str, Any]) -> Tuple[str, str]:
+    constant, candidates = group
+    if constant is not None:
+        return constant
+    for entry in candidates:
+        if entry.predicate(params):
+            return entry.effect, entry.reason
+    return "BLOCK", "no_rule_matched"
+
+
+def simulate(
+    index: Optional[PolicyIndex],
+    vectors: Iterable[Mapping[str, Any]],
+    max_failures: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Evaluate every vector and compare against its "expected" decision.
+    Vectors accept tool/tool_id, agent_roles/roles, params and expected
+    (allow/deny or ALLOW/BLOCK); rule effects and expectations are both
+    normalized before comparing. Returns a pass/fail report.
+    """
+    max_failures = max_failures if max_failures is not None else int(os.getenv("SIMULATION_MAX_FAILURES", "100"))
+    groups: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+    outcomes: Counter = Counter()
+    by_tool: Dict[str, Counter] = {}
+    failures: List[Dict[str, Any]] = []
+    total = passed = unchecked = 0
+    for position, vector in enumerate(vectors):
+        tool = vector.get("tool_id") or vector.get("tool")
+        if not tool:
+            raise SimulationError(f"vector {position} has no tool")
+        roles = _roles(vector.get("agent_roles", vector.get("roles")))
+        params = vector.get("params") or {}
+        if not isinstance(params, Mapping):
+            raise SimulationError(f"vector {position} params must be an object")
+        key = (tool, roles)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = decide_group(index, roles, tool)
+        decision, reason = _decide(group, params)
+        decision = normalize_effect(decision)
+
+        total += 1
+        tool_counts = by_tool.setdefault(tool, Counter())
+        expected = vector.get("expected", vector.get("expected_decision"))
+        if expected is None:
+            unchecked += 1
+            outcomes[(decision, None)] += 1
+            continue
+        expected = normalize_effect(expected)
+        outcomes[(decision, expected)] += 1
+        if decision == expected:
+            passed += 1
+            tool_counts["passed"] += 1
+            continue
+        tool_counts["failed"] += 1
+        if len(failures) < max_failures:
+            failures.append({
+                "index": position,
+                "tool": tool,
+                "roles": list(roles),
+                "params": params,
+                "expected": expected,
+                "actual": decision,
+                "reason": reason,
+            })
+    failed = total - passed - unchecked
+    return {
+        "policy_version": index.version if index is not None else None,
+        "total": total,
+        "passed": passed,
+        "failed": failed,
+        "unchecked": unchecked,
+        "ok": failed == 0,
+        "groups": len(groups),
+        "outcomes": [
+            {"actual": actual, "expected": expected, "count": count}
+            for (actual, expected), count in sorted(outcomes.items(), key=lambda item: -item[1])
+        ],
+        "by_tool": {tool: dict(counts) for tool, counts in sorted(by_tool.items())},
+        "failures": failures,
+    }
+
+
+def _policy_decision_filter() -> Tuple[List[str], List[Any]]:
+    clauses = [f"reason NOT IN ({', '.join('?' for _ in PRE_POLICY_REASONS)})", "reason NOT LIKE 'schema_error:%'"]
+    return clauses, list(PRE_POLICY_REASONS)
+
+
+def what_if(
+    db,
+    index: Optional[PolicyIndex],
+    since: str,
+    until: Optional[str] = None,
+    max_pairs: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Replay audited policy decisions in [since, until) through `index` and
+    count the (agent, tool) pairs whose decision would flip.
+
+    Rows are read off a cursor, so memory is bounded by the number of
+    distinct (tool, roles) groups and at most `max_pairs` flip pairs (later
+    new pairs are only counted in the totals). Rows that reach a conditional
+    rule need captured params (AUDIT_CAPTURE_PARAMS); without them they are
+    reported as "unknown". Redacted or truncated values are compared as stored.
+    """
+    max_pairs = max_pairs or int(os.getenv("WHATIF_MAX_PAIRS", "10000"))
+    clauses, params = _policy_decision_filter()
+    clauses.append("created_at >= ?")
+    params.append(since)
+    if until:
+        clauses.append("created_at < ?")
+        params.append(until)
+    cursor = db.execute(
+        f"SELECT agent_id, roles, tool_id, decision, params FROM audit_logs WHERE {' AND '.join(clauses)}",
+        params,
+    )
+    groups: Dict[Tuple[str, Tuple[str, ...]], Any] = {}
+    pairs: Counter = Counter()
+    flips: Counter = Counter()
+    replayed = unknown = 0
+    truncated = False
+    for row in cursor:
+        roles = _roles(row["roles"])
+        key = (row["tool_id"], roles)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = decide_group(index, roles, row["tool_id"])
+        if group[0] is None and row["params"] is None:
+            unknown += 1
+            continue
+        decision, _ = _decide(group, json.loads(row["params"]) if row["params"] else {})
+        decision = normalize_effect(decision)
+        replayed += 1
+        previous = normalize_effect(row["decision"])
+        if decision == previous:
+            continue
+        flips[f"{previous}->{decision}"] += 1
+        pair = (row["agent_id"], row["tool_id"], previous, decision)
+        if pair in pairs or len(pairs) < max_pairs:
+            pairs[pair] += 1
+        else:
+            truncated = True
+    return {
+        "policy_version": index.version if index is not None else None,
+        "since": since,
+        "until": until,
+        "replayed": replayed,
+        "unknown": unknown,
+        "unchanged": replayed - sum(flips.values()),
+        "flips": dict(flips),
+        "pairs": [
+            {"agent_id": agent, "tool_id": tool, "from": previous, "to": decision, "count": count}
+            for (agent, tool, previous, decision), count in pairs.most_common()
+        ],
+        "truncated": truncated,
+    }
+
+
+def audit_vectors(db, since: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Historical decisions as vectors whose expected value is what was decided
+    then. Only policy decisions are replayed, with captured params when
+    AUDIT_CAPTURE_PARAMS was on and empty params otherwise.
+    """
+    clauses, params = _policy_decision_filter()
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    sql = f"SELECT roles, tool_id, decision, params FROM audit_logs WHERE {' AND '.join(clauses)} ORDER BY id DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    for row in db.execute(sql, params):
+        yield {
+            "roles": row["roles"],
+            "tool_id": row["tool_id"],
+            "params": json.loads(row["params"]) if row["params"] else {},
+            "expected": row["decision"],
+        }
+
+
+class SimulationService:
+    """
+    POST /policies/simulate
+
+    The policy under test is "policy" (a policy or generated PolicyDocument
+    body), "version" (a stored version) or, by default, the active policy.
+    Vectors are "vectors", else the policy's own test_vectors, or
+    {"source": "audit", "since": ..., "limit": ...} to replay audit_logs.
+
+    POST /policies/whatif replays the last "hours" (default 24) of audited
+    decisions, or "since"/"until", through the candidate policy and reports
+    the decisions that would flip.
+    """
+
+    def __init__(self, policy_store: PolicyStore):
+        self.policy_store = policy_store
+        self.blueprint = Blueprint("simulation", __name__)
+        self.blueprint.add_url_rule("/policies/simulate", "simulate_policy", self.simulate_policy, methods=["POST"])
+        self.blueprint.add_url_rule("/policies/whatif", "what_if", self.what_if, methods=["POST"])
+
+    def simulate_policy(self):
+        data = request.get_json(silent=True) or {}
+        db = get_read_db()
+        try:
+            index, policy = self._index(db, data)
+            if data.get("source") == "audit":
+                vectors: Iterable[Mapping[str, Any]] = audit_vectors(db, data.get("since"), _optional_int(data, "limit"))
+            else:
+                vectors = data.get("vectors") or (policy or {}).get("test_vectors") or []
+                if not isinstance(vectors, list) or not all(isinstance(vector, dict) for vector in vectors):
+                    raise SimulationError("vectors must be a list of objects")
+            report = simulate(index, vectors, _optional_int(data, "max_failures"))
+        except (SimulationError, TypeError, ValueError) as exc:
+            return jsonify({"error": "invalid_simulation", "details": str(exc)}), 400
+        return jsonify(report)
+
+    def what_if(self):
+        data = request.get_json(silent=True) or {}
+        db = get_read_db()
+        try:
+            index, _ = self._index(db, data)
+            since = data.get("since")
+            if not since:
+                hours = float(data.get("hours", 24))
+                since = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+            report = what_if(db, index, since, data.get("until"), _optional_int(data, "max_pairs"))
+        except (SimulationError, TypeError, ValueError) as exc:
+            return jsonify({"error": "invalid_simulation", "details": str(exc)}), 400
+        return jsonify(report)
+
+    def _index(self, db, data: Mapping[str, Any]) -> Tuple[Optional[PolicyIndex], Optional[Dict[str, Any]]]:
+        policy = data.get("policy")
+        if policy is not None:
+            if not isinstance(policy, dict) or not isinstance(policy.get("rules"), list):
+                raise SimulationError("policy must be an object with a rules list")
+            return PolicyIndex(policy.get("version"), policy["rules"]), policy
+        if data.get("version"):
+            row = db.execute("SELECT version, rules FROM policies WHERE version = ?", (data["version"],)).fetchone()
+            if row is None:
+                raise SimulationError(f"unknown policy version {data['version']}")
+            return PolicyIndex(row["version"], json.loads(row["rules"] or "[]")), None
+        return self.policy_store.get_index(db), None
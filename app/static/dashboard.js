@@ -1,25 +1,122 @@
 // Dashboard-specific JavaScript
+const MAX_LIVE_LOGS = 200;
 let allLogs = [];
 let allPolicies = [];
+let allTools = [];
+let allAnomalies = [];
 let currentFilter = { agent_id: null, tool_id: null };
 let selectedAgentId = null;
+let renderPending = false;
+// Server-side totals from /audit/stats, kept current from the event stream
+let statsTotals = { agents: new Set(), total: 0, blocked: 0 };
 
-async function loadStats() {
+function asList(data) {
+  return Array.isArray(data) ? data : [];
+}
+
+// Fetch everything once; afterwards the /events stream keeps allLogs and allAnomalies current
+async function loadInitialData() {
+  const [logs, policies, tools, anomalies, stats] = await Promise.all([
+    fetchJSON("/audit").catch(() => []),
+    fetchJSON("/policies").catch(() => []),
+    fetchJSON("/tools").catch(() => []),
+    fetchJSON("/anomalies").catch(() => []),
+    fetchJSON("/audit/stats?group_by=agent_id,decision").catch(() => ({}))
+  ]);
+  statsTotals = { agents: new Set(), total: 0, blocked: 0 };
+  asList(stats && stats.groups).forEach(group => {
+    if (group.agent_id) statsTotals.agents.add(group.agent_id);
+    statsTotals.total += group.count;
+    if ((group.decision || "").toLowerCase() !== "allow") statsTotals.blocked += group.count;
+  });
+  allLogs = asList(logs);
+  allPolicies = asList(policies);
+  allTools = asList(tools);
+  allAnomalies = asList(anomalies);
+  renderAll();
+}
+
+// Policies and tools are not streamed; refetch them when the stream says they changed
+async function refreshConfig() {
+  const [policies, tools] = await Promise.all([
+    fetchJSON("/policies").catch(() => allPolicies),
+    fetchJSON("/tools").catch(() => allTools)
+  ]);
+  allPolicies = asList(policies);
+  allTools = asList(tools);
+  scheduleRender();
+}
+
+function renderAll() {
+  renderStats();
+  renderAgentAndToolPanels();
+  renderDashboard();
+}
+
+function scheduleRender() {
+  // Coalesce bursts of streamed events into one re-render
+  if (renderPending) return;
+  renderPending = true;
+  setTimeout(() => {
+    renderPending = false;
+    renderAll();
+  }, 250);
+}
+
+function maxId(rows) {
+  return rows.reduce((max, row) => Math.max(max, row.id || 0), 0);
+}
+
+function maxRevision(rows) {
+  return rows.reduce((max, row) => Math.max(max, row.revision || row.id || 0), 0);
+}
+
+function startEventStream() {
+  if (!window.EventSource) {
+    // No SSE support: fall back to periodic full reloads
+    setInterval(loadInitialData, 5000);
+    return;
+  }
+  const source = new EventSource(
+    `/events?audit_after=${maxId(allLogs)}&anomaly_after=${maxRevision(allAnomalies)}`
+  );
+  // The server ends each stream after a few minutes; EventSource reconnects
+  // by itself and resumes from Last-Event-ID. Changes made while it was
+  // reconnecting are not announced, so refetch policies and tools on open.
+  let opened = false;
+  source.addEventListener("open", () => {
+    if (opened) refreshConfig();
+    opened = true;
+  });
+  source.addEventListener("error", () => {
+    // A refused stream (e.g. 503 when the server is at its stream limit) is not retried
+    if (source.readyState === EventSource.CLOSED) setInterval(loadInitialData, 5000);
+  });
+  source.addEventListener("config", refreshConfig);
+  source.addEventListener("audit", (e) => {
+    const log = JSON.parse(e.data);
+    if (log.agent_id) statsTotals.agents.add(log.agent_id);
+    statsTotals.total += 1;
+    if ((log.decision || "").toLowerCase() !== "allow") statsTotals.blocked += 1;
+    allLogs.unshift(log);
+    if (allLogs.length > MAX_LIVE_LOGS) allLogs.length = MAX_LIVE_LOGS;
+    scheduleRender();
+  });
+  source.addEventListener("anomaly", (e) => {
+    // new anomalies and status/count updates of known ones
+    const anomaly = JSON.parse(e.data);
+    const index = allAnomalies.findIndex((a) => a.id === anomaly.id);
+    if (index >= 0) allAnomalies[index] = anomaly;
+    else allAnomalies.unshift(anomaly);
+    scheduleRender();
+  });
+}
+
+function renderStats() {
   try {
-    const [logs, policies] = await Promise.all([
-      fetchJSON("/audit").catch(() => []),
-      fetchJSON("/policies").catch(() => [])
-    ]);
-
-    allLogs = logs || [];
-    allPolicies = policies || [];
-
-    // Calculate stats
-    const uniqueAgents = new Set(allLogs.map(log => log.agent_id).filter(Boolean));
-    const totalRequests = allLogs.length;
-    const threatsBlocked = allLogs.filter(log => 
-      (log.decision || "").toLowerCase() !== "allow"
-    ).length;
+    const uniqueAgents = statsTotals.agents;
+    const totalRequests = statsTotals.total;
+    const threatsBlocked = statsTotals.blocked;
     const activePolicies = allPolicies.length;
 
     // Update stat cards
@@ -28,20 +125,12 @@ async function loadStats() {
     document.getElementById("stat-threats-blocked").textContent = threatsBlocked.toLocaleString();
     document.getElementById("stat-active-policies").textContent = activePolicies;
   } catch (e) {
-    console.error("loadStats error", e);
+    console.error("renderStats error", e);
   }
 }
 
-async function loadAgentAndToolPanels() {
+function renderAgentAndToolPanels() {
   try {
-    const [logs, tools] = await Promise.all([
-      fetchJSON("/audit").catch(() => []),
-      fetchJSON("/tools").catch(() => [])
-    ]);
-
-    allLogs = logs || [];
-    const toolsData = tools || [];
-
     // Aggregate agents from audit logs
     const agentsMap = new Map();
     allLogs.forEach(log => {
@@ -80,9 +169,9 @@ async function loadAgentAndToolPanels() {
     });
 
     renderAgentsPanel(agentsAggregated);
-    renderToolsPanel(toolsData);
+    renderToolsPanel(allTools);
   } catch (e) {
-    console.error("loadAgentAndToolPanels error", e);
+    console.error("renderAgentAndToolPanels error", e);
   }
 }
 
@@ -279,21 +368,21 @@ function setAgentFilter(agentId) {
   currentFilter.agent_id = agentId;
   currentFilter.tool_id = null;
   updateFilterPill();
-  loadDashboard();
+  renderDashboard();
 }
 
 function setToolFilter(toolId) {
   currentFilter.tool_id = toolId;
   currentFilter.agent_id = null;
   updateFilterPill();
-  loadDashboard();
+  renderDashboard();
 }
 
 function clearFilter() {
   currentFilter.agent_id = null;
   currentFilter.tool_id = null;
   updateFilterPill();
-  loadDashboard();
+  renderDashboard();
 }
 
 function updateFilterPill() {
@@ -364,16 +453,15 @@ function closeAgentDrawer() {
   }
 }
 
-async function loadDashboard() {
+function renderDashboard() {
   try {
-    const logs = await fetchJSON("/audit");
     const tbody = document.querySelector("#audit-table tbody");
     if (!tbody) return;
     
     tbody.innerHTML = "";
     
     // Apply filters
-    let filteredLogs = logs || [];
+    let filteredLogs = allLogs;
     
     // Time range filter
     const timeRange = document.getElementById("time-range-filter")?.value || "all";
@@ -449,7 +537,7 @@ async function loadDashboard() {
       tbody.appendChild(tr);
     });
 
-    const anomalies = await fetchJSON("/anomalies");
+    const anomalies = allAnomalies;
     const list = document.getElementById("anomaly-list");
     if (list) {
       list.innerHTML = "";
@@ -468,7 +556,7 @@ async function loadDashboard() {
       }
     }
   } catch (e) {
-    console.error("loadDashboard error", e);
+    console.error("renderDashboard error", e);
     const tbody = document.querySelector("#audit-table tbody");
     if (tbody) {
       tbody.innerHTML = `<tr><td colspan="5" class="text-center text-muted">Error loading audit logs</td></tr>`;
@@ -558,24 +646,15 @@ document.addEventListener("DOMContentLoaded", () => {
   const auditSearch = document.getElementById("audit-search");
 
   if (timeRangeFilter) {
-    timeRangeFilter.addEventListener("change", loadDashboard);
+    timeRangeFilter.addEventListener("change", renderDashboard);
   }
   if (decisionFilter) {
-    decisionFilter.addEventListener("change", loadDashboard);
+    decisionFilter.addEventListener("change", renderDashboard);
   }
   if (auditSearch) {
-    auditSearch.addEventListener("input", loadDashboard);
+    auditSearch.addEventListener("input", renderDashboard);
   }
 
-  // Load all data
-  loadStats();
-  loadAgentAndToolPanels();
-  loadDashboard();
-  
-  // Auto-refresh every 5 seconds
-  setInterval(() => {
-    loadStats();
-    loadAgentAndToolPanels();
-    loadDashboard();
-  }, 5000);
+  // Load all data once, then follow new audit rows and anomalies over SSE
+  loadInitialData().then(startEventStream);
 });
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+from flask import Blueprint, Response, jsonify, request
+from .utils import db_path, open_db, read_generation
+
+# Tables whose changes are announced as "config" events so clients refetch them
+CONFIG_GENERATIONS = ("policies", "tools")
+
+
+def _format_event(kind: str, cursor: Tuple[int, int], payload: dict) -> str:
+    return f"id: {cursor[0]}:{cursor[1]}\nevent: {kind}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+class EventStreamService:
+    """
+    Server-Sent Events feed of new audit rows and of new or changed anomalies.
+
+    Each event id is "<audit_id>:<anomaly_revision>"; an anomaly's revision
+    moves on every insert and lifecycle update (status, block_count, ...),
+    so open/close transitions are pushed as well. A reconnecting browser
+    sends the last id back as Last-Event-ID and resumes exactly where it
+    left off. Rows are read from a dedicated read-only connection, which
+    works the same whichever gunicorn worker serves the stream.
+
+    Policy and tool changes are announced as "config" events carrying the
+    new generation counters, so clients know when to refetch them.
+
+    A stream holds a worker thread for its whole lifetime, so it is closed
+    after EVENTS_MAX_SECONDS (default 300) and the browser reconnects on its
+    own, and at most EVENTS_MAX_STREAMS (default 1) streams are served per
+    process; further requests get a 503 and should fall back to polling.
+    """
+
+    def __init__(self):
+        self.blueprint = Blueprint("events", __name__)
+        self.blueprint.add_url_rule("/events", "stream_events", self.stream_events, methods=["GET"])
+        self.poll_interval = float(os.getenv("EVENTS_POLL_INTERVAL", "1"))
+        self.heartbeat_interval = float(os.getenv("EVENTS_HEARTBEAT_INTERVAL", "15"))
+        self.batch_limit = int(os.getenv("EVENTS_BATCH_LIMIT", "500"))
+        self.max_seconds = float(os.getenv("EVENTS_MAX_SECONDS", "300"))
+        self.max_streams = int(os.getenv("EVENTS_MAX_STREAMS", "1"))
+        self._streams = 0
+        self._streams_lock = threading.Lock()
+
+    def stream_events(self):
+        if not self._acquire_stream():
+            res = jsonify({"error": "too_many_streams", "details": "poll /audit and /anomalies instead"})
+            res.status_code = 503
+            res.headers["Retry-After"] = str(int(self.max_seconds or 60))
+            return res
+        try:
+            path = db_path()
+            cursor = self._resume_point(path)
+            res = Response(
+                self._generate(path, cursor, self.max_seconds or None),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        except Exception:
+            self._release_stream()
+            raise
+        # close() runs even when the body was never iterated, unlike the generator's finally
+        res.call_on_close(self._release_stream)
+        return res
+
+    def _acquire_stream(self) -> bool:
+        with self._streams_lock:
+            if self.max_streams and self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def _release_stream(self) -> None:
+        with self._streams_lock:
+            self._streams -= 1
+
+    def _resume_point(self, path: str) -> Tuple[int, int]:
+        """
+        Resume from Last-Event-ID (sent by a reconnecting browser, so it wins
+        over the URL it reconnects to), else ?audit_after=&anomaly_after=,
+        else the current end of both (only new changes are pushed).
+        """
+        audit_after = request.args.get("audit_after", type=int)
+        anomaly_after = request.args.get("anomaly_after", type=int)
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if ":" in last_event_id:
+            audit_id, _, anomaly_revision = last_event_id.partition(":")
+            if audit_id.isdigit() and anomaly_revision.isdigit():
+                audit_after, anomaly_after = int(audit_id), int(anomaly_revision)
+        if audit_after is None or anomaly_after is None:
+            conn = open_db(path, read_only=True)
+            try:
+                if audit_after is None:
+                    audit_after = conn.execute("SELECT MAX(id) AS id FROM audit_logs").fetchone()["id"] or 0
+                if anomaly_after is None:
+                    anomaly_after = conn.execute("SELECT MAX(revision) AS revision FROM anomalies").fetchone()["revision"] or 0
+            finally:
+                conn.close()
+        return audit_after, anomaly_after
+
+    def _generate(self, path: str, cursor: Tuple[int, int], max_seconds: Optional[float] = None) -> Iterator[str]:
+        audit_after, anomaly_after = cursor
+        conn = open_db(path, read_only=True)
+        started = last_sent = time.monotonic()
+        try:
+            generations = self._config_generations(conn)
+            yield f"retry: {int(self.poll_interval * 1000) + 2000}\n\n"
+            while max_seconds is None or time.monotonic() - started < max_seconds:
+                sent = False
+                current = self._config_generations(conn)
+                if current != generations:
+                    generations = current
+                    sent = True
+                    yield _format_event("config", (audit_after, anomaly_after), current)
+                for row in conn.execute(
+                    "SELECT * FROM audit_logs WHERE id > ? ORDER BY id LIMIT ?", (audit_after, self.batch_limit)
+                ).fetchall():
+                    audit_after = row["id"]
+                    sent = True
+                    yield _format_event("audit", (audit_after, anomaly_after), dict(row))
+                for row in conn.execute(
+                    "SELECT * FROM anomalies WHERE revision > ? ORDER BY revision LIMIT ?", (anomaly_after, self.batch_limit)
+                ).fetchall():
+                    anomaly_after = row["revision"]
+                    sent = True
+                    yield _format_event("anomaly", (audit_after, anomaly_after), dict(row))
+                now = time.monotonic()
+                if sent:
+                    last_sent = now
+                elif now - last_sent >= self.heartbeat_interval:
+                    last_sent = now
+                    yield ": keep-alive\n\n"
+                if not sent:
+                    time.sleep(self.poll_interval)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _config_generations(conn) -> Dict[str, int]:
+        return {name: read_generation(conn, name) for name in CONFIG_GENERATIONS}
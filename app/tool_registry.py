@@ -1,10 +1,21 @@
+import hashlib
+import hmac
 import json
-from typing import Any, Dict, Optional
-from flask import Blueprint, jsonify
-from pydantic import BaseModel, Field
-from .utils import get_db, open_db
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+from flask import Blueprint, jsonify, request
+from pydantic import BaseModel, Field, create_model
+from .metrics import MetricsRegistry, default_registry
+from .utils import get_db, get_read_db, pooled_db, read_generation
 from . import utils
 
+logger = logging.getLogger(__name__)
+
 
 # -----------------------------
 # Pydantic Schemas
@@ -116,6 +127,269 @@ DEFAULT_TOOLS = [
 ]
 
 
+# -----------------------------
+# Signature Verification Cache
+# -----------------------------
+def definition_digest(definition: str) -> str:
+    return hashlib.sha256(definition.encode()).hexdigest()
+
+
+class SignatureCache:
+    """
+    Remembers signature verification results keyed by
+    (tool_id, version, definition digest), so each stored definition is
+    HMAC-checked once per process. Rotating ENFORCEMENT_HMAC_KEY clears it.
+    Hits and misses are also counted in /metrics.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, metrics: Optional[MetricsRegistry] = None):
+        self.max_entries = max_entries or int(os.getenv("TOOL_SIGNATURE_CACHE_SIZE", "4096"))
+        self._results: Dict[Tuple[str, str, str], bool] = {}
+        self._secret: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookups = (metrics or default_registry()).counter(
+            "agentguard_tool_signature_cache_lookups_total", "Tool signature cache lookups", ("result",)
+        )
+
+    def verify(self, tool: Dict[str, Any], digest: str) -> bool:
+        secret = os.getenv("ENFORCEMENT_HMAC_KEY", "dev-secret")
+        if secret != self._secret:
+            with self._lock:
+                if secret != self._secret:
+                    self._results = {}
+                    self._secret = secret
+        key = (tool["id"], tool["version"], digest)
+        result = self._results.get(key)
+        if result is not None:
+            self.hits += 1
+            self.lookups.inc(("hit",))
+            return result
+        self.misses += 1
+        self.lookups.inc(("miss",))
+        result = verify_tool_signature(tool, secret)
+        with self._lock:
+            if len(self._results) >= self.max_entries:
+                self._results = {}
+            self._results[key] = result
+        return result
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._results = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._results)}
+
+
+def verify_tool_signature(tool: Dict[str, Any], secret: str) -> bool:
+    msg = f"{tool['id']}|{tool['version']}|{json.dumps(tool['input_schema'], sort_keys=True)}".encode()
+    expected = hmac.new(secret.encode(), msg, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, tool.get("signature", ""))
+
+
+# -----------------------------
+# Generated Input Schemas
+# -----------------------------
+SCHEMA_TYPES: Dict[str, Any] = {
+    "integer": int,
+    "number": float,
+    "string": str,
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+def _field_definition(name: str, spec: Any) -> Tuple[Any, Any]:
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    if not isinstance(spec, dict):
+        return (Any, Field(..., alias=name))
+    field_type = SCHEMA_TYPES.get(spec.get("type"), Any)
+    minimum = spec.get("min", spec.get("minimum"))
+    maximum = spec.get("max", spec.get("maximum"))
+    constraints: Dict[str, Any] = {}
+    if field_type in (int, float):
+        constraints = {"ge": minimum, "le": maximum}
+    elif field_type in (str, list):
+        constraints = {"min_length": minimum, "max_length": maximum}
+    constraints = {key: value for key, value in constraints.items() if value is not None}
+    default = ... if spec.get("required", True) else spec.get("default")
+    return (field_type if default is ... else Optional[field_type], Field(default, alias=name, **constraints))
+
+
+def build_schema_model(tool_id: str, input_schema: Any) -> Type[BaseModel]:
+    """
+    Build a pydantic model from a registered input_schema of the form
+    {"param": {"type": "integer", "min": 1, "max": 100, "required": true}}.
+    Fields are required unless "required" is false; min/max bound numbers
+    and the length of strings and arrays. Unknown types accept any value.
+    Params bind through aliases, so names that shadow BaseModel attributes
+    (e.g. "schema") still validate.
+    """
+    fields = {
+        f"field_{position}": _field_definition(str(name), spec)
+        for position, (name, spec) in enumerate(input_schema.items() if isinstance(input_schema, dict) else ())
+    }
+    return create_model(f"InputSchema[{tool_id}]", **fields)
+
+
+class SchemaCache:
+    """
+    Validator classes generated from tool input_schemas, keyed by
+    (tool_id, version) and evicted least recently used beyond
+    TOOL_SCHEMA_CACHE_SIZE. An entry is only reused for the exact
+    definition object it was built from, so a reloaded snapshot never
+    validates against a stale schema.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("TOOL_SCHEMA_CACHE_SIZE", "1024"))
+        self._models: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], Type[BaseModel]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tool: Dict[str, Any]) -> Type[BaseModel]:
+        key = (tool["id"], tool["version"])
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and entry[0] is tool:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        try:
+            model = build_schema_model(tool["id"], tool.get("input_schema"))
+        except (TypeError, ValueError, NameError) as exc:
+            logger.warning("Unusable input_schema for %s@%s, params not validated: %s", tool["id"], tool["version"], exc)
+            model = BaseModel
+        with self._lock:
+            self._models[key] = (tool, model)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_entries:
+                self._models.popitem(last=False)
+        return model
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._models)}
+
+
+# -----------------------------
+# Tool Import / Manifests
+# -----------------------------
+MANIFEST_DIGEST_KEY = "tool_manifest_digest"
+
+
+class ToolImportError(ValueError):
+    pass
+
+
+class ToolConflictError(ToolImportError):
+    def __init__(self, conflicts: List[Tuple[str, str]]):
+        super().__init__(f"{len(conflicts)} tool(s) already exist")
+        self.conflicts = conflicts
+
+
+def parse_manifest(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse a tool manifest: a JSON list, a {"tools": [...]} object, a single
+    tool object, or JSON Lines with one tool per line.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line))
+            except json.JSONDecodeError as exc:
+                raise ToolImportError(f"line {number}: {exc.msg}") from exc
+    if isinstance(data, dict):
+        data = data["tools"] if isinstance(data.get("tools"), list) else [data]
+    if not isinstance(data, list):
+        raise ToolImportError("manifest must be a list of tool definitions")
+    return data
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as fh:
+        return parse_manifest(fh.read())
+
+
+def signed_definition(tool: Any) -> Dict[str, Any]:
+    """Validate one tool definition and sign it with utils.sign_tool (any supplied signature is replaced)."""
+    if not isinstance(tool, dict):
+        raise ToolImportError("tool definition must be an object")
+    for field in ("id", "version"):
+        if not isinstance(tool.get(field), str) or not tool[field]:
+            raise ToolImportError(f"tool definition needs a non-empty string {field!r}")
+    input_schema = tool.get("input_schema", {})
+    if not isinstance(input_schema, dict):
+        raise ToolImportError(f"{tool['id']}@{tool['version']}: input_schema must be an object")
+    definition = {**tool, "input_schema": input_schema}
+    definition["signature"] = utils.sign_tool(tool["id"], tool["version"], input_schema)
+    return definition
+
+
+def import_tools(db, tools: Iterable[Any], replace: bool = False, strict: bool = False) -> Tuple[int, int]:
+    """
+    Sign and store tool definitions in the caller's transaction and return
+    (written, skipped). Existing (tool_id, version) rows are kept unless
+    `replace`, in which case only rows whose definition differs are rewritten.
+    With `strict` (and no `replace`) nothing is written when any
+    (tool_id, version) already exists or repeats; ToolConflictError lists them.
+    """
+    rows = []
+    for position, tool in enumerate(tools):
+        try:
+            definition = signed_definition(tool)
+        except ToolImportError as exc:
+            raise ToolImportError(f"tool {position}: {exc}") from exc
+        rows.append((definition["id"], definition["version"], json.dumps(definition)))
+    if strict and not replace:
+        conflicts = _conflicts(db, [(tool_id, version) for tool_id, version, _ in rows])
+        if conflicts:
+            raise ToolConflictError(conflicts)
+    if replace:
+        sql = (
+            "INSERT INTO tools (tool_id, version, definition) VALUES (?, ?, ?) "
+            "ON CONFLICT (tool_id, version) DO UPDATE SET definition = excluded.definition "
+            "WHERE definition != excluded.definition"
+        )
+    else:
+        sql = "INSERT OR IGNORE INTO tools (tool_id, version, definition) VALUES (?, ?, ?)"
+    written = db.executemany(sql, rows).rowcount if rows else 0
+    return written, len(rows) - written
+
+
+def _conflicts(db, keys: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    conflicts, seen = [], set()
+    for key in keys:
+        if key in seen or db.execute("SELECT 1 FROM tools WHERE tool_id = ? AND version = ?", key).fetchone():
+            conflicts.append(key)
+        seen.add(key)
+    return conflicts
+
+
+def manifest_digest(tools: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(tools, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def startup_manifest() -> List[Dict[str, Any]]:
+    """DEFAULT_TOOLS plus the tools in TOOLS_MANIFEST (JSON or JSONL), if set."""
+    path = os.getenv("TOOLS_MANIFEST")
+    return DEFAULT_TOOLS + (load_manifest(path) if path else [])
+
+
 # -----------------------------
 # Tool Registry Class
 # -----------------------------
@@ -123,38 +397,140 @@ class ToolRegistry:
     def __init__(self):
         self.blueprint = Blueprint("tools", __name__)
         self.blueprint.add_url_rule("/tools", "list_tools", self.list_tools)
+        self.blueprint.add_url_rule("/tools", "register_tools", self.register_tools, methods=["POST"])
+        self.blueprint.add_url_rule("/tools/import", "import_tools", self.import_manifest, methods=["POST"])
+        self.signature_cache = SignatureCache()
+        self.schema_cache = SchemaCache()
+        # (generation, {(tool_id, version): (definition, digest)}, loaded_at), replaced as a whole
+        self._snapshot: Tuple[Optional[int], Dict[Tuple[str, str], Tuple[Dict[str, Any], str]], float] = (None, {}, 0.0)
+        self._snapshot_lock = threading.Lock()
         self._load_default_tools()
 
     def _load_default_tools(self):
-        db = open_db()
-        for tool in DEFAULT_TOOLS:
-            signature = utils.sign_tool(
-                tool["id"], tool["version"], tool["input_schema"]
-            )
-            full = {**tool, "signature": signature}
-
-            db.execute(
-                """
-                INSERT OR IGNORE INTO tools (tool_id, version, definition)
-                VALUES (?, ?, ?)
-                """,
-                (tool["id"], tool["version"], json.dumps(full)),
-            )
-        db.commit()
-        db.close()
+        """
+        Seed the startup manifest in one transaction. The manifest digest is
+        kept in registry_meta, so an unchanged manifest is not re-inserted;
+        a changed one overwrites stored definitions of the same (id, version).
+        """
+        db = pooled_db()
+        manifest = startup_manifest()
+        digest = manifest_digest(manifest)
+        try:
+            row = db.execute("SELECT value FROM registry_meta WHERE key = ?", (MANIFEST_DIGEST_KEY,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None  # registry_meta not migrated yet; seed without recording the digest
+            digest = None
+        if row is None or row["value"] != digest:
+            with db:
+                written, _ = import_tools(db, manifest, replace=True)
+                if digest is not None:
+                    db.execute(
+                        "INSERT OR REPLACE INTO registry_meta (key, value) VALUES (?, ?)", (MANIFEST_DIGEST_KEY, digest)
+                    )
+            logger.info("Seeded tool manifest: %s of %s tools written", written, len(manifest))
+        self.refresh_snapshot(db)
 
     def list_tools(self):
+        tools = self.snapshot(get_read_db())
+        return jsonify([definition for definition, _ in tools.values()])
+
+    def register_tools(self):
+        """
+        POST /tools with one definition or a list of them. Definitions are
+        signed server-side. The list is stored all or nothing: if any
+        (id, version) already exists (or repeats) nothing is written and the
+        409 lists the conflicts, unless ?replace=true.
+        """
+        data = request.get_json(silent=True)
+        tools = data if isinstance(data, list) else [data]
+        return self._import(tools, strict=True)
+
+    def import_manifest(self):
+        """POST /tools/import with a JSON or JSONL manifest body, written in one transaction."""
+        try:
+            tools = parse_manifest(request.get_data(as_text=True))
+        except ToolImportError as exc:
+            return jsonify({"error": "invalid_manifest", "details": str(exc)}), 400
+        return self._import(tools)
+
+    def _import(self, tools: List[Any], strict: bool = False):
+        replace = request.args.get("replace", "false").lower() == "true"
         db = get_db()
-        rows = db.execute("SELECT definition FROM tools").fetchall()
-        return jsonify([json.loads(row["definition"]) for row in rows])
+        try:
+            with db:
+                written, skipped = import_tools(db, tools, replace, strict)
+        except ToolConflictError as exc:
+            conflicts = [{"id": tool_id, "version": version} for tool_id, version in exc.conflicts]
+            return jsonify({"error": "tool_exists", "written": 0, "conflicts": conflicts}), 409
+        except ToolImportError as exc:
+            return jsonify({"error": "invalid_tool", "details": str(exc)}), 400
+        self.refresh_snapshot(db)
+        return jsonify({"status": "ok", "written": written, "skipped": skipped}), 201 if written else 200
+
+    def snapshot(self, db) -> Dict[Tuple[str, str], Tuple[Dict[str, Any], str]]:
+        """
+        Return the in-memory copy of the tools table.
+        Only the tools generation counter is read per call; the table itself
+        is reloaded when any worker has written to it since the last load.
+        """
+        generation = read_generation(db, "tools")
+        snapshot_generation, tools, _ = self._snapshot
+        if snapshot_generation == generation:
+            return tools
+        return self.refresh_snapshot(db, generation)
+
+    def refresh_snapshot(self, db, generation: Optional[int] = None) -> Dict[Tuple[str, str], Tuple[Dict[str, Any], str]]:
+        with self._snapshot_lock:
+            if generation is None:
+                generation = read_generation(db, "tools")
+            snapshot_generation, tools, _ = self._snapshot
+            if snapshot_generation == generation:
+                return tools
+            rows = db.execute("SELECT tool_id, version, definition FROM tools ORDER BY id").fetchall()
+            tools = {
+                (row["tool_id"], row["version"]): (json.loads(row["definition"]), definition_digest(row["definition"]))
+                for row in rows
+            }
+            self._snapshot = (generation, tools, time.monotonic())
+            self.signature_cache.invalidate()
+            self.schema_cache.invalidate()
+            return tools
+
+    def snapshot_age(self) -> float:
+        """Seconds since the tools snapshot was last reloaded from the database."""
+        _, _, loaded_at = self._snapshot
+        return time.monotonic() - loaded_at if loaded_at else float("inf")
 
     def get_tool(self, tool_id: str, version: str) -> Optional[Dict[str, Any]]:
-        db = get_db()
-        row = db.execute(
-            "SELECT definition FROM tools WHERE tool_id=? AND version=?",
-            (tool_id, version),
-        ).fetchone()
-        return json.loads(row["definition"]) if row else None
-
-    def get_schema(self, tool_id: str):
-        return SCHEMA_MAP.get(tool_id, BaseModel)
+        found = self.lookup(tool_id, version)
+        return found[0] if found else None
+
+    def lookup(self, tool_id: str, version: str, db=None) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Return (definition, digest of the stored definition) or None."""
+        return self.snapshot(db if db is not None else get_read_db()).get((tool_id, version))
+
+    def loaded(self, tool_id: str, version: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Like lookup(), but from the snapshot as last loaded, without checking the generation."""
+        return self._snapshot[1].get((tool_id, version))
+
+    def loaded_tools(self) -> Dict[Tuple[str, str], Tuple[Dict[str, Any], str]]:
+        """The snapshot as last loaded, without checking the generation."""
+        return self._snapshot[1]
+
+    def verify_signature(self, tool: Dict[str, Any], digest: str) -> bool:
+        return self.signature_cache.verify(tool, digest)
+
+    def get_schema(self, tool_id: str, version: Optional[str] = None, tool: Optional[Dict[str, Any]] = None):
+        """
+        The params validator for a tool: the hand-written SCHEMA_MAP class if
+        there is one, else a model generated from the registered version's
+        input_schema (looked up when `tool` is not given), else BaseModel.
+        """
+        schema = SCHEMA_MAP.get(tool_id)
+        if schema is not None:
+            return schema
+        if tool is None and version is not None:
+            tool = self.get_tool(tool_id, version)
+        if tool is None:
+            return BaseModel
+        return self.schema_cache.get(tool)
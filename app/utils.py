@@ -3,25 +3,75 @@ import hmac
 import json
 import os
 import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
 from flask import g
 
 def db_path() -> str:
     return os.getenv("DATABASE_FILE", "agentguard.db")
 
-def open_db():
-    conn = sqlite3.connect(db_path())
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+_pool = threading.local()
+
+def _pragma_choice(name: str, default: str, allowed: set) -> str:
+    value = os.getenv(name, default).upper()
+    if value not in allowed:
+        raise ValueError(f"{name} must be one of {sorted(allowed)}, got {value!r}")
+    return value
+
+def configure_connection(conn: sqlite3.Connection, read_only: bool = False) -> sqlite3.Connection:
+    """Apply the SQLITE_* tuning settings to a connection."""
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}")
+    if not read_only:
+        conn.execute(f"PRAGMA journal_mode = {_pragma_choice('SQLITE_JOURNAL_MODE', 'WAL', JOURNAL_MODES)}")
+    conn.execute(f"PRAGMA synchronous = {_pragma_choice('SQLITE_SYNCHRONOUS', 'NORMAL', SYNCHRONOUS_MODES)}")
+    conn.execute(f"PRAGMA cache_size = {int(os.getenv('SQLITE_CACHE_SIZE', '-16000'))}")
+    conn.execute(f"PRAGMA mmap_size = {int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))}")
+    return conn
+
+def open_db(path: Optional[str] = None, read_only: bool = False):
+    path = path or db_path()
+    if read_only:
+        conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(path)
+    return configure_connection(conn, read_only)
+
+def pooled_db(read_only: bool = False):
+    """
+    Return this thread's long-lived connection to the current database.
+    Connections are kept per (path, read_only) and reused across requests.
+    """
+    conns = getattr(_pool, "conns", None)
+    if conns is None:
+        conns = _pool.conns = {}
+    key = (db_path(), read_only)
+    conn = conns.get(key)
+    if conn is None:
+        conn = conns[key] = open_db(key[0], read_only)
     return conn
 
 def get_db():
     if "db" not in g:
-        g.db = open_db()
+        g.db = pooled_db()
     return g.db
 
+def get_read_db():
+    """Read-only connection for list endpoints; in WAL mode it never blocks writers."""
+    if "read_db" not in g:
+        g.read_db = pooled_db(read_only=True)
+    return g.read_db
+
 def close_db(e=None):
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    # Pooled connections stay open; just make sure nothing is left mid-transaction.
+    for name in ("db", "read_db"):
+        db = g.pop(name, None)
+        if db is not None and db.in_transaction:
+            db.rollback()
 
 def init_db_command():
     conn = open_db()
@@ -62,11 +112,36 @@ def init_db_command():
             detail TEXT,
             created_at TEXT
         );
+        CREATE TABLE IF NOT EXISTS generations (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO generations (name, value) VALUES ('policies', 0);
+        INSERT OR IGNORE INTO generations (name, value) VALUES ('tools', 0);
+        CREATE TRIGGER IF NOT EXISTS policies_generation_insert AFTER INSERT ON policies
+        BEGIN UPDATE generations SET value = value + 1 WHERE name = 'policies'; END;
+        CREATE TRIGGER IF NOT EXISTS policies_generation_update AFTER UPDATE ON policies
+        BEGIN UPDATE generations SET value = value + 1 WHERE name = 'policies'; END;
+        CREATE TRIGGER IF NOT EXISTS policies_generation_delete AFTER DELETE ON policies
+        BEGIN UPDATE generations SET value = value + 1 WHERE name = 'policies'; END;
+        CREATE TRIGGER IF NOT EXISTS tools_generation_insert AFTER INSERT ON tools
+        BEGIN UPDATE generations SET value = value + 1 WHERE name = 'tools'; END;
+        CREATE TRIGGER IF NOT EXISTS tools_generation_update AFTER UPDATE ON tools
+        BEGIN UPDATE generations SET value = value + 1 WHERE name = 'tools'; END;
+        CREATE TRIGGER IF NOT EXISTS tools_generation_delete AFTER DELETE ON tools
+        BEGIN UPDATE generations SET value = value + 1 WHERE name = 'tools'; END;
         """
     )
     conn.commit()
+    from .migrations import run_migrations
+    run_migrations(conn)
     conn.close()
 
+def read_generation(db, name: str) -> int:
+    """Return the change counter for a table, bumped by triggers on every write."""
+    row = db.execute("SELECT value FROM generations WHERE name = ?", (name,)).fetchone()
+    return row["value"] if row else 0
+
 def sign_tool(tool_id: str, version: str, schema: dict) -> str:
     secret = os.getenv("ENFORCEMENT_HMAC_KEY", "dev-secret").encode()
     payload = f"{tool_id}|{version}|{json.dumps(schema, sort_keys=True)}".encode()
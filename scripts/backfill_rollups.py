@@ -0,0 +1,17 @@
+"""Rebuild the audit rollup tables from the full audit_logs table."""
+from app.rollups import create_rollup_tables, rebuild_rollups
+from app.utils import open_db
+
+
+def run() -> None:
+    conn = open_db()
+    try:
+        with conn:
+            create_rollup_tables(conn)
+            rebuild_rollups(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    run()
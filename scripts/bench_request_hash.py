@@ -0,0 +1,77 @@
+"""
+Micro-benchmark of the per-request hashing done by /enforce.
+
+Compares the previous path (payload.dict() + json.dumps for the request
+hash, then a second json.dumps per param for the audit digests) with
+request_digests() in legacy and compact mode, at a typical and a ~100 KB
+params payload.
+
+    python -m scripts.bench_request_hash [--iterations N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import timeit
+from typing import Any, Callable, Dict
+
+# importing the app package opens the database; keep the benchmark off the real one
+os.environ.setdefault("DATABASE_FILE", os.path.join(tempfile.gettempdir(), "agentguard-bench.db"))
+
+from app.enforcement import EnforcementRequest, request_digests  # noqa: E402
+
+
+def previous_digests(payload: EnforcementRequest):
+    serialized = json.dumps(payload.dict(), sort_keys=True, default=str)
+    request_hash = hashlib.sha256(serialized.encode()).hexdigest()
+    param_hashes: Dict[str, str] = {}
+    for key, value in payload.params.items():
+        serial = json.dumps(value, sort_keys=True, default=str)
+        param_hashes[key] = hashlib.sha256(serial.encode()).hexdigest()
+    return request_hash, param_hashes
+
+
+def make_payload(params: Dict[str, Any]) -> EnforcementRequest:
+    return EnforcementRequest(
+        agent_id="bench-agent",
+        agent_roles=["reader", "writer"],
+        tool_id="mcp:read_logs",
+        tool_version="1.0",
+        params=params,
+        request_id="bench-request",
+    )
+
+
+PAYLOADS = {
+    "typical": make_payload({"path": "/var/log/app.log", "limit": 50, "filters": {"level": "error", "since": "1h"}}),
+    "100kb": make_payload({
+        "document": "x" * 60_000,
+        "rows": [{"id": i, "name": f"row-{i}", "tags": ["a", "b"]} for i in range(1000)],
+        "limit": 50,
+    }),
+}
+
+
+def run(iterations: int) -> None:
+    variants: Dict[str, Callable[[EnforcementRequest], Any]] = {
+        "previous": previous_digests,
+        "single-pass": request_digests,
+        "single-pass compact": lambda payload: request_digests(payload, compact=True),
+    }
+    for name, payload in PAYLOADS.items():
+        size = len(json.dumps(payload.params))
+        assert previous_digests(payload) == request_digests(payload)
+        print(f"{name} params ({size} bytes), {iterations} iterations")
+        baseline = None
+        for label, func in variants.items():
+            seconds = timeit.timeit(lambda: func(payload), number=iterations)
+            per_call = seconds / iterations * 1e6
+            baseline = baseline or per_call
+            print(f"  {label:<22}{per_call:10.1f} us/request  ({baseline / per_call:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    run(parser.parse_args().iterations)
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import json
 import logging
 import os
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
 import google.generativeai as genai
 from pydantic import BaseModel, ValidationError, validator
@@ -82,6 +83,11 @@ def build_prompt(nl_rules: str) -> str:
     return prompt
 
 
+def prompt_template_version() -> str:
+    """Changes whenever build_prompt's template does; part of the generated-policy cache key."""
+    return hashlib.sha256(build_prompt("{nl}").encode()).hexdigest()[:16]
+
+
 def _clean_model_output(text: str) -> str:
     """Strip markdown fences/backticks and extract first JSON object."""
     if text is None:
@@ -170,6 +176,26 @@ def call_gemini_model(prompt: str, model_name: str, api_key: str, timeout: int =
         raise
 
 
+def stream_gemini_model(prompt: str, model_name: str, api_key: str) -> Iterator[str]:
+    """Yield response text chunks as the model produces them."""
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+    usage = None
+    try:
+        for chunk in model.generate_content(prompt, stream=True):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+    except GeneratorExit:
+        log_call(model_name, api_key, usage, status="aborted")
+        raise
+    except Exception as exc:
+        log_call(model_name, api_key, {"error": str(exc)}, status="error")
+        raise
+    log_call(model_name, api_key, usage)
+
+
 def mock_policy(nl_rules: str) -> Dict[str, Any]:
     now = datetime.now(timezone.utc).isoformat()
     return {
@@ -201,48 +227,235 @@ def mock_policy(nl_rules: str) -> Dict[str, Any]:
     }
 
 
-def validate_and_print(policy: Dict[str, Any]) -> None:
+class GenerationError(Exception):
+    """Generation failed; `detail` is the error payload reported to the caller."""
+
+    def __init__(self, error: str, detail: str):
+        super().__init__(f"{error}: {detail}")
+        self.detail = {"error": error, "detail": detail}
+
+
+class IncrementalPolicyParser:
+    """
+    Incremental scanner for a streamed PolicyDocument.
+
+    feed() takes raw model text (markdown fences and leading prose are
+    skipped) and returns the rules whose objects closed in that chunk,
+    each already validated as a PolicyRule, so a malformed rule stops the
+    generation as soon as it is complete. result() parses the finished
+    top-level object.
+    """
+
+    MAX_PREAMBLE = 4000
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.complete = False
+        self.rules: List[Dict[str, Any]] = []
+        self._preamble = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start: Optional[int] = None
+        self._last_key = ""
+        self._rules_depth: Optional[int] = None
+        self._rule_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        completed: List[Dict[str, Any]] = []
+        for ch in chunk:
+            if self.complete:
+                break
+            if self._depth == 0 and not self.buffer:
+                if ch != "{":
+                    self._preamble += 1
+                    if self._preamble > self.MAX_PREAMBLE:
+                        raise GenerationError("invalid_json", "no JSON object in model output")
+                    continue
+            position = len(self.buffer)
+            self.buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = "".join(self.buffer[self._string_start + 1 : position])
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = position
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._last_key == "rules":
+                    self._rules_depth = 2
+                elif ch == "{" and self._rules_depth is not None and self._depth == self._rules_depth:
+                    self._rule_start = position
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth < 0:
+                    raise GenerationError("invalid_json", "unbalanced brackets in model output")
+                if ch == "}" and self._rule_start is not None and self._depth == self._rules_depth:
+                    completed.append(self._rule("".join(self.buffer[self._rule_start : position + 1])))
+                    self._rule_start = None
+                elif ch == "]" and self._rules_depth is not None and self._depth == self._rules_depth - 1:
+                    self._rules_depth = None
+                if self._depth == 0:
+                    self.complete = True
+        return completed
+
+    def _rule(self, text: str) -> Dict[str, Any]:
+        try:
+            rule = PolicyRule(**json.loads(text)).dict()
+        except (ValueError, TypeError) as exc:
+            raise GenerationError("invalid_rule", f"rule {len(self.rules) + 1}: {exc}")
+        self.rules.append(rule)
+        return rule
+
+    def result(self) -> Dict[str, Any]:
+        if not self.complete:
+            raise GenerationError("invalid_json", "model output ended before the policy object closed")
+        try:
+            return json.loads("".join(self.buffer))
+        except json.JSONDecodeError as exc:
+            raise GenerationError("invalid_json", str(exc))
+
+
+def _chunked(text: str, size: int = 64) -> Iterator[str]:
+    for start in range(0, len(text), size):
+        yield text[start : start + size]
+
+
+def generate_streaming(
+    nl_rules: str, model_name: str, api_key: Optional[str], on_rule: Callable[[Dict[str, Any]], None]
+) -> Dict[str, Any]:
+    """
+    Like generate(), but reads the model output as it streams and calls
+    on_rule() for each validated rule as soon as it is complete. Malformed
+    output stops the model call early. Mock mode streams the mock policy
+    through the same parser.
+    """
+    parser = IncrementalPolicyParser()
+    if api_key:
+        chunks: Iterable[str] = stream_gemini_model(build_prompt(nl_rules), model_name, api_key)
+    else:
+        chunks = _chunked(json.dumps(mock_policy(nl_rules)))
+    try:
+        for chunk in chunks:
+            for rule in parser.feed(chunk):
+                on_rule(rule)
+            if parser.complete:
+                break
+    except GenerationError:
+        raise
+    except Exception as exc:
+        raise GenerationError("model_error", str(exc))
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
     try:
-        document = PolicyDocument(**policy)
+        return validate_policy(parser.result())
     except ValidationError as exc:
-        print(exc, file=sys.stderr)
-        sys.exit(1)
-    print(json.dumps(document.dict(), separators=(",", ":")))
+        raise GenerationError("invalid_policy", str(exc))
+
+
+def validate_policy(policy: Dict[str, Any]) -> Dict[str, Any]:
+    return PolicyDocument(**policy).dict()
+
+
+def generate(nl_rules: str, model_name: str, api_key: Optional[str]) -> Dict[str, Any]:
+    """Return the validated policy for `nl_rules`, or raise GenerationError."""
+    if not api_key:
+        policy = mock_policy(nl_rules)
+    else:
+        raw_text = cleaned = ""
+        try:
+            raw_text = call_gemini_model(build_prompt(nl_rules), model_name, api_key)
+            cleaned = _clean_model_output(raw_text)
+            policy = json.loads(cleaned)
+        except json.JSONDecodeError as exc:
+            logger.debug("Raw Gemini output (first 5000 chars): %s", raw_text[:5000])
+            logger.debug("Cleaned Gemini output (first 5000 chars): %s", cleaned[:5000])
+            raise GenerationError("invalid_json", str(exc))
+        except Exception as exc:
+            raise GenerationError("model_error", str(exc))
+    try:
+        return validate_policy(policy)
+    except ValidationError as exc:
+        raise GenerationError("invalid_policy", str(exc))
+
+
+def serve() -> None:
+    """
+    Long-lived worker mode (--serve) used by app.generator.GeneratorPool.
+
+    Reads one JSON job per stdin line ({"nl": ..., "model": ...}) and writes
+    one JSON reply per stdout line, so the interpreter, google.generativeai
+    and pydantic are only loaded once. The first line written is a handshake.
+    Jobs with "stream": true also get {"event": "rule", ...} lines, one per
+    validated rule, before the reply.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    default_model = os.environ.get("GEMINI_MODEL", "models/gemini-2.5-pro")
+    handshake = {"ready": True, "pid": os.getpid(), "mock": not api_key, "prompt_version": prompt_template_version()}
+    print(json.dumps(handshake), flush=True)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            model_name = job.get("model") or default_model
+            if job.get("stream"):
+                def emit(rule: Dict[str, Any]) -> None:
+                    print(json.dumps({"event": "rule", "rule": rule}, separators=(",", ":")), flush=True)
+
+                policy = generate_streaming(job["nl"], model_name, api_key, emit)
+            else:
+                policy = generate(job["nl"], model_name, api_key)
+            reply: Dict[str, Any] = {"ok": True, "policy": policy}
+        except GenerationError as exc:
+            logger.error("Policy generation failed: %s", exc)
+            reply = {"ok": False, **exc.detail}
+        except (ValueError, KeyError, TypeError) as exc:
+            reply = {"ok": False, "error": "invalid_job", "detail": str(exc)}
+        print(json.dumps(reply, separators=(",", ":")), flush=True)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Gemini-powered policy generator")
-    parser.add_argument("--nl", required=True, help="Natural-language rules to convert")
+    parser.add_argument("--nl", help="Natural-language rules to convert")
     parser.add_argument(
         "--model",
         default=os.environ.get("GEMINI_MODEL", "models/gemini-2.5-pro"),
         help="Gemini model name",
     )
+    parser.add_argument("--serve", action="store_true", help="read jobs as JSON lines on stdin")
+    parser.add_argument("--stream", action="store_true", help="stream the model output; rules are logged to stderr as they arrive")
     args = parser.parse_args()
+    if args.serve:
+        serve()
+        return
+    if not args.nl:
+        parser.error("--nl is required unless --serve is given")
 
-    prompt = build_prompt(args.nl)
     api_key = os.getenv("GEMINI_API_KEY")
-
     if not api_key:
-        print(prompt, file=sys.stderr)
-        policy = mock_policy(args.nl)
-        validate_and_print(policy)
-        return
+        print(build_prompt(args.nl), file=sys.stderr)
 
     try:
-        raw_text = call_gemini_model(prompt, args.model, api_key)
-        cleaned = _clean_model_output(raw_text)
-        policy = json.loads(cleaned)
-    except json.JSONDecodeError as exc:
-        logger.error("Failed to parse policy JSON: %s", exc)
-        logger.debug("Raw Gemini output (first 5000 chars): %s", raw_text[:5000])
-        logger.debug("Cleaned Gemini output (first 5000 chars): %s", cleaned[:5000])
-        sys.exit(1)
-    except Exception as exc:
-        logger.error("Gemini call failed: %s", exc)
+        if args.stream:
+            policy = generate_streaming(
+                args.nl, args.model, api_key, lambda rule: print(json.dumps({"event": "rule", "rule": rule}), file=sys.stderr)
+            )
+        else:
+            policy = generate(args.nl, args.model, api_key)
+    except GenerationError as exc:
+        logger.error("%s", exc)
         sys.exit(1)
-
-    validate_and_print(policy)
+    print(json.dumps(policy, separators=(",", ":")))
 
 
 if __name__ == "__main__":
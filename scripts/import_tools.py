@@ -0,0 +1,30 @@
+"""
+Sign and register tool definitions from a JSON or JSONL manifest in one transaction.
+
+    python -m scripts.import_tools tools.jsonl [--replace]
+"""
+import argparse
+from app.tool_registry import ToolImportError, import_tools, load_manifest
+from app.utils import open_db
+
+
+def run(path: str, replace: bool = False) -> None:
+    tools = load_manifest(path)
+    conn = open_db()
+    try:
+        with conn:
+            written, skipped = import_tools(conn, tools, replace)
+    finally:
+        conn.close()
+    print(f"{written} tools written, {skipped} unchanged or already registered")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register tools from a manifest")
+    parser.add_argument("manifest")
+    parser.add_argument("--replace", action="store_true", help="overwrite existing (id, version) definitions")
+    args = parser.parse_args()
+    try:
+        run(args.manifest, args.replace)
+    except ToolImportError as exc:
+        raise SystemExit(f"invalid manifest: {exc}")
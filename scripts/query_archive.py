@@ -0,0 +1,51 @@
+"""
+Query archived audit partitions offline.
+
+    python scripts/query_archive.py --since 2024-01-01 --decision BLOCK
+    python scripts/query_archive.py --count --group-by agent_id
+
+Rows are streamed one line at a time, so archives of any size can be
+scanned without loading them into memory.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from app.audit_query import FILTER_COLUMNS
+from app.retention import iter_archive
+from app.utils import db_path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", default=os.getenv("AUDIT_ARCHIVE_DIR") or f"{db_path()}.archive")
+    parser.add_argument("--since", help="ISO timestamp or date, inclusive")
+    parser.add_argument("--until", help="ISO timestamp or date, exclusive")
+    for column in FILTER_COLUMNS:
+        parser.add_argument(f"--{column.replace('_', '-')}", dest=column)
+    parser.add_argument("--limit", type=int, help="stop after this many matching rows")
+    parser.add_argument("--count", action="store_true", help="print counts instead of rows")
+    parser.add_argument("--group-by", default="decision", help="column to count by with --count")
+    args = parser.parse_args(argv)
+
+    rows = iter_archive(
+        args.archive_dir,
+        since=args.since,
+        until=args.until,
+        filters={column: getattr(args, column) for column in FILTER_COLUMNS},
+    )
+    if args.count:
+        counts = Counter(row.get(args.group_by) for row in rows)
+        json.dump({str(key): value for key, value in counts.most_common()}, sys.stdout, indent=2)
+        print()
+        return 0
+    for index, row in enumerate(rows):
+        if args.limit is not None and index >= args.limit:
+            break
+        print(json.dumps(row, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
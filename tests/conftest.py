@@ -0,0 +1,72 @@
+"""Fixtures and helpers shared by the test modules."""
+import importlib
+import sys
+
+import pytest
+
+MODULES = [
+    "app.utils",
+    "app.policy_store",
+    "app.tool_registry",
+    "app.enforcement",
+    "app.auditor",
+    "app.main",
+]
+
+
+def reload_app():
+    importlib.import_module("app")
+    for name in MODULES:
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+        else:
+            importlib.import_module(name)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv("DATABASE_FILE", str(db_path))
+    monkeypatch.setenv("ENFORCEMENT_HMAC_KEY", "test-key")
+    monkeypatch.setenv("AUTO_SEED", "false")  # Don't auto-seed during tests
+    reload_app()
+    from flask import Flask
+    from app.main import configure_app
+    from app.utils import init_db_command
+    init_db_command()
+    app = Flask(__name__)
+    configure_app(app)
+    return app.test_client()
+
+
+def seed_policy(client, rules):
+    res = client.post("/policies", json={
+        "name": "test-policy",
+        "version": "1.0.0",
+        "rules": rules,
+        "created_by": "pytest",
+    })
+    assert res.status_code == 200
+
+
+ALLOWED_RULE = [
+    {
+        "roles": ["reader"],
+        "tool_id": "mcp:read_logs",
+        "effect": "ALLOW",
+        "conditions": {"limit": {"lte": 10}},
+        "reason": "reader-allow",
+    }
+]
+
+
+def seed_audit_rows(rows):
+    from app.utils import open_db
+
+    conn = open_db()
+    conn.executemany(
+        "INSERT INTO audit_logs (request_id, agent_id, tool_id, decision, reason, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
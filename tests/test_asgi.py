@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from tests.conftest import ALLOWED_RULE, reload_app
+
+
+@pytest.fixture
+def asgi(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_FILE", str(tmp_path / "asgi.db"))
+    monkeypatch.setenv("ENFORCEMENT_HMAC_KEY", "test-key")
+    monkeypatch.setenv("AUTO_SEED", "false")
+    reload_app()
+    from flask import Flask
+    from app.asgi import create_asgi_app
+    from app.main import configure_app
+    from app.utils import init_db_command
+    init_db_command()
+    flask_app = Flask(__name__)
+    configure_app(flask_app)
+    return create_asgi_app(flask_app)
+
+
+def call(app, method, path, body=None, query=b""):
+    """Run one request through the ASGI app; returns (status, headers, body bytes)."""
+    data = json.dumps(body).encode() if body is not None else b""
+    messages = []
+
+    async def run():
+        received = [{"type": "http.request", "body": data, "more_body": False}]
+
+        async def receive():
+            if received:
+                return received.pop()
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http", "method": method, "path": path, "query_string": query,
+            "headers": [(b"content-type", b"application/json")],
+        }
+        await app(scope, receive, send)
+        if app._refresher is not None:
+            app._refresher.cancel()
+            app._refresher = None
+
+    asyncio.run(run())
+    start = messages[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_asgi_serves_flask_contracts(asgi):
+    status, _, _ = call(asgi, "POST", "/policies", {"name": "p", "version": "1.0.0", "rules": ALLOWED_RULE})
+    assert status == 200
+    base = {"agent_id": "a1", "agent_roles": ["reader"], "tool_id": "mcp:read_logs", "tool_version": "1.0.0"}
+
+    status, headers, body = call(asgi, "POST", "/enforce", {**base, "params": {"limit": 5}, "request_id": "x1"})
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert json.loads(body)["decision"] == "ALLOW"
+
+    status, _, body = call(asgi, "POST", "/enforce/batch", [
+        {**base, "params": {"limit": 50}, "request_id": "x2"},
+        {**base, "tool_id": "unknown", "params": {}, "request_id": "x3"},
+        "bad",
+    ])
+    assert status == 200
+    assert [r["status"] for r in json.loads(body)["results"]] == [403, 404, 400]
+    assert call(asgi, "POST", "/enforce", {"agent_id": "a1"})[0] == 400
+
+    asgi.enforcement.audit_writer.flush()
+    status, headers, body = call(asgi, "GET", "/audit", query=b"fields=request_id")
+    assert status == 200
+    assert [row["request_id"] for row in json.loads(body)] == ["x3", "x2", "x1"]
+    assert call(asgi, "GET", "/tools")[0] == 200
+
+
+def test_asgi_enforce_without_policy(asgi):
+    """With an empty policies table the native handlers decide no_policy like Flask does."""
+    base = {"agent_id": "a1", "agent_roles": ["reader"], "tool_id": "mcp:read_logs", "tool_version": "1.0.0"}
+    status, _, body = call(asgi, "POST", "/enforce", {**base, "params": {"limit": 5}, "request_id": "n1"})
+    assert (status, json.loads(body)["reason"]) == (403, "no_policy")
+
+    status, _, body = call(asgi, "POST", "/enforce/batch", [
+        {**base, "params": {"limit": 5}, "request_id": "n2"},
+        {**base, "tool_id": "unknown", "params": {}, "request_id": "n3"},
+    ])
+    assert status == 200
+    assert [(r["status"], r["reason"]) for r in json.loads(body)["results"]] == [(403, "no_policy"), (404, "tool_not_found")]
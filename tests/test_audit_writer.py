@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = tmp_path / "audit.db"
+    monkeypatch.setenv("DATABASE_FILE", str(path))
+    from app.utils import init_db_command
+    init_db_command()
+    return path
+
+
+def make_row(i):
+    return (f"req-{i}", "agent", "reader", "mcp:read_logs", "1.0.0", "{}", "ALLOW", "ok", "1.0.0", "2024-01-01T00:00:00+00:00")
+
+
+def count_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM audit_logs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_close_flushes_pending_rows(db_file):
+    from app.audit_writer import AuditWriter
+
+    writer = AuditWriter(str(db_file), batch_size=7, flush_interval=0.01)
+    for i in range(20):
+        writer.submit(make_row(i))
+    writer.submit_many([make_row(i) for i in range(20, 25)])
+    writer.close()
+    assert count_rows(db_file) == 25
+    assert writer.written == 25
+
+
+def test_spilled_rows_are_replayed(db_file, tmp_path):
+    from app.audit_writer import AuditWriter
+
+    spill = tmp_path / "spill.jsonl"
+    writer = AuditWriter(str(db_file), overflow="spill", spill_path=str(spill))
+    writer._spill([make_row(1), make_row(2)])
+    assert spill.exists()
+    writer.submit(make_row(3))
+    writer.close()
+    assert count_rows(db_file) == 3
+    assert not spill.exists()
+
+
+def test_invalid_overflow_mode_rejected(db_file):
+    from app.audit_writer import AuditWriter
+
+    with pytest.raises(ValueError):
+        AuditWriter(str(db_file), overflow="explode")
+
+
+def test_failed_spill_does_not_stall_writer(db_file, tmp_path):
+    import threading
+    from app.audit_writer import AuditWriter
+
+    writer = AuditWriter(str(db_file), flush_interval=0.01, spill_path=str(tmp_path / "missing" / "spill.jsonl"))
+    writer.submit(make_row(1) + ("{}", "too-many-columns"))  # insert fails, then the spill file cannot be opened
+    flushed = threading.Thread(target=writer.flush, daemon=True)
+    flushed.start()
+    flushed.join(timeout=5)
+    assert not flushed.is_alive()
+    assert writer.dropped == 1
+
+    writer.submit(make_row(2))
+    writer.close()
+    assert count_rows(db_file) == 1
+
+
+def test_torn_spill_line_does_not_kill_writer(db_file, tmp_path):
+    import json
+    from app.audit_writer import AuditWriter
+
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text(json.dumps(make_row(1)) + "\n" + json.dumps(make_row(2))[:17])  # crash mid-append
+    writer = AuditWriter(str(db_file), flush_interval=0.01, spill_path=str(spill))
+    writer.submit(make_row(3))
+    writer.flush()
+    assert writer._thread.is_alive()
+    writer.close()
+    assert count_rows(db_file) == 2
+    assert not spill.exists()
+    assert (tmp_path / "spill.jsonl.rejected").read_text().startswith('["req-2"')
+    assert list(tmp_path.glob("*.replay")) == []
+
+
+def test_failed_replay_keeps_rows_in_spill_file(db_file, tmp_path):
+    import json
+    import sqlite3
+    from app.audit_writer import AuditWriter, complete_row
+
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text(json.dumps(make_row(1)) + "\n")
+    writer = AuditWriter(str(db_file), spill_path=str(spill))
+    conn = sqlite3.connect(str(tmp_path / "empty.db"))  # no audit_logs table: the insert fails
+    writer._try_replay_spill(conn)
+    conn.close()
+    assert [json.loads(line) for line in spill.read_text().splitlines()] == [list(complete_row(make_row(1)))]
+    assert list(tmp_path.glob("*.replay")) == []
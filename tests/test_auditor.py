@@ -0,0 +1,163 @@
+import importlib
+import sys
+
+import pytest
+
+MODULES = [
+    "app.utils",
+    "app.policy_store",
+    "app.tool_registry",
+    "app.enforcement",
+    "app.auditor",
+    "app.main",
+]
+
+
+def reload_app():
+    importlib.import_module("app")
+    for name in MODULES:
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+        else:
+            importlib.import_module(name)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_FILE", str(tmp_path / "auditor.db"))
+    monkeypatch.setenv("AUTO_SEED", "false")
+    monkeypatch.setenv("AUDITOR_WINDOW_SECONDS", "60")
+    monkeypatch.setenv("AUDITOR_BLOCK_THRESHOLD", "3")
+    reload_app()
+    from flask import Flask
+    from app.main import configure_app
+    from app.utils import init_db_command
+    init_db_command()
+    flask_app = Flask(__name__)
+    configure_app(flask_app)
+    return flask_app
+
+
+def insert_blocks(db, agent_id, timestamps):
+    from app.auditor import _isoformat
+
+    for ts in timestamps:
+        db.execute(
+            "INSERT INTO audit_logs (agent_id, decision, created_at) VALUES (?, 'BLOCK', ?)",
+            (agent_id, _isoformat(ts)),
+        )
+    db.commit()
+
+
+def test_burst_produces_single_anomaly_that_closes(app):
+    from app.utils import get_db
+
+    auditor = app.extensions["agentguard_components"]["auditor"]
+    now = 1_700_000_000.0
+    with app.app_context():
+        db = get_db()
+        auditor._scan(now=now)
+        insert_blocks(db, "agent-x", [now + 1, now + 2, now + 3])
+        insert_blocks(db, "agent-y", [now + 1])
+        for step in range(5):
+            auditor._scan(now=now + 5 + step * 5)
+        insert_blocks(db, "agent-x", [now + 30])
+        auditor._scan(now=now + 31)
+
+        rows = [dict(r) for r in db.execute("SELECT * FROM anomalies").fetchall()]
+        assert len(rows) == 1
+        assert rows[0]["agent_id"] == "agent-x"
+        assert rows[0]["status"] == "open"
+        assert rows[0]["block_count"] == 4
+
+        auditor._scan(now=now + 65)
+        row = db.execute("SELECT status, closed_at FROM anomalies").fetchone()
+        assert row["status"] == "closed"
+        assert row["closed_at"]
+
+        # a restarted auditor does not reopen or duplicate the closed burst
+        fresh = type(auditor)()
+        fresh._scan(now=now + 66)
+        assert db.execute("SELECT COUNT(*) AS cnt FROM anomalies").fetchone()["cnt"] == 1
+
+
+def test_bus_events_open_anomaly_without_reading_audit_logs(app):
+    from app.auditor import _isoformat
+    from app.utils import get_db
+
+    bus = app.extensions["agentguard_components"]["event_bus"]
+    auditor = app.extensions["agentguard_components"]["auditor"]
+    subscription = bus.subscribe()
+    now = 1_700_000_000.0
+    for i in range(3):
+        bus.publish({"agent_id": "agent-bus", "decision": "BLOCK", "created_at": _isoformat(now + i)})
+    bus.publish({"agent_id": "agent-bus", "decision": "ALLOW", "created_at": _isoformat(now + 3)})
+
+    with app.app_context():
+        auditor._consume(subscription.drain(), now=now + 4)
+        rows = get_db().execute("SELECT agent_id, block_count, status FROM anomalies").fetchall()
+        assert [tuple(r) for r in rows] == [("agent-bus", 3, "open")]
+        assert get_db().execute("SELECT COUNT(*) AS cnt FROM audit_logs").fetchone()["cnt"] == 0
+
+
+def test_unix_socket_relay_forwards_to_leader(tmp_path):
+    import socket
+    from app.events import EventBus, UnixSocketRelay
+
+    path = str(tmp_path / "events.sock")
+    # a socket file left behind by a dead leader is taken over
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stale.bind(path)
+    stale.close()
+
+    leader_bus, follower_bus = EventBus(), EventBus()
+    UnixSocketRelay(leader_bus, path).start()
+    follower = UnixSocketRelay(follower_bus, path)
+    follower.start()
+    assert leader_bus.relay.is_leader and not follower.is_leader
+
+    subscription = leader_bus.subscribe()
+    follower_bus.publish({"agent_id": "remote", "decision": "BLOCK"})
+    assert subscription.get(timeout=2) == {"agent_id": "remote", "decision": "BLOCK"}
+
+
+def test_auditor_polls_unless_event_relay_configured(monkeypatch):
+    from app.auditor import AuditorService
+    from app.events import EventBus
+
+    monkeypatch.delenv("AUDITOR_SOURCE", raising=False)
+    monkeypatch.delenv("AGENTGUARD_EVENT_SOCKET", raising=False)
+    assert AuditorService(EventBus()).source == "poll"
+    monkeypatch.setenv("AGENTGUARD_EVENT_SOCKET", "/tmp/agentguard-events.sock")
+    assert AuditorService(EventBus()).source == "bus"
+    assert AuditorService().source == "poll"
+
+
+def test_lag_grows_while_auditor_is_stalled(app):
+    import time
+    from app.utils import get_db
+
+    auditor = app.extensions["agentguard_components"]["auditor"]
+    assert auditor.lag_seconds == 0.0
+    auditor._caught_up_at = time.time() - 120  # last cycle two minutes ago, nothing since
+    assert auditor.lag_seconds >= 120
+    with app.app_context():
+        insert_blocks(get_db(), "agent-lag", [time.time()])
+        auditor._scan()
+    assert auditor.lag_seconds < 5
+
+
+def test_quiet_agents_windows_are_dropped(app):
+    from app.utils import get_db
+
+    auditor = app.extensions["agentguard_components"]["auditor"]
+    now = 1_700_000_000.0
+    with app.app_context():
+        db = get_db()
+        auditor._scan(now=now)
+        insert_blocks(db, "agent-once", [now + 1])
+        auditor._scan(now=now + 2)
+        assert "agent-once" in auditor._windows
+        # no further blocks from this agent; the window expires on a later cycle
+        auditor._scan(now=now + 120)
+    assert auditor._windows == {}
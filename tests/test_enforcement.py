@@ -1,58 +1,6 @@
-import importlib
-import os
-import sys
 import pytest
 
-MODULES = [
-    "app.utils",
-    "app.policy_store",
-    "app.tool_registry",
-    "app.enforcement",
-    "app.auditor",
-    "app.main",
-]
-
-def reload_app():
-    importlib.import_module("app")
-    for name in MODULES:
-        if name in sys.modules:
-            importlib.reload(sys.modules[name])
-        else:
-            importlib.import_module(name)
-
-@pytest.fixture
-def client(tmp_path, monkeypatch):
-    db_path = tmp_path / "test.db"
-    monkeypatch.setenv("DATABASE_FILE", str(db_path))
-    monkeypatch.setenv("ENFORCEMENT_HMAC_KEY", "test-key")
-    monkeypatch.setenv("AUTO_SEED", "false")  # Don't auto-seed during tests
-    reload_app()
-    from flask import Flask
-    from app.main import configure_app
-    from app.utils import init_db_command
-    init_db_command()
-    app = Flask(__name__)
-    configure_app(app)
-    return app.test_client()
-
-def seed_policy(client, rules):
-    res = client.post("/policies", json={
-        "name": "test-policy",
-        "version": "1.0.0",
-        "rules": rules,
-        "created_by": "pytest",
-    })
-    assert res.status_code == 200
-
-ALLOWED_RULE = [
-    {
-        "roles": ["reader"],
-        "tool_id": "mcp:read_logs",
-        "effect": "ALLOW",
-        "conditions": {"limit": {"lte": 10}},
-        "reason": "reader-allow",
-    }
-]
+from tests.conftest import ALLOWED_RULE, seed_audit_rows, seed_policy
 
 
 def test_allow_request(client):
@@ -100,3 +48,189 @@ def test_unknown_tool(client):
     res = client.post("/enforce", json=payload)
     assert res.status_code == 404
     assert res.get_json()["reason"] == "tool_not_found"
+
+
+def test_audit_rows_written_in_background(client):
+    seed_policy(client, ALLOWED_RULE)
+    for i in range(3):
+        client.post("/enforce", json={
+            "agent_id": "agent4",
+            "agent_roles": ["reader"],
+            "tool_id": "mcp:read_logs",
+            "tool_version": "1.0.0",
+            "params": {"limit": i + 1},
+            "request_id": f"req-audit-{i}",
+        })
+    client.application.extensions["agentguard_components"]["audit_writer"].flush()
+    rows = client.get("/audit").get_json()
+    assert sorted(row["request_id"] for row in rows) == ["req-audit-0", "req-audit-1", "req-audit-2"]
+
+
+def test_enforce_batch_preserves_order(client):
+    seed_policy(client, ALLOWED_RULE)
+    base = {"agent_id": "agent5", "agent_roles": ["reader"], "tool_version": "1.0.0"}
+    res = client.post("/enforce/batch", json={"requests": [
+        {**base, "tool_id": "mcp:read_logs", "params": {"limit": 5}, "request_id": "b-allow"},
+        {**base, "tool_id": "mcp:read_logs", "params": {"limit": 50}, "request_id": "b-block"},
+        {**base, "tool_id": "unknown", "params": {}, "request_id": "b-unknown"},
+        {"agent_id": "agent5"},
+        {**base, "tool_id": "mcp:read_logs", "params": {"limit": 5073}, "request_id": "b-schema"},
+    ]})
+    assert res.status_code == 200
+    results = res.get_json()["results"]
+    assert [r["status"] for r in results] == [200, 403, 404, 400, 400]
+    assert results[0]["decision"] == "ALLOW"
+    assert results[2]["reason"] == "tool_not_found"
+    assert results[3]["error"] == "invalid_request"
+
+    client.application.extensions["agentguard_components"]["audit_writer"].flush()
+    logged = {row["request_id"] for row in client.get("/audit").get_json()}
+    assert logged == {"b-allow", "b-block", "b-unknown", "b-schema"}
+
+
+def test_audit_keyset_pagination_and_filters(client):
+    seed_audit_rows([
+        (f"r{i}", f"agent{i % 2}", "mcp:read_logs", "ALLOW" if i % 3 else "BLOCK", "ok", f"2024-01-01T00:0{i}:00+00:00")
+        for i in range(6)
+    ])
+    res = client.get("/audit?limit=4&fields=request_id")
+    page = res.get_json()
+    assert [row["request_id"] for row in page] == ["r5", "r4", "r3", "r2"]
+    assert set(page[0]) == {"id", "request_id"}
+    next_before = res.headers["X-Next-Before-Id"]
+    rest = client.get(f"/audit?limit=4&before_id={next_before}").get_json()
+    assert [row["request_id"] for row in rest] == ["r1", "r0"]
+
+    filtered = client.get("/audit?agent_id=agent1&decision=BLOCK&since=2024-01-01T00:01").get_json()
+    assert [row["request_id"] for row in filtered] == ["r3"]
+    assert client.get("/audit?fields=secret").status_code == 400
+    assert client.get("/audit?limit=0").status_code == 400
+
+
+def test_audit_stats_groups(client):
+    seed_audit_rows([
+        ("r1", "a1", "t1", "ALLOW", "ok", "2024-01-01T00:00:00+00:00"),
+        ("r2", "a1", "t1", "BLOCK", "no", "2024-01-01T00:30:00+00:00"),
+        ("r3", "a2", "t1", "BLOCK", "no", "2024-01-01T01:10:00+00:00"),
+    ])
+    stats = client.get("/audit/stats?group_by=decision").get_json()
+    assert stats["total"] == 3
+    assert {g["decision"]: g["count"] for g in stats["groups"]} == {"ALLOW": 1, "BLOCK": 2}
+
+    by_hour = client.get("/audit/stats?group_by=agent_id&bucket=hour").get_json()
+    assert sorted((g["agent_id"], g["bucket"], g["count"]) for g in by_hour["groups"]) == [
+        ("a1", "2024-01-01T00", 2),
+        ("a2", "2024-01-01T01", 1),
+    ]
+    assert client.get("/audit/stats?group_by=params_hash").status_code == 400
+
+
+def test_audit_stats_reads_rollups(client):
+    seed_audit_rows([
+        ("r1", "a1", "t1", "BLOCK", "no", "2024-01-01T00:05:10+00:00"),
+        ("r2", "a1", "t1", "BLOCK", "no", "2024-01-01T00:05:40+00:00"),
+        ("r3", "a1", "t1", "ALLOW", "ok", "2024-01-01T02:00:00+00:00"),
+    ])
+    from app.rollups import rebuild_rollups
+    from app.utils import open_db
+
+    conn = open_db()
+    before = conn.execute("SELECT * FROM audit_rollup_minute ORDER BY bucket").fetchall()
+    assert [(row["bucket"], row["count"]) for row in before] == [("2024-01-01T00:05", 2), ("2024-01-01T02:00", 1)]
+    with conn:
+        rebuild_rollups(conn)
+    assert [tuple(row) for row in conn.execute("SELECT * FROM audit_rollup_minute ORDER BY bucket")] == [
+        tuple(row) for row in before
+    ]
+    conn.close()
+
+    args = "group_by=decision&since=2024-01-01T00:00&until=2024-01-01T01:00"
+    rollup = client.get(f"/audit/stats?{args}").get_json()
+    raw = client.get(f"/audit/stats?{args}&source=raw").get_json()
+    assert rollup["groups"] == raw["groups"] == [{"decision": "BLOCK", "count": 2}]
+    by_day = client.get("/audit/stats?group_by=decision&bucket=day").get_json()
+    assert sorted((g["decision"], g["bucket"], g["count"]) for g in by_day["groups"]) == [
+        ("ALLOW", "2024-01-01", 1),
+        ("BLOCK", "2024-01-01", 2),
+    ]
+    assert client.get("/audit/stats?source=cache").status_code == 400
+
+
+def test_request_digests_match_legacy_hashes():
+    """The single-pass digests equal the old payload.dict()/per-param hashes; compact mode differs."""
+    import hashlib
+    import json
+    from app.enforcement import EnforcementRequest, request_digests
+
+    payload = EnforcementRequest(
+        agent_id="agent-1",
+        agent_roles=["reader", "writer"],
+        tool_id="mcp:read_logs",
+        tool_version=None,
+        params={"zeta": {"b": [1, 2.5, None], "a": "é"}, "limit": 10, "path": "/var/log"},
+        request_id="req-digest",
+    )
+    request_hash, param_hashes = request_digests(payload)
+    legacy = json.dumps(payload.dict(), sort_keys=True, default=str)
+    assert request_hash == hashlib.sha256(legacy.encode()).hexdigest()
+    assert list(param_hashes) == ["zeta", "limit", "path"]
+    for key, value in payload.params.items():
+        assert param_hashes[key] == hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+    compact_hash, _ = request_digests(payload, compact=True)
+    compact = json.dumps(payload.dict(), sort_keys=True, separators=(",", ":"), default=str)
+    assert compact_hash == hashlib.sha256(compact.encode()).hexdigest() != request_hash
+
+
+def test_decision_cache_reuses_outcome_and_invalidates(client):
+    """Identical requests hit the decision cache but are still audited; a policy change invalidates it."""
+    from app.utils import get_db
+
+    seed_policy(client, ALLOWED_RULE)
+    app = client.application
+    components = app.extensions["agentguard_components"]
+    cache = components["enforcement_service"].decision_cache
+    body = {
+        "agent_id": "agent-cache",
+        "agent_roles": ["reader"],
+        "tool_id": "mcp:read_logs",
+        "tool_version": "1.0.0",
+        "params": {"limit": 10},
+    }
+    responses = [client.post("/enforce", json={**body, "request_id": f"cache-{i}"}) for i in range(3)]
+    assert [res.status_code for res in responses] == [200, 200, 200]
+    assert len({res.get_json()["request_hash"] for res in responses}) == 3
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    client.post("/policies", json={"name": "deny", "version": "9.0.0", "rules": []})
+    res = client.post("/enforce", json={**body, "request_id": "cache-after-change"})
+    assert (res.status_code, res.get_json()["reason"]) == (403, "no_rule_matched")
+    assert cache.misses == 2
+    assert client.get("/enforce/cache").get_json()["entries"] == 1
+
+    components["audit_writer"].flush()
+    with app.app_context():
+        rows = get_db().execute("SELECT COUNT(*) AS n FROM audit_logs WHERE agent_id = 'agent-cache'").fetchone()
+    assert rows["n"] == 4
+
+
+@pytest.mark.parametrize("effect, status", [
+    ("ALLOW", 200),
+    ("allow", 403),
+    ("Allowed", 403),
+    (" ALLOW ", 403),
+    ("deny", 403),
+])
+def test_enforce_allows_only_exact_allow_effect(client, effect, status):
+    """Effect normalization is for simulation only; /enforce allows exactly "ALLOW"."""
+    seed_policy(client, [{**ALLOWED_RULE[0], "effect": effect}])
+    res = client.post("/enforce", json={
+        "agent_id": "agent-effects",
+        "agent_roles": ["reader"],
+        "tool_id": "mcp:read_logs",
+        "tool_version": "1.0.0",
+        "params": {"limit": 5},
+        "request_id": f"req-effect-{effect.strip()}",
+    })
+    assert res.status_code == status
+    assert (res.get_json()["decision"] == "ALLOW") == (status == 200)
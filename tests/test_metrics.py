@@ -0,0 +1,111 @@
+import json
+
+from tests.conftest import ALLOWED_RULE, seed_policy
+
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_endpoint_reports_stages_decisions_and_gauges(client):
+    seed_policy(client, ALLOWED_RULE)
+    before = _samples(client.get("/metrics").get_data(as_text=True))
+    for limit in (5, 50):
+        client.post("/enforce", json={
+            "agent_id": "agent-metrics",
+            "agent_roles": ["reader"],
+            "tool_id": "mcp:read_logs",
+            "tool_version": "1.0.0",
+            "params": {"limit": limit},
+            "request_id": f"metrics-{limit}",
+        })
+
+    res = client.get("/metrics")
+    assert res.mimetype == "text/plain"
+    text = res.get_data(as_text=True)
+    assert "# TYPE agentguard_enforce_stage_seconds histogram" in text
+    after = _samples(text)
+
+    def delta(name):
+        return after.get(name, 0.0) - before.get(name, 0.0)
+
+    for stage in ("parse", "get_tool", "verify_signature", "validate_schema", "evaluate", "audit"):
+        assert delta(f'agentguard_enforce_stage_seconds_count{{stage="{stage}"}}') == 2
+        assert delta(f'agentguard_enforce_stage_seconds_bucket{{stage="{stage}",le="+Inf"}}') == 2
+    allowed = 'agentguard_enforce_decisions_total{decision="ALLOW",reason="reader-allow",tool="mcp:read_logs"}'
+    blocked = 'agentguard_enforce_decisions_total{decision="BLOCK",reason="no_rule_matched",tool="mcp:read_logs"}'
+    assert (delta(allowed), delta(blocked)) == (1, 1)
+    assert "agentguard_audit_queue_depth" in after
+    assert "agentguard_auditor_lag_seconds" in after
+    assert 0 <= after["agentguard_tools_snapshot_age_seconds"] < 60
+    assert delta('agentguard_tool_signature_cache_lookups_total{result="hit"}') >= 1
+
+
+def test_unregistered_tool_ids_share_one_label(client):
+    seed_policy(client, ALLOWED_RULE)
+    for i in range(3):
+        res = client.post("/enforce", json={
+            "agent_id": "agent-metrics",
+            "agent_roles": ["reader"],
+            "tool_id": f"mcp:made_up_{i}",
+            "tool_version": "1.0.0",
+            "params": {},
+            "request_id": f"unknown-{i}",
+        })
+        assert res.status_code == 404
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "made_up" not in text
+    samples = _samples(text)
+    assert samples['agentguard_enforce_decisions_total{decision="BLOCK",reason="tool_not_found",tool="unknown"}'] >= 3
+
+
+def test_registry_merges_worker_snapshots(tmp_path):
+    from app.metrics import MetricsRegistry
+
+    registry = MetricsRegistry(directory=str(tmp_path), flush_interval=5)
+    other = MetricsRegistry(directory=str(tmp_path), flush_interval=5)
+    for reg, depth, lag in ((registry, 2, 1.5), (other, 3, 4.0)):
+        reg.counter("requests_total", "Requests", ("decision",)).inc(("ALLOW",), 2)
+        reg.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.5)
+        reg.gauge("queue_depth", "Depth", function=lambda depth=depth: depth)
+        reg.gauge("lag_seconds", "Lag", function=lambda lag=lag: lag, merge="max")
+
+    # the other worker's file, as its flusher would have written it
+    (tmp_path / "metrics-999999.json").write_text(json.dumps(other.snapshot()))
+    stale = other.snapshot()
+    stale["written_at"] -= 3600
+    (tmp_path / "metrics-999998.json").write_text(json.dumps(stale))
+
+    samples = _samples(registry.render())
+    assert samples['requests_total{decision="ALLOW"}'] == 6.0
+    assert samples['latency_seconds_bucket{le="0.1"}'] == 0
+    assert samples['latency_seconds_bucket{le="1.0"}'] == 3
+    assert samples["latency_seconds_count"] == 3
+    assert samples["queue_depth"] == 5.0
+    assert samples["lag_seconds"] == 4.0
+
+    registry.write_snapshot()
+    assert len(list(tmp_path.glob("metrics-*.json"))) == 3
+
+
+def test_restarted_worker_with_reused_pid_keeps_earlier_totals(tmp_path):
+    import os
+    from app.metrics import MetricsRegistry
+
+    earlier = MetricsRegistry(directory=str(tmp_path), flush_interval=5)
+    earlier.counter("requests_total", "Requests").inc(amount=4)
+    earlier.write_snapshot()
+
+    # same pid, new process start: must not overwrite the earlier worker's file
+    restarted = MetricsRegistry(directory=str(tmp_path), flush_interval=5)
+    restarted.counter("requests_total", "Requests").inc()
+    restarted.write_snapshot()
+
+    assert len(list(tmp_path.glob(f"metrics-{os.getpid()}-*.json"))) == 2
+    assert _samples(restarted.render())["requests_total"] == 5.0
@@ -0,0 +1,31 @@
+import sqlite3
+
+
+def test_migrations_apply_once_and_add_indexes(tmp_path, monkeypatch):
+    path = tmp_path / "migrate.db"
+    monkeypatch.setenv("DATABASE_FILE", str(path))
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE policies (id INTEGER PRIMARY KEY AUTOINCREMENT, version TEXT UNIQUE, name TEXT, rules TEXT)")
+    legacy.execute("INSERT INTO policies (version, name, rules) VALUES ('1.0.0', 'legacy', '[]')")
+    legacy.commit()
+    legacy.close()
+
+    from app.migrations import MIGRATIONS, current_version, run_migrations
+    from app.utils import init_db_command, open_db
+
+    init_db_command()
+    conn = open_db()
+    assert current_version(conn) == MIGRATIONS[-1][0]
+    assert run_migrations(conn) == []
+    assert conn.execute("SELECT created_at FROM policies").fetchone()["created_at"]
+
+    plan = " ".join(
+        row["detail"]
+        for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT agent_id, COUNT(*) FROM audit_logs "
+            "WHERE decision='BLOCK' AND created_at >= ? GROUP BY agent_id",
+            ("2024-01-01",),
+        )
+    )
+    assert "COVERING INDEX idx_audit_logs_decision_created_agent" in plan
+    conn.close()
@@ -0,0 +1,109 @@
+import pytest
+
+from tests.conftest import reload_app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_FILE", str(tmp_path / "jobs.db"))
+    monkeypatch.setenv("AUTO_SEED", "false")
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    reload_app()
+    from flask import Flask
+    from app.main import configure_app
+    from app.utils import init_db_command
+    init_db_command()
+    app = Flask(__name__)
+    configure_app(app)
+    yield app.test_client()
+    app.extensions["agentguard_components"]["policy_jobs"].pool.close()
+
+
+def test_job_runs_on_warm_worker(client):
+    res = client.post("/generate_policy/jobs", json={"nl": "Readers may view logs."})
+    assert res.status_code == 202
+    job_id = res.get_json()["job_id"]
+    assert res.headers["Location"] == f"/generate_policy/jobs/{job_id}"
+
+    job = client.get(f"/generate_policy/jobs/{job_id}?wait=30").get_json()
+    assert job["status"] == "done"
+    assert job["policy"]["rules"][0]["tool"] == "mcp:read_logs"
+
+    pool = client.application.extensions["agentguard_components"]["policy_jobs"].pool
+    pids = {worker.info.get("pid") for worker in pool._workers if worker.alive}
+    second = client.post("/generate_policy/jobs", json={"nl": "Again."}).get_json()["job_id"]
+    assert client.get(f"/generate_policy/jobs/{second}?wait=30").get_json()["status"] == "done"
+    # the interpreter was reused rather than relaunched
+    assert {worker.info.get("pid") for worker in pool._workers if worker.alive} == pids
+
+    assert client.post("/generate_policy/jobs", json={}).status_code == 400
+    assert client.get("/generate_policy/jobs/missing").status_code == 404
+
+
+def test_identical_requests_are_served_from_cache(client):
+    cache = client.application.extensions["agentguard_components"]["policy_jobs"].cache
+    before = cache.stats()
+
+    def run(nl, **extra):
+        job_id = client.post("/generate_policy/jobs", json={"nl": nl, **extra}).get_json()["job_id"]
+        return client.get(f"/generate_policy/jobs/{job_id}?wait=30").get_json()
+
+    first = run("Readers may view logs.")
+    second = run("  Readers may   view logs. ")
+    assert first["status"] == second["status"] == "done"
+    assert second["policy"] == first["policy"]  # identical created_at: not regenerated
+
+    stats = client.get("/generate_policy/cache").get_json()
+    assert stats["hits"] - before["hits"] == 1
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["entries"] == 1
+
+    fresh = run("Readers may view logs.", cache=False)
+    assert fresh["policy"]["created_at"] != first["policy"]["created_at"]
+    assert client.get("/generate_policy/cache").get_json()["hits"] == stats["hits"]
+
+
+def test_cache_evicts_least_recently_used(client):
+    from app.policy_cache import PolicyCache
+
+    cache = PolicyCache(max_entries=2)
+    cache.put("a", {"id": "a"}, "m", "v")
+    cache.put("b", {"id": "b"}, "m", "v")
+    assert cache.get("a") == {"id": "a"}
+    cache.put("c", {"id": "c"}, "m", "v")
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.evictions == 1
+
+    expired = PolicyCache(ttl=0)
+    expired.put("d", {"id": "d"}, "m", "v")
+    assert expired.get("d") is None
+
+
+def test_job_reports_streamed_rules(client):
+    job_id = client.post("/generate_policy/jobs", json={"nl": "Stream me.", "cache": False}).get_json()["job_id"]
+    body = client.get(f"/generate_policy/jobs/{job_id}/events").get_data(as_text=True)
+    events = [block.split("\n")[0] for block in body.strip().split("\n\n")]
+    assert events == ["event: rule", "event: done"]
+    job = client.get(f"/generate_policy/jobs/{job_id}").get_json()
+    assert job["progress"]["rules"] == job["policy"]["rules"]
+
+
+def test_incremental_parser_validates_rules_early():
+    import importlib.util
+    import os
+
+    spec = importlib.util.spec_from_file_location(
+        "generate_policy", os.path.join(os.path.dirname(__file__), "..", "scripts", "generate_policy.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    parser = module.IncrementalPolicyParser()
+    rule = '{"id": "r1", "roles": ["reader"], "tool": "mcp:read_logs", "effect": "allow", "conditions": {"a": "}"}}'
+    assert parser.feed('```json\n{"name": "p", "rules": [' + rule[:40]) == []
+    assert [r["id"] for r in parser.feed(rule[40:] + ", ")] == ["r1"]
+    with pytest.raises(module.GenerationError) as exc:
+        parser.feed('{"id": "r2", "roles": "x"}')
+    assert exc.value.detail["error"] == "invalid_rule"
+    assert not parser.complete
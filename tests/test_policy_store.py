@@ -147,3 +147,140 @@ def test_delete_policy(client):
     # Verify it's gone
     res = client.delete(f"/policies/{policy_id}")
     assert res.status_code == 404
+
+
+def test_policy_index_first_match_and_prefix_normalization():
+    """Compiled index keeps first-match order across roles and matches with/without mcp: prefix."""
+    from app.policy_index import PolicyIndex
+
+    index = PolicyIndex("1.0.0", [
+        {"roles": ["writer"], "tool_id": "read_logs", "effect": "BLOCK", "conditions": {"limit": {"lte": 5}}, "reason": "writer-small"},
+        {"roles": ["reader"], "tool": "mcp:read_logs", "effect": "ALLOW", "conditions": {"limit": {"lte": 50}}, "reason": "reader"},
+        {"roles": ["reader"], "effect": "ALLOW", "reason": "no-tool"},
+    ])
+    assert index.match(["reader", "writer"], "mcp:read_logs", {"limit": 3}).reason == "writer-small"
+    assert index.match(["reader", "writer"], "read_logs", {"limit": 30}).reason == "reader"
+    assert index.match(["reader"], "mcp:read_logs", {"limit": "30"}) is None
+    assert index.match(["auditor"], "mcp:read_logs", {"limit": 3}) is None
+
+
+def test_policy_index_swapped_on_create_and_delete(client):
+    """Creating or deleting a policy swaps the compiled index used by evaluate()."""
+    from app.utils import get_db
+
+    rules = [{"roles": ["reader"], "tool_id": "mcp:read_logs", "effect": "ALLOW", "conditions": {}}]
+    client.post("/policies", json={"name": "a", "version": "1.0.0", "rules": rules})
+    client.post("/policies", json={"name": "b", "version": "2.0.0", "rules": []})
+    app = client.application
+    policy_store = app.extensions["agentguard_components"]["policy_store"]
+
+    with app.app_context():
+        result = policy_store.evaluate(["reader"], "mcp:read_logs", {})
+        assert (result.decision, result.version, result.reason) == ("BLOCK", "2.0.0", "no_rule_matched")
+        policy_id = get_db().execute("SELECT id FROM policies WHERE version = '2.0.0'").fetchone()["id"]
+
+    assert client.delete(f"/policies/{policy_id}").status_code == 200
+    with app.app_context():
+        result = policy_store.evaluate(["reader"], "mcp:read_logs", {})
+        assert (result.decision, result.version) == ("ALLOW", "1.0.0")
+
+
+def test_policy_diff_recorded_and_index_patched(client):
+    """create_policy records a (tool, role) diff and the new index only recompiles the changed tools."""
+    from app.policy_index import PolicyIndex
+    from app.utils import get_db
+
+    v1 = [
+        {"roles": ["reader"], "tool_id": "read_logs", "effect": "ALLOW", "conditions": {"limit": {"lte": 10}}},
+        {"roles": ["writer"], "tool_id": "write_file", "effect": "ALLOW", "conditions": {}},
+    ]
+    v2 = [
+        {"roles": ["reader"], "tool_id": "mcp:read_logs", "effect": "ALLOW", "conditions": {"limit": {"lte": 10}}},
+        {"roles": ["writer"], "tool_id": "write_file", "effect": "BLOCK", "conditions": {}, "reason": "frozen"},
+        {"roles": ["auditor"], "tool_id": "export", "effect": "ALLOW", "conditions": {}},
+    ]
+    client.post("/policies", json={"name": "a", "version": "1.0.0", "rules": v1})
+    app = client.application
+    policy_store = app.extensions["agentguard_components"]["policy_store"]
+    with app.app_context():
+        base = policy_store.get_index(get_db())
+    client.post("/policies", json={"name": "b", "version": "2.0.0", "rules": v2})
+
+    diff = client.get("/policies/diff?from=1.0.0&to=2.0.0").get_json()
+    assert [(item["tool"], item["role"]) for item in diff["added"]] == [("mcp:export", "auditor")]
+    assert [(item["tool"], item["role"]) for item in diff["changed"]] == [("mcp:write_file", "writer")]
+    assert diff["changed"][0]["after"] == [{"effect": "BLOCK", "conditions": {}, "reason": "frozen"}]
+    assert (diff["removed"], diff["unchanged"]) == ([], 1)
+    assert client.get("/policies/diff?from=9.9.9").status_code == 404
+    assert client.get("/policies/diff").status_code == 400
+
+    with app.app_context():
+        db = get_db()
+        stored = db.execute(
+            "SELECT from_version, diff FROM policy_version_history WHERE version = '2.0.0'"
+        ).fetchone()
+        assert stored["from_version"] == "1.0.0"
+        index = policy_store.get_index(db)
+    assert index.recompiled == 4  # export and write_file, with and without the mcp: prefix
+    assert index._table["read_logs"] is base._table["read_logs"]
+    full = PolicyIndex("2.0.0", v2)
+    for roles, tool, params in [
+        (["reader"], "read_logs", {"limit": 5}),
+        (["reader"], "mcp:read_logs", {"limit": 50}),
+        (["writer"], "write_file", {}),
+        (["auditor", "writer"], "mcp:export", {}),
+    ]:
+        patched, expected = index.match(roles, tool, params), full.match(roles, tool, params)
+        assert (patched and (patched.effect, patched.reason)) == (expected and (expected.effect, expected.reason))
+
+
+def test_stale_store_does_not_reuse_diff_for_recreated_version(client):
+    """A re-created version name must not let another worker patch its index with the wrong diff."""
+    from app.policy_store import PolicyStore
+    from app.utils import get_db
+
+    allow = [{"roles": ["reader"], "tool_id": "mcp:read_logs", "effect": "ALLOW", "conditions": {}}]
+    frozen = [{"roles": ["reader"], "tool_id": "mcp:read_logs", "effect": "BLOCK", "conditions": {}, "reason": "frozen"}]
+    client.post("/policies", json={"name": "a", "version": "1.0.0", "rules": allow})
+    app = client.application
+    other_worker = PolicyStore()
+    with app.app_context():
+        assert other_worker.evaluate(["reader"], "mcp:read_logs", {}).decision == "ALLOW"
+        policy_id = get_db().execute("SELECT id FROM policies WHERE version = '1.0.0'").fetchone()["id"]
+
+    assert client.delete(f"/policies/{policy_id}").status_code == 200
+    client.post("/policies", json={"name": "a", "version": "1.0.0", "rules": frozen})
+    client.post("/policies", json={"name": "b", "version": "2.0.0", "rules": frozen + [
+        {"roles": ["writer"], "tool_id": "mcp:write_file", "effect": "ALLOW", "conditions": {}},
+    ]})
+
+    with app.app_context():
+        result = other_worker.evaluate(["reader"], "mcp:read_logs", {})
+    assert (result.decision, result.version, result.reason) == ("BLOCK", "2.0.0", "frozen")
+
+
+def test_cross_role_reorder_recompiles_tool(client):
+    """Swapping two rules of one tool under different roles changes multi-role results; the patched index must follow."""
+    from app.policy_index import PolicyIndex
+    from app.utils import get_db
+
+    allow = {"roles": ["reader"], "tool_id": "mcp:read_logs", "effect": "ALLOW", "conditions": {}, "reason": "A-allow"}
+    block = {"roles": ["auditor"], "tool_id": "mcp:read_logs", "effect": "BLOCK", "conditions": {}, "reason": "B-block"}
+    client.post("/policies", json={"name": "a", "version": "1.0.0", "rules": [allow, block]})
+    app = client.application
+    policy_store = app.extensions["agentguard_components"]["policy_store"]
+    with app.app_context():
+        assert policy_store.evaluate(["reader", "auditor"], "mcp:read_logs", {}).reason == "A-allow"
+    client.post("/policies", json={"name": "a", "version": "1.0.1", "rules": [block, allow]})
+
+    diff = client.get("/policies/diff?from=1.0.0&to=1.0.1").get_json()
+    assert (diff["added"], diff["removed"], diff["changed"]) == ([], [], [])
+    assert diff["reordered"] == ["mcp:read_logs"]
+
+    full = PolicyIndex("1.0.1", [block, allow])
+    with app.app_context():
+        index = policy_store.get_index(get_db())
+        result = policy_store.evaluate(["reader", "auditor"], "mcp:read_logs", {})
+    expected = full.match(["reader", "auditor"], "mcp:read_logs", {})
+    assert (result.decision, result.reason) == (expected.effect, expected.reason) == ("BLOCK", "B-block")
+    assert index.match(["auditor", "reader"], "read_logs", {}).reason == "B-block"
@@ -0,0 +1,55 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = tmp_path / "retention.db"
+    monkeypatch.setenv("DATABASE_FILE", str(path))
+    from app.utils import init_db_command
+    init_db_command()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO audit_logs (request_id, agent_id, roles, tool_id, tool_version, params_hash, decision, reason, policy_version, created_at) "
+        "VALUES (?, ?, 'reader', 'mcp:read_logs', '1.0.0', '{}', ?, 'ok', '1.0.0', ?)",
+        [
+            ("r1", "a1", "BLOCK", "2024-01-01T10:00:00+00:00"),
+            ("r2", "a2", "ALLOW", "2024-01-01T23:59:59+00:00"),
+            ("r3", "a1", "BLOCK", "2024-01-02T08:00:00+00:00"),
+            ("r4", "a1", "ALLOW", "2024-01-10T08:00:00+00:00"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_expired_days_move_to_archive(db_file, tmp_path):
+    from app.retention import AuditRetention, iter_archive
+
+    archive_dir = tmp_path / "archive"
+    retention = AuditRetention(str(db_file), retention_days=7, archive_dir=str(archive_dir), batch_size=1)
+    moved = retention.run_once(now=datetime(2024, 1, 10, tzinfo=timezone.utc))
+    assert moved == {"2024-01-01": 2, "2024-01-02": 1}
+    assert sorted(p.name for p in archive_dir.iterdir()) == ["audit-2024-01-01.jsonl.gz", "audit-2024-01-02.jsonl.gz"]
+
+    conn = sqlite3.connect(db_file)
+    assert [row[0] for row in conn.execute("SELECT request_id FROM audit_logs")] == ["r4"]
+    # rollups still cover the archived days
+    assert conn.execute("SELECT SUM(count) FROM audit_rollup_hour").fetchone()[0] == 4
+    conn.close()
+
+    assert [row["request_id"] for row in iter_archive(str(archive_dir))] == ["r1", "r2", "r3"]
+    blocks = iter_archive(str(archive_dir), since="2024-01-01T12:00", filters={"decision": "BLOCK"})
+    assert [row["request_id"] for row in blocks] == ["r3"]
+    assert retention.run_once(now=datetime(2024, 1, 10, tzinfo=timezone.utc)) == {}
+
+
+def test_retention_disabled_by_default(db_file):
+    from app.retention import AuditRetention
+
+    retention = AuditRetention(str(db_file))
+    assert not retention.enabled
+    assert retention.run_once() == {}
@@ -0,0 +1,106 @@
+import time
+
+from tests.conftest import ALLOWED_RULE, seed_audit_rows, seed_policy
+
+GENERATED = {
+    "version": "v1",
+    "rules": [
+        {"id": "r1", "roles": ["reader"], "tool": "mcp:read_logs", "effect": "allow", "conditions": {}},
+        {"id": "r2", "roles": ["auditor"], "tool": "list_tools", "effect": "deny", "conditions": {}},
+    ],
+    "test_vectors": [
+        {"agent_roles": ["reader"], "tool": "mcp:read_logs", "expected": "allow"},
+        {"agent_roles": ["reader"], "tool": "mcp:modify_policy", "expected": "deny"},
+        {"agent_roles": ["auditor"], "tool": "mcp:list_tools", "expected": "allow"},
+    ],
+}
+
+
+def test_generated_policy_test_vectors(client):
+    report = client.post("/policies/simulate", json={"policy": GENERATED}).get_json()
+    assert (report["total"], report["passed"], report["failed"]) == (3, 2, 1)
+    assert report["failures"][0]["tool"] == "mcp:list_tools"
+    assert report["failures"][0]["actual"] == "BLOCK"
+    assert not report["ok"]
+
+
+def test_bulk_vectors_against_active_policy(client):
+    from app.simulation import simulate
+    from app.policy_index import PolicyIndex
+
+    seed_policy(client, ALLOWED_RULE)
+    vectors = [
+        {"roles": ["reader"], "tool_id": "mcp:read_logs", "params": {"limit": i % 20}, "expected": "ALLOW" if i % 20 <= 10 else "BLOCK"}
+        for i in range(100_000)
+    ]
+    started = time.monotonic()
+    report = simulate(PolicyIndex("1.0.0", ALLOWED_RULE), vectors)
+    assert time.monotonic() - started < 5
+    assert report["ok"] and report["passed"] == 100_000 and report["groups"] == 1
+
+    res = client.post("/policies/simulate", json={"vectors": vectors[:50]})
+    assert res.get_json()["policy_version"] == "1.0.0"
+    assert client.post("/policies/simulate", json={"vectors": "nope"}).status_code == 400
+
+
+def test_replay_audit_decisions(client):
+    seed_policy(client, ALLOWED_RULE)
+    seed_audit_rows([
+        ("a1", "agent", "mcp:read_logs", "BLOCK", "no_rule_matched", "2024-01-01T00:00:00+00:00"),
+        ("a2", "agent", "unknown", "BLOCK", "tool_not_found", "2024-01-01T00:00:00+00:00"),
+    ])
+    report = client.post("/policies/simulate", json={"source": "audit"}).get_json()
+    # roles are NULL in these rows, so the replayed decision is still BLOCK
+    assert (report["total"], report["passed"]) == (1, 1)
+
+
+def test_what_if_replays_captured_params(client, monkeypatch):
+    monkeypatch.setenv("AUDIT_CAPTURE_PARAMS", "true")
+    from flask import Flask
+    from app.main import configure_app
+
+    app = Flask(__name__)
+    configure_app(app)
+    capture = app.test_client()
+    seed_policy(capture, ALLOWED_RULE)
+    base = {"agent_id": "agent1", "agent_roles": ["reader"], "tool_id": "mcp:read_logs", "tool_version": "1.0.0"}
+    for i, limit in enumerate([2, 8, 8, 20]):
+        capture.post("/enforce", json={**base, "params": {"limit": limit, "api_token": "s3cret"}, "request_id": f"w{i}"})
+    app.extensions["agentguard_components"]["audit_writer"].flush()
+
+    row = capture.get("/audit?fields=params&limit=1").get_json()[0]
+    assert row["params"] == '{"api_token":"[REDACTED]","limit":20}'
+
+    stricter = [{**ALLOWED_RULE[0], "conditions": {"limit": {"lte": 5}}}]
+    report = capture.post("/policies/whatif", json={"policy": {"version": "2.0.0", "rules": stricter}}).get_json()
+    assert report["replayed"] == 4 and report["unknown"] == 0
+    assert report["flips"] == {"ALLOW->BLOCK": 2}
+    assert report["pairs"] == [{"agent_id": "agent1", "tool_id": "mcp:read_logs", "from": "ALLOW", "to": "BLOCK", "count": 2}]
+
+
+def test_what_if_without_params_is_unknown(client):
+    seed_policy(client, ALLOWED_RULE)
+    seed_audit_rows([("u1", "agent", "mcp:read_logs", "ALLOW", "reader-allow", "2999-01-01T00:00:00+00:00")])
+    from app.utils import open_db
+
+    conn = open_db()
+    conn.execute("UPDATE audit_logs SET roles = 'reader'")
+    conn.commit()
+    conn.close()
+    report = client.post("/policies/whatif", json={"since": "2000-01-01"}).get_json()
+    assert (report["replayed"], report["unknown"]) == (0, 1)
+
+
+def test_simulate_rejects_malformed_inputs(client):
+    seed_policy(client, ALLOWED_RULE)
+    vector = {"roles": ["reader"], "tool_id": "mcp:read_logs", "params": {"limit": 1}, "expected": "ALLOW"}
+    for body in (
+        {"vectors": [vector], "max_failures": "10"},
+        {"vectors": [{**vector, "params": ["limit", 1]}]},
+        {"vectors": [{**vector, "roles": {"reader": True}}]},
+        {"vectors": [{**vector, "roles": [1, 2]}]},
+        {"source": "audit", "limit": "lots"},
+    ):
+        res = client.post("/policies/simulate", json=body)
+        assert res.status_code == 400, body
+        assert res.get_json()["error"] == "invalid_simulation"
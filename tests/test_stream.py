@@ -0,0 +1,132 @@
+import importlib
+import sys
+
+import pytest
+
+MODULES = [
+    "app.utils",
+    "app.policy_store",
+    "app.tool_registry",
+    "app.enforcement",
+    "app.auditor",
+    "app.main",
+]
+
+
+def reload_app():
+    importlib.import_module("app")
+    for name in MODULES:
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+        else:
+            importlib.import_module(name)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_FILE", str(tmp_path / "stream.db"))
+    monkeypatch.setenv("AUTO_SEED", "false")
+    monkeypatch.setenv("EVENTS_POLL_INTERVAL", "0.01")
+    monkeypatch.setenv("EVENTS_MAX_SECONDS", "10")  # a broken test fails instead of hanging
+    reload_app()
+    from flask import Flask
+    from app.main import configure_app
+    from app.utils import init_db_command, open_db
+    init_db_command()
+    conn = open_db()
+    for i in range(3):
+        conn.execute("INSERT INTO audit_logs (request_id, decision) VALUES (?, 'BLOCK')", (f"r{i}",))
+    conn.execute("INSERT INTO anomalies (agent_id, status) VALUES ('agent', 'open')")
+    conn.commit()
+    conn.close()
+    app = Flask(__name__)
+    configure_app(app)
+    return app.test_client()
+
+
+def read_events(res, count):
+    events = []
+    chunks = iter(res.response)
+    while len(events) < count:
+        chunk = next(chunks)
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("id:"):
+            events.append(dict(line.split(": ", 1) for line in chunk.strip().splitlines()))
+    res.close()
+    return events
+
+
+def test_stream_resumes_after_ids(client):
+    res = client.get("/events?audit_after=1&anomaly_after=0")
+    assert res.mimetype == "text/event-stream"
+    events = read_events(res, 3)
+    assert [(e["event"], e["id"]) for e in events] == [("audit", "2:0"), ("audit", "3:0"), ("anomaly", "3:1")]
+
+
+def test_stream_uses_last_event_id(client):
+    res = client.get("/events", headers={"Last-Event-ID": "3:0"})
+    events = read_events(res, 1)
+    assert events[0]["event"] == "anomaly"
+    assert '"agent_id": "agent"' in events[0]["data"]
+
+
+def test_stream_pushes_anomaly_updates(client):
+    from app.utils import open_db
+    conn = open_db()
+    conn.execute("UPDATE anomalies SET status = 'closed', block_count = 4 WHERE agent_id = 'agent'")
+    conn.commit()
+    conn.close()
+    res = client.get("/events", headers={"Last-Event-ID": "3:1"})
+    events = read_events(res, 1)
+    assert events[0]["event"] == "anomaly"
+    assert events[0]["id"] == "3:2"
+    assert '"status": "closed"' in events[0]["data"]
+
+
+def test_last_event_id_wins_over_reconnect_url(client):
+    res = client.get("/events?audit_after=0&anomaly_after=0", headers={"Last-Event-ID": "3:0"})
+    events = read_events(res, 1)
+    assert events[0]["id"] == "3:1"
+
+
+def test_stream_ends_after_max_seconds(tmp_path, monkeypatch, client):
+    from app.stream import EventStreamService
+    monkeypatch.setenv("EVENTS_MAX_SECONDS", "0.05")
+    service = EventStreamService()
+    chunks = list(service._generate(str(tmp_path / "stream.db"), (3, 1), service.max_seconds))
+    assert chunks[0].startswith("retry:")
+    assert not any(chunk.startswith("id:") for chunk in chunks)
+
+
+def test_streams_over_the_limit_get_503(client, monkeypatch):
+    monkeypatch.setenv("EVENTS_MAX_STREAMS", "1")
+    from flask import Flask
+    from app.main import configure_app
+    app = Flask(__name__)
+    configure_app(app)
+    limited = app.test_client()
+
+    first = limited.get("/events")
+    assert first.status_code == 200
+    refused = limited.get("/events")
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"]
+    first.close()
+    second = limited.get("/events")
+    assert second.status_code == 200
+    second.close()
+
+
+def test_stream_announces_policy_and_tool_changes(client):
+    from app.utils import open_db
+    res = client.get("/events", headers={"Last-Event-ID": "3:1"})
+    chunks = (chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in res.response)
+    assert next(chunks).startswith("retry:")
+    conn = open_db()
+    conn.execute("INSERT INTO policies (name, version, rules) VALUES ('p', '1.0.0', '[]')")
+    conn.commit()
+    conn.close()
+    event = next(chunk for chunk in chunks if chunk.startswith("id:"))
+    res.close()
+    assert "event: config" in event
+    assert '"policies": 1' in event
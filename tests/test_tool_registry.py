@@ -43,3 +43,144 @@ def test_registry_loads_and_verifies(client, monkeypatch):
     from app.utils import sign_tool
     first = tools[0]
     assert first["signature"] == sign_tool(first["id"], first["version"], first["input_schema"])
+
+
+def test_signature_cache_hits_and_key_rotation(client, monkeypatch):
+    registry = client.application.extensions["agentguard_components"]["tool_registry"]
+    with client.application.app_context():
+        tool, digest = registry.lookup("mcp:read_logs", "1.0.0")
+        assert registry.verify_signature(tool, digest)
+        assert registry.verify_signature(tool, digest)
+        assert registry.signature_cache.stats()["hits"] == 1
+        assert registry.signature_cache.stats()["misses"] == 1
+
+        tampered = {**tool, "input_schema": {"limit": {"type": "integer"}}}
+        assert not registry.verify_signature(tampered, "tampered-digest")
+
+        monkeypatch.setenv("ENFORCEMENT_HMAC_KEY", "rotated-key")
+        assert not registry.verify_signature(tool, digest)
+        assert registry.signature_cache.stats()["entries"] == 1
+
+
+def test_snapshot_reloads_after_external_write(client):
+    import json
+    from app.utils import open_db, sign_tool
+
+    registry = client.application.extensions["agentguard_components"]["tool_registry"]
+    assert registry.snapshot_age() < 60
+    with client.application.app_context():
+        assert registry.get_tool("mcp:new_tool", "1.0.0") is None
+
+    definition = {"id": "mcp:new_tool", "version": "1.0.0", "input_schema": {}}
+    definition["signature"] = sign_tool("mcp:new_tool", "1.0.0", {})
+    other_worker = open_db()
+    other_worker.execute(
+        "INSERT INTO tools (tool_id, version, definition) VALUES (?, ?, ?)",
+        ("mcp:new_tool", "1.0.0", json.dumps(definition)),
+    )
+    other_worker.commit()
+    other_worker.close()
+
+    with client.application.app_context():
+        assert registry.get_tool("mcp:new_tool", "1.0.0")["signature"] == definition["signature"]
+
+
+def test_generated_schema_validates_registered_version(client):
+    """Tools without a SCHEMA_MAP class are validated against their own version's input_schema."""
+    import json
+    from app.utils import open_db, sign_tool
+
+    schemas = {
+        "1.0.0": {"rows": {"type": "integer", "min": 1, "max": 10}},
+        "2.0.0": {"rows": {"type": "integer", "max": 500}, "schema": {"type": "string", "required": False}},
+    }
+    db = open_db()
+    for version, schema in schemas.items():
+        definition = {"id": "mcp:export", "version": version, "input_schema": schema}
+        definition["signature"] = sign_tool("mcp:export", version, schema)
+        db.execute(
+            "INSERT INTO tools (tool_id, version, definition) VALUES (?, ?, ?)",
+            ("mcp:export", version, json.dumps(definition)),
+        )
+    db.commit()
+    db.close()
+    client.post("/policies", json={"name": "p", "version": "1.0.0", "rules": [
+        {"roles": ["reader"], "tool_id": "mcp:export", "effect": "ALLOW", "conditions": {}},
+    ]})
+
+    def enforce(version, params):
+        return client.post("/enforce", json={
+            "agent_id": "a", "agent_roles": ["reader"], "tool_id": "mcp:export",
+            "tool_version": version, "params": params, "request_id": "r",
+        })
+
+    assert enforce("1.0.0", {"rows": 5}).status_code == 200
+    blocked = enforce("1.0.0", {"rows": 50})
+    assert blocked.status_code == 400 and blocked.get_json()["reason"].startswith("schema_error:")
+    assert enforce("1.0.0", {}).status_code == 400
+    assert enforce("2.0.0", {"rows": 50, "schema": "v2"}).status_code == 200
+    assert enforce("2.0.0", {"rows": "many"}).status_code == 400
+
+    registry = client.application.extensions["agentguard_components"]["tool_registry"]
+    stats = registry.schema_cache.stats()
+    assert (stats["misses"], stats["entries"]) == (2, 2)
+    assert stats["hits"] == 3
+
+
+def test_register_and_import_tools(client):
+    """POST /tools signs single definitions; /tools/import loads JSON or JSONL manifests in one go."""
+    import json
+    from app.tool_registry import verify_tool_signature
+
+    tool = {"id": "mcp:export", "version": "1.0.0", "input_schema": {"rows": {"type": "integer"}}, "signature": "forged"}
+    res = client.post("/tools", json=tool)
+    assert (res.status_code, res.get_json()["written"]) == (201, 1)
+    assert client.post("/tools", json=tool).status_code == 409
+    assert client.post("/tools?replace=true", json={**tool, "description": "v2"}).get_json()["written"] == 1
+    assert client.post("/tools", json={"id": "mcp:bad"}).status_code == 400
+
+    # a list with one conflict stores nothing and names the conflict
+    res = client.post("/tools", json=[{"id": "mcp:fresh", "version": "1.0.0"}, tool])
+    assert res.status_code == 409
+    assert res.get_json()["conflicts"] == [{"id": "mcp:export", "version": "1.0.0"}]
+    assert not any(t["id"] == "mcp:fresh" for t in client.get("/tools").get_json())
+    assert client.post("/tools", json=[{"id": "mcp:twice", "version": "1.0.0"}] * 2).status_code == 409
+
+    lines = "\n".join(json.dumps({"id": f"mcp:bulk_{i}", "version": "1.0.0"}) for i in range(200))
+    res = client.post("/tools/import", data=lines, content_type="application/x-ndjson")
+    assert res.get_json() == {"status": "ok", "written": 200, "skipped": 0}
+    res = client.post("/tools/import", data=json.dumps({"tools": [{"id": "mcp:bulk_0", "version": "1.0.0"}]}))
+    assert res.get_json()["skipped"] == 1
+    assert client.post("/tools/import", data="{not json\n").status_code == 400
+
+    listed = {(t["id"], t["version"]): t for t in client.get("/tools").get_json()}
+    assert len(listed) == 8 + 201
+    assert listed[("mcp:export", "1.0.0")]["description"] == "v2"
+    assert all(verify_tool_signature(t, "registry-key") for t in listed.values())
+
+
+def test_startup_skips_unchanged_manifest(client, tmp_path, monkeypatch):
+    """An unchanged manifest is not re-seeded; a changed TOOLS_MANIFEST is."""
+    import json
+    from app.tool_registry import ToolRegistry
+    from app.utils import pooled_db, read_generation
+
+    db = pooled_db()
+    generation = read_generation(db, "tools")
+    db.execute("DELETE FROM tools WHERE tool_id = 'mcp:run_shell_sim'")
+    db.commit()
+    ToolRegistry()
+    assert db.execute("SELECT 1 FROM tools WHERE tool_id = 'mcp:run_shell_sim'").fetchone() is None
+    assert read_generation(db, "tools") == generation + 1
+
+    manifest = tmp_path / "tools.jsonl"
+    manifest.write_text(json.dumps({"id": "mcp:from_manifest", "version": "1.0.0"}) + "\n")
+    monkeypatch.setenv("TOOLS_MANIFEST", str(manifest))
+    registry = ToolRegistry()
+    assert registry.loaded("mcp:from_manifest", "1.0.0") is not None
+    assert registry.loaded("mcp:run_shell_sim", "1.0.0") is not None
+
+    # a changed definition for an already-seeded (id, version) is applied
+    manifest.write_text(json.dumps({"id": "mcp:from_manifest", "version": "1.0.0", "description": "edited"}) + "\n")
+    registry = ToolRegistry()
+    assert registry.loaded("mcp:from_manifest", "1.0.0")[0]["description"] == "edited"
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = tmp_path / "utils.db"
+    monkeypatch.setenv("DATABASE_FILE", str(path))
+    monkeypatch.setenv("SQLITE_CACHE_SIZE", "-2000")
+    from app.utils import init_db_command
+    init_db_command()
+    return path
+
+
+def test_pooled_connections_are_per_thread_and_tuned(db_file):
+    from app.utils import pooled_db
+
+    conn = pooled_db()
+    assert pooled_db() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == -2000
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pooled_db()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_read_only_connection_rejects_writes(db_file):
+    import sqlite3
+    from app.utils import pooled_db
+
+    reader = pooled_db(read_only=True)
+    assert reader is not pooled_db()
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("INSERT INTO anomalies (agent_id) VALUES ('x')")
+
+
+def test_invalid_pragma_setting_rejected(db_file, monkeypatch):
+    from app.utils import open_db
+
+    monkeypatch.setenv("SQLITE_SYNCHRONOUS", "sometimes")
+    with pytest.raises(ValueError):
+        open_db()